@@ -0,0 +1,61 @@
+"""
+Throughput of the batch generate lambda as a function of the number of worker
+processes laying out the PDF documents.
+
+Usage:
+    python -m benchmarks.batch_generate_benchmark [--documents 24 --workers 1 2 4]
+"""
+
+import argparse
+import os
+import time
+from benchmarks.generate_rerun_benchmark import build_summary
+from tools.stage_loader import load_stage_module
+
+
+def run(documents: int, worker_counts: list):
+    batch_generate = load_stage_module("generate", "batch_generate")
+    document_sections = [("", build_summary())]
+    jobs = [
+        (index, f"benchmark-{index}", document_sections, ["pdf"])
+        for index in range(documents)
+    ]
+
+    header = f"{'workers':>8}{'seconds':>10}{'documents/s':>13}{'speedup':>9}"
+    print(f"{documents} documents, {os.cpu_count()} CPUs available")
+    print(header)
+    print("-" * len(header))
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        failures = [
+            error
+            for _, _, error in batch_generate.render_in_process_pool(jobs, workers)
+            if error
+        ]
+        elapsed = time.perf_counter() - start
+        if failures:
+            raise RuntimeError(f"{len(failures)} documents failed: {failures[0]}")
+        throughput = documents / elapsed
+        baseline = baseline or throughput
+        print(
+            f"{workers:>8}{elapsed:>10.2f}{throughput:>13.2f}"
+            f"{throughput / baseline:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=24)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    args = parser.parse_args()
+    run(args.documents, args.workers)
+
+
+if __name__ == "__main__":
+    main()
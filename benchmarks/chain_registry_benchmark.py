@@ -0,0 +1,134 @@
+"""
+Per-call overhead of the LangChain chains of the validate and summarize
+lambdas, with the chains rebuilt on every call as before, and with the chain
+registry of the process.
+
+Amazon Bedrock is replaced by a stand-in that answers immediately, so the
+timings are the cost of the lambda code around the network round trip:
+- build: building the prompt, parser, format instructions and `BedrockChat`
+- lookup: getting the chain from the registry
+- call: a whole call, i.e. the chain for a call plus templating, the stand-in
+  request and the parsing of the output
+
+The concurrent calls then check that threads asking for a chain that is not
+built yet share one build.
+
+Usage:
+    python -m benchmarks.chain_registry_benchmark [--stages validate summarize]
+        [--calls 200] [--threads 8]
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tools.local_runner import StandIns
+from tools.stage_loader import load_stage_module
+
+STAGES = ("validate", "summarize")
+
+ANSWERS = [
+    "Amazon Bedrock gives access to several foundation models through one API.",
+    "It lets us customize the models privately with our own data.",
+    "We use it to prototype generative AI applications quickly.",
+]
+
+
+def stage_calls(stage: str, module):
+    """Return the chain builder, the registry lookup and the call of a stage."""
+    if stage == "validate":
+        answers = [
+            {"index": str(index), "answer": answer, "weight": 1}
+            for index, answer in enumerate(ANSWERS)
+        ]
+
+        def build():
+            _, parser = module.build_chain("Claude3")
+            return parser.get_format_instructions()
+
+        def call():
+            return module.answer_anomaly_detection(
+                "Claude3", answers, "What is Amazon Bedrock?"
+            )
+
+        return build, lambda: module.get_chain("Claude3"), call
+
+    def build():
+        _, parser = module.build_chain(module.TEMPLATES["summarization"], "Claude3")
+        return parser.get_format_instructions()
+
+    def call():
+        return module.summarization("What is Amazon Bedrock?", ANSWERS, "Claude3")
+
+    return build, lambda: module.get_chain("summarization", "Claude3"), call
+
+
+def median_us(function, calls: int) -> float:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings)
+
+
+def run(stages, calls: int, threads: int):
+    stand_ins = StandIns()
+    header = (
+        f"{'stage':<11}{'build us':>10}{'lookup us':>11}"
+        f"{'call (rebuild) us':>19}{'call (registry) us':>20}"
+        f"{'builds for ' + str(threads) + ' threads':>22}"
+    )
+    print(header)
+    print("-" * len(header))
+    for stage in stages:
+        module_name = "topic_classification" if stage == "validate" else "summarization"
+        module = load_stage_module(
+            stage,
+            module_name=module_name,
+            clients=stand_ins.clients,
+            environment={"CHAIN_PRIMING_ENABLED": "false"},
+        )
+        registry = module.chain_registry
+        build, lookup, call = stage_calls(stage, module)
+        try:
+            registry.clear()
+            call()
+            lookup_us = median_us(lookup, calls)
+            call_us = median_us(call, calls)
+
+            # The calls of the lambda before the registry built a chain each time
+            def call_rebuilt():
+                registry.clear()
+                call()
+
+            build_us = median_us(build, calls)
+            rebuild_call_us = median_us(call_rebuilt, calls)
+
+            registry.clear()
+            builds = registry.builds
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(lambda _: call(), range(threads)))
+            builds = registry.builds - builds
+        except Exception as error:
+            print(f"{stage:<11}failed: {type(error).__name__}: {error}")
+            continue
+        print(
+            f"{stage:<11}{build_us:>10.0f}{lookup_us:>11.1f}"
+            f"{rebuild_call_us:>19.0f}{call_us:>20.0f}{builds:>22}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    run(args.stages, args.calls, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Init, first-invoke and warm-invoke times of the validate, summarize and
+generate lambdas, with and without the priming during the initialization.
+
+Each configuration runs in a fresh interpreter, like a new Lambda execution
+environment, with the stand-in services:
+- init: importing the lambda module, including the priming if enabled
+- first: the first invocation of the handler
+- warm: the median of the following invocations
+
+The priming moves work from the first invocation, which is billed and on the
+path of the document, to the initialization. A good priming lowers `first`
+to about `warm`, for an `init` that grows by less than `first` shrinks.
+
+Usage:
+    python -m benchmarks.cold_start_benchmark [--stages validate summarize generate]
+        [--invocations 10] [--answers 5] [--words 200]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+STAGES = ("validate", "summarize", "generate")
+
+# The environmental variables turning the priming of every stage on or off
+PRIMING_VARIABLES = {
+    "validate": "CHAIN_PRIMING_ENABLED",
+    "summarize": "CHAIN_PRIMING_ENABLED",
+    "generate": "RENDERER_PRIMING_ENABLED",
+}
+
+# Every invocation does the whole work, instead of reusing the outputs of the
+# previous one
+ENVIRONMENT = {
+    "INCREMENTAL_SUMMARY_ENABLED": "false",
+    "SKIP_UNCHANGED_DOCUMENTS": "false",
+    "POWERTOOLS_LOG_LEVEL": "ERROR",
+}
+
+SUMMARY_TEXT = (
+    "## Summary\n\n"
+    "Most participants describe Amazon Bedrock as a managed service to build "
+    "generative AI applications with foundation models.\n"
+)
+
+
+def stage_event(stage: str, s3_client, answers: int, words: int) -> dict:
+    """Seed the inputs of a stage in the S3 stand-in, and return its event."""
+    from benchmarks.corpus import BUCKET_NAME, seed_question_folder
+
+    uris = seed_question_folder(s3_client, answers, words)
+    if stage == "validate":
+        return {
+            "statusCode": 200,
+            "documentName": "cold start",
+            "transcribedFilesS3Uris": uris,
+            "serviceName": "app-transcribe",
+        }
+    if stage == "summarize":
+        return {
+            "statusCode": 200,
+            "documentName": "cold start",
+            "validAnswersS3Uris": uris,
+            "continueSummarization": True,
+            "invalidAnswersS3Uris": [],
+        }
+    key = "summary/cold start/summary.md"
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=SUMMARY_TEXT)
+    return {
+        "documentName": "cold start",
+        "summarizedAnswerS3Uri": f"s3://{BUCKET_NAME}/{key}",
+    }
+
+
+def measure(stage: str, invocations: int, answers: int, words: int) -> dict:
+    """Measure the init and invocation times in the current interpreter."""
+    from tools.local_runner import StandIns
+    from tools.stage_loader import load_stage_module
+    from tools.stand_ins import FakeLambdaContext
+
+    stand_ins = StandIns()
+    event = stage_event(stage, stand_ins.s3, answers, words)
+
+    start = time.perf_counter()
+    module = load_stage_module(stage, clients=stand_ins.clients)
+    init_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for index in range(invocations + 1):
+        context = FakeLambdaContext(function_name=stage, aws_request_id=str(index))
+        start = time.perf_counter()
+        module.lambda_handler(json.loads(json.dumps(event)), context)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    warm = sorted(timings[1:])
+    return {
+        "init_ms": init_ms,
+        "first_ms": timings[0],
+        "warm_ms": warm[len(warm) // 2] if warm else timings[0],
+    }
+
+
+def run(stages, invocations: int, answers: int, words: int):
+    header = (
+        f"{'stage':<11}{'priming':<9}{'init ms':>10}{'first ms':>10}"
+        f"{'warm ms':>10}{'first - warm':>14}{'cold total ms':>15}"
+    )
+    print(header)
+    print("-" * len(header))
+    for stage in stages:
+        for priming in ("false", "true"):
+            process = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.cold_start_benchmark",
+                    "--stages",
+                    stage,
+                    "--invocations",
+                    str(invocations),
+                    "--answers",
+                    str(answers),
+                    "--words",
+                    str(words),
+                    "--child",
+                ],
+                env={
+                    **os.environ,
+                    **ENVIRONMENT,
+                    PRIMING_VARIABLES[stage]: priming,
+                },
+                capture_output=True,
+                text=True,
+            )
+            if process.returncode != 0:
+                error = (process.stderr.strip().splitlines() or ["unknown error"])[-1]
+                print(f"{stage:<11}{priming:<9}failed: {error}")
+                continue
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            print(
+                f"{stage:<11}{priming:<9}{result['init_ms']:>10.0f}"
+                f"{result['first_ms']:>10.0f}{result['warm_ms']:>10.0f}"
+                f"{result['first_ms'] - result['warm_ms']:>14.0f}"
+                f"{result['init_ms'] + result['first_ms']:>15.0f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--invocations", type=int, default=10)
+    parser.add_argument("--answers", type=int, default=5)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        # The lambdas print their metrics to stdout, and warn about empty ones
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(
+            devnull
+        ), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            result = measure(args.stages[0], args.invocations, args.answers, args.words)
+        print(json.dumps(result))
+    else:
+        run(args.stages, args.invocations, args.answers, args.words)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Quality-versus-tokens benchmark of the transcript compression stage of the
+summarize lambda, run on the bundled example transcripts.
+
+Usage:
+    python -m benchmarks.compression_benchmark [--ratios 1.0 0.8 0.6 0.4]
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+PARENT_DIR = os.path.join(os.path.dirname(__file__), "..")
+EXAMPLES_PATH = os.path.join(PARENT_DIR, "assets", "examples_transcribe_texts")
+sys.path.insert(0, os.path.join(PARENT_DIR, "code", "lambdas", "summarize"))
+
+from compression import compress_answers, tfidf_matrix  # noqa: E402
+
+# Claude 3 Sonnet on-demand input price (USD per 1K tokens) and an assumed
+# prompt processing throughput, both overridable from the command line.
+DEFAULT_PRICE_PER_1K_INPUT_TOKENS = 0.003
+DEFAULT_PREFILL_MS_PER_1K_TOKENS = 150.0
+
+
+def load_examples(examples_path: str) -> dict:
+    """Load the example transcripts, grouped by question folder."""
+    questions = {}
+    for question in sorted(os.listdir(examples_path)):
+        folder = os.path.join(examples_path, question)
+        if not os.path.isdir(folder):
+            continue
+        answers = []
+        for filename in sorted(os.listdir(folder)):
+            if filename.endswith(".txt"):
+                with open(os.path.join(folder, filename), encoding="utf-8") as file:
+                    answers.append(file.read())
+        questions[question] = answers
+    return questions
+
+
+def content_coverage(original: str, compressed: str) -> float:
+    """Cosine similarity between the TF-IDF vectors of the original and compressed text."""
+    matrix = tfidf_matrix([original, compressed])
+    return float(matrix[0] @ matrix[1])
+
+
+def run(ratios, price_per_1k, prefill_ms_per_1k, repeat):
+    questions = load_examples(EXAMPLES_PATH)
+    header = (
+        f"{'question':<28}{'ratio':>7}{'tokens':>9}{'kept':>8}"
+        f"{'coverage':>10}{'compress ms':>13}{'saved ms':>10}{'saved $/1K docs':>17}"
+    )
+    print(header)
+    print("-" * len(header))
+    for question, answers in questions.items():
+        original = " ".join(answers)
+        for ratio in ratios:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                compressed, stats = compress_answers(answers, ratio=ratio)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            saved_tokens = stats.input_tokens - stats.output_tokens
+            saved_ms = saved_tokens / 1000 * prefill_ms_per_1k
+            saved_cost = saved_tokens / 1000 * price_per_1k * 1000
+            print(
+                f"{question[:27]:<28}{ratio:>7.2f}{stats.input_tokens:>9}"
+                f"{stats.output_tokens:>8}"
+                f"{content_coverage(original, ' '.join(compressed)):>10.3f}"
+                f"{np.median(timings):>13.2f}{saved_ms:>10.0f}{saved_cost:>17.3f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--ratios", type=float, nargs="+", default=[1.0, 0.8, 0.6, 0.4, 0.2]
+    )
+    parser.add_argument(
+        "--price-per-1k-input-tokens",
+        type=float,
+        default=DEFAULT_PRICE_PER_1K_INPUT_TOKENS,
+    )
+    parser.add_argument(
+        "--prefill-ms-per-1k-tokens",
+        type=float,
+        default=DEFAULT_PREFILL_MS_PER_1K_TOKENS,
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(
+        args.ratios,
+        args.price_per_1k_input_tokens,
+        args.prefill_ms_per_1k_tokens,
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Synthetic corpora for the benchmarks: question folders of N answers of M
+words, built from the sentences of the example transcripts.
+"""
+
+import os
+import random
+import re
+from typing import List
+from tools.stage_loader import DEFAULT_ENVIRONMENT
+
+PARENT_DIR = os.path.join(os.path.dirname(__file__), "..")
+EXAMPLES_PATH = os.path.join(PARENT_DIR, "assets", "examples_transcribe_texts")
+BUCKET_NAME = DEFAULT_ENVIRONMENT["DATA_SOURCE_BUCKET_NAME"]
+
+
+def example_sentences() -> List[str]:
+    """Return the sentences of the bundled example transcripts."""
+    sentences = []
+    for question in sorted(os.listdir(EXAMPLES_PATH)):
+        folder = os.path.join(EXAMPLES_PATH, question)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(".txt"):
+                continue
+            with open(os.path.join(folder, filename), encoding="utf-8") as file:
+                text = " ".join(file.read().split())
+            sentences.extend(
+                sentence for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence
+            )
+    return sentences
+
+
+def synthetic_answers(answers: int, words: int, seed: int = 0) -> List[str]:
+    """
+    Build the transcripts of a synthetic question.
+
+    Arguments:
+    ----------
+        answers (int): Number of answers.
+        words (int): Number of words of every answer.
+        seed (int): Seed of the random choice of the sentences, so that the
+            same arguments always give the same corpus.
+
+    Returns:
+    --------
+        List[str]: The transcript of every answer.
+    """
+    sentences = example_sentences()
+    generator = random.Random(seed)
+    transcripts = []
+    for _ in range(answers):
+        transcript_words: List[str] = []
+        while len(transcript_words) < words:
+            transcript_words.extend(generator.choice(sentences).split())
+        transcripts.append(" ".join(transcript_words[:words]))
+    return transcripts
+
+
+def question_name(answers: int, words: int) -> str:
+    return f"synthetic question {answers}x{words}"
+
+
+def seed_question_folder(
+    s3_client,
+    answers: int,
+    words: int,
+    folder: str = "transcribe",
+    extension: str = "txt",
+    seed: int = 0,
+) -> List[str]:
+    """
+    Upload the transcripts of a synthetic question to an S3 stand-in.
+
+    With the `mp3` extension, the objects stand for the audio files of the
+    question, which the Transcribe stand-in transcribes into their content.
+
+    Arguments:
+    ----------
+        s3_client (InMemoryS3): The S3 stand-in.
+        answers (int): Number of answers.
+        words (int): Number of words of every answer.
+        folder (str): Folder of the question folder in the bucket.
+        extension (str): Extension of the objects.
+        seed (int): Seed of the corpus.
+
+    Returns:
+    --------
+        List[str]: The S3 URIs of the objects, in order.
+    """
+    prefix = f"{folder}/{question_name(answers, words)}"
+    uris = []
+    for index, transcript in enumerate(synthetic_answers(answers, words, seed), 1):
+        key = f"{prefix}/answer{index}.{extension}"
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=transcript)
+        uris.append(f"s3://{BUCKET_NAME}/{key}")
+    return uris
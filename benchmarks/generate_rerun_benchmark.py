@@ -0,0 +1,98 @@
+"""
+Re-run latency benchmark of the generate lambda with unchanged inputs, comparing
+a full render against reusing the PDF file of the previous run.
+
+The lambda runs in-process against an in-memory S3, so the timings cover the
+handler itself (WeasyPrint rendering, or a HEAD request on a match) and not
+the network round trips to Amazon S3.
+
+Usage:
+    python -m benchmarks.generate_rerun_benchmark [--repeat 10]
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+from tools.stage_loader import DEFAULT_ENVIRONMENT, load_stage_module
+from tools.stand_ins import InMemoryS3
+
+PARENT_DIR = os.path.join(os.path.dirname(__file__), "..")
+EXAMPLES_PATH = os.path.join(PARENT_DIR, "assets", "examples_transcribe_texts")
+BUCKET_NAME = DEFAULT_ENVIRONMENT["DATA_SOURCE_BUCKET_NAME"]
+SUMMARY_KEY = "benchmark/summary/data.txt"
+
+
+class FakeContext:
+    function_name = "generate"
+    memory_limit_in_mb = 2048
+    invoked_function_arn = "arn:aws:lambda:us-east-1:000000000000:function:generate"
+    aws_request_id = "generate-rerun-benchmark"
+
+
+def build_summary() -> str:
+    """Build a markdown summary out of the bundled example transcripts."""
+    sections = []
+    for question in sorted(os.listdir(EXAMPLES_PATH)):
+        folder = os.path.join(EXAMPLES_PATH, question)
+        if not os.path.isdir(folder):
+            continue
+        sections.append(f"## {question}")
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(".txt"):
+                continue
+            with open(os.path.join(folder, filename), encoding="utf-8") as file:
+                sections.append(f"- {file.read().strip()}")
+    return "\n\n".join(sections)
+
+
+def time_runs(handler, event: dict, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        handler(event, FakeContext())
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run(repeat: int):
+    s3_client = InMemoryS3()
+    generate = load_stage_module("generate", clients={"s3": s3_client})
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=SUMMARY_KEY, Body=build_summary())
+    event = {
+        "documentName": "benchmark",
+        "summarizedAnswerS3Uri": f"s3://{BUCKET_NAME}/{SUMMARY_KEY}",
+    }
+
+    results = {}
+    for skip_unchanged in (False, True):
+        generate.Connections.skip_unchanged_documents = skip_unchanged
+        # First run renders the document and stores its metadata
+        generate.lambda_handler(event, FakeContext())
+        s3_client.calls.clear()
+        timings = time_runs(generate.lambda_handler, event, repeat)
+        results["skip unchanged" if skip_unchanged else "always render"] = (
+            timings,
+            dict(s3_client.calls),
+        )
+
+    header = f"{'mode':<18}{'p50 ms':>10}{'p95 ms':>10}{'S3 calls per run':>40}"
+    print(header)
+    print("-" * len(header))
+    for mode, (timings, calls) in results.items():
+        calls_per_run = ", ".join(f"{k}={v / repeat:g}" for k, v in calls.items())
+        print(
+            f"{mode:<18}{np.percentile(timings, 50):>10.1f}"
+            f"{np.percentile(timings, 95):>10.1f}{calls_per_run:>40}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Latency of the generate lambda for every output format, alone and combined.
+
+The lambda runs in-process against an in-memory S3, with the reuse of
+unchanged documents disabled so that every run renders its formats.
+
+Usage:
+    python -m benchmarks.output_formats_benchmark [--repeat 5]
+"""
+
+import argparse
+import time
+from benchmarks.generate_rerun_benchmark import (
+    BUCKET_NAME,
+    SUMMARY_KEY,
+    FakeContext,
+    build_summary,
+)
+from tools.stage_loader import load_stage_module
+from tools.stand_ins import InMemoryS3
+
+FORMAT_SETS = [["md"], ["html"], ["docx"], ["pdf"], ["pdf", "html", "md", "docx"]]
+
+
+def run(repeat: int):
+    s3_client = InMemoryS3()
+    generate = load_stage_module("generate", clients={"s3": s3_client})
+    generate.Connections.skip_unchanged_documents = False
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=SUMMARY_KEY, Body=build_summary())
+
+    header = f"{'formats':<22}{'median ms':>11}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for output_formats in FORMAT_SETS:
+        event = {
+            "documentName": "benchmark",
+            "summarizedAnswerS3Uri": f"s3://{BUCKET_NAME}/{SUMMARY_KEY}",
+            "outputFormats": output_formats,
+        }
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            generate.lambda_handler(event, FakeContext())
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            f"{','.join(output_formats):<22}{timings[len(timings) // 2]:>11.1f}"
+            f"{timings[-1]:>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Memory and latency benchmark of the PDF rendering and upload of the generate
+lambda, for documents from 1 to 500 pages.
+
+Two ways of handing the PDF file to the upload are compared:
+- disk: render into a file in the temporary folder and read it back
+- memory: render into a spooled temporary file, uploaded straight from memory
+
+The upload goes to an in-memory S3, so the timings cover the rendering and the
+temporary storage only. Peak Python heap is measured with tracemalloc; the
+maximum resident set size also includes the memory allocated by WeasyPrint's
+native libraries.
+
+Usage:
+    python -m benchmarks.pdf_render_benchmark [--pages 1 10 100 500]
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import uuid
+from tools.stage_loader import DEFAULT_ENVIRONMENT, load_stage_module
+from tools.stand_ins import InMemoryS3
+
+BUCKET_NAME = DEFAULT_ENVIRONMENT["DATA_SOURCE_BUCKET_NAME"]
+PAGE_BREAK = '<div style="break-after: page"></div>'
+PAGE_TEXT = (
+    "Amazon Bedrock is a fully managed service that offers a choice of "
+    "high-performing foundation models through a single API, along with a broad "
+    "set of capabilities to build generative AI applications. "
+) * 12
+
+
+def build_document(pages: int) -> str:
+    """Build a markdown summary spanning the given number of pages."""
+    page = f"## Section\n\n{PAGE_TEXT}\n\n{PAGE_TEXT}\n\n{PAGE_BREAK}"
+    return "\n\n".join(page for _ in range(pages))
+
+
+def render_to_disk(generate, document_text: str, file_path: str):
+    pdf_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}.pdf")
+    try:
+        with open(pdf_path, "wb") as pdf_file:
+            generate.generate_pdf("benchmark", [("", document_text)], pdf_file)
+        with open(pdf_path, "rb") as pdf_file:
+            generate.upload_document_to_s3(pdf_file, file_path)
+    finally:
+        os.remove(pdf_path)
+
+
+def render_in_memory(generate, document_text: str, file_path: str):
+    with tempfile.SpooledTemporaryFile(
+        max_size=generate.Connections.pdf_spool_max_bytes
+    ) as pdf_file:
+        generate.generate_pdf("benchmark", [("", document_text)], pdf_file)
+        generate.upload_document_to_s3(pdf_file, file_path)
+
+
+def run(page_counts, repeat):
+    s3_client = InMemoryS3()
+    generate = load_stage_module("generate", clients={"s3": s3_client})
+    modes = {"disk": render_to_disk, "memory": render_in_memory}
+
+    header = (
+        f"{'pages':>6}{'mode':>8}{'PDF MB':>9}{'median ms':>11}"
+        f"{'heap peak MB':>14}{'max RSS MB':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for pages in sorted(page_counts):
+        document_text = build_document(pages)
+        for mode, render in modes.items():
+            file_path = f"benchmark/{mode}-{pages}"
+            timings = []
+            for _ in range(repeat):
+                tracemalloc.start()
+                start = time.perf_counter()
+                render(generate, document_text, file_path)
+                timings.append((time.perf_counter() - start) * 1000)
+                _, heap_peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            pdf_size = len(s3_client.objects[(BUCKET_NAME, f"{file_path}.pdf")]["Body"])
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(
+                f"{pages:>6}{mode:>8}{pdf_size / 1024**2:>9.2f}"
+                f"{sorted(timings)[len(timings) // 2]:>11.0f}"
+                f"{heap_peak / 1024**2:>14.1f}{max_rss:>12.0f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--pages", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Size and render-time trade-offs of the PDF optimization levels of the
+generate lambda, on sample documents.
+
+Every document is laid out once, then written at every optimization level,
+so the write time is the cost of the optimization itself.
+
+Usage:
+    python -m benchmarks.pdf_size_benchmark [--pdf-variant pdf/a-3b]
+"""
+
+import argparse
+import io
+import os
+import time
+from pathlib import Path
+from benchmarks.generate_rerun_benchmark import build_summary
+from benchmarks.pdf_render_benchmark import build_document
+from tools.stage_loader import load_stage_module
+
+PARENT_DIR = os.path.join(os.path.dirname(__file__), "..")
+IMAGE_PATH = Path(PARENT_DIR, "assets", "diagrams", "Architecture.jpg").resolve()
+
+
+def sample_documents() -> dict:
+    """Build the sample documents, as Markdown summaries."""
+    return {
+        "summary": build_summary(),
+        "summary + image": f"{build_summary()}\n\n![Architecture]({IMAGE_PATH.as_uri()})",
+        "50 pages": build_document(50),
+    }
+
+
+def run(pdf_variant: str | None):
+    generate = load_stage_module("generate")
+    document_generator = load_stage_module("generate", "document_generator")
+    connections = generate.Connections
+    connections.pdf_size_budget_bytes = None
+    connections.pdf_variant = pdf_variant
+
+    header = (
+        f"{'document':<18}{'level':<10}{'layout ms':>11}{'write ms':>10}{'KB':>10}"
+        f"{'% of none':>11}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, document_text in sample_documents().items():
+        start = time.perf_counter()
+        html_document = document_generator.generate_html(
+            generate.render_html_body(name, [("", document_text)])
+        )
+        document = document_generator.render_document(html_document)
+        layout_ms = (time.perf_counter() - start) * 1000
+
+        # The levels start with "none", whose report has the unoptimized size
+        unoptimized_bytes = None
+        for level in document_generator.PDF_OPTIMIZATION_LEVELS:
+            connections.pdf_optimization_level = level
+            start = time.perf_counter()
+            report = document_generator.write_optimized_pdf(document, io.BytesIO())
+            write_ms = (time.perf_counter() - start) * 1000
+            unoptimized_bytes = report.unoptimized_bytes or unoptimized_bytes
+            print(
+                f"{name:<18}{level:<10}{layout_ms:>11.0f}{write_ms:>10.0f}"
+                f"{report.final_bytes / 1024:>10.1f}"
+                f"{100 * report.final_bytes / unoptimized_bytes:>10.0f}%"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdf-variant", default=None)
+    args = parser.parse_args()
+    run(args.pdf_variant)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+Scaling benchmark suite of the pipeline, on synthetic question folders of
+N answers of M words built from the example transcripts.
+
+It times, for every size:
+- the loading of the answers into a DataFrame (`generate_dataframe_from_files`),
+- the building of the validation and summarization prompts,
+- the parsing of the summarization output,
+- the HTML body and PDF rendering of documents of P pages,
+- the full pipeline, run by the local runner against the stand-in services,
+  with one lambda per stage and with the fast path lambda.
+
+The results are written to JSON. A previous results file can be given as
+baseline, and the cases slower than the baseline by more than the threshold
+are flagged as regressions, with a non-zero exit status.
+
+Usage:
+    python -m benchmarks.pipeline_suite_benchmark [--answers 3 10 30]
+        [--words 100 400 1600] [--pages 1 10 50] [--repeat 5]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.2]
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    SystemMessagePromptTemplate,
+)
+from benchmarks.corpus import (
+    BUCKET_NAME,
+    question_name,
+    seed_question_folder,
+    synthetic_answers,
+)
+from benchmarks.pdf_render_benchmark import build_document
+from tools.local_runner import LocalStateMachine, StandIns
+from tools.stage_loader import PARENT_DIR, load_stage_module
+
+
+@dataclass
+class CaseResult:
+    """
+    The timings of a benchmark case
+
+    Attributes:
+    -----------
+    group: str
+        What is measured, e.g. "html_to_pdf".
+    params: Dict[str, object]
+        The size of the case, e.g. the number of pages.
+    runs: int
+        Number of timed runs, after one warm-up run.
+    median_ms: float
+        Median duration of a run, compared against the baseline.
+    p95_ms: float
+        95th percentile of the duration of a run.
+    min_ms: float
+        Shortest run.
+    error: str
+        The error that stopped the case, empty on success.
+    """
+
+    group: str
+    params: Dict[str, object] = field(default_factory=dict)
+    runs: int = 0
+    median_ms: float = 0.0
+    p95_ms: float = 0.0
+    min_ms: float = 0.0
+    error: str = ""
+
+    @property
+    def name(self) -> str:
+        params = ",".join(f"{key}={value}" for key, value in self.params.items())
+        return f"{self.group}[{params}]"
+
+
+class Suite:
+    """The benchmark cases, sharing the stand-in services and the loaded stages."""
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.stand_ins = StandIns()
+        self.results: List[CaseResult] = []
+
+    def stage(self, stage: str, module_name: Optional[str] = None):
+        return load_stage_module(stage, module_name, clients=self.stand_ins.clients)
+
+    def measure(
+        self,
+        group: str,
+        params: dict,
+        function: Callable[[], object],
+        setup: Optional[Callable[[], None]] = None,
+    ) -> None:
+        result = CaseResult(group=group, params=params)
+        timings = []
+        try:
+            for run in range(self.repeat + 1):
+                if setup:
+                    setup()
+                start = time.perf_counter()
+                function()
+                if run:  # the first run warms up the caches
+                    timings.append((time.perf_counter() - start) * 1000)
+        except Exception as error:
+            result.error = f"{type(error).__name__}: {error}"
+        if timings:
+            result.runs = len(timings)
+            result.median_ms = round(float(np.median(timings)), 3)
+            result.p95_ms = round(float(np.percentile(timings, 95)), 3)
+            result.min_ms = round(min(timings), 3)
+        self.results.append(result)
+        status = result.error or f"{result.median_ms:.2f} ms"
+        print(f"{result.name:<58}{status}", flush=True)
+
+    def answer_cases(self, answers: int, words: int) -> None:
+        params = {"answers": answers, "words": words}
+        uris = seed_question_folder(self.stand_ins.s3, answers, words)
+        transcripts = synthetic_answers(answers, words)
+        question = question_name(answers, words)
+
+        summarize_utils = self.stage("summarize", "utils")
+        self.measure(
+            "generate_dataframe_from_files",
+            params,
+            lambda: summarize_utils.generate_dataframe_from_files(uris),
+        )
+
+        summarize_templates = self.stage("summarize", "prompt_templates")
+        summarize_prompt = chat_prompt(
+            summarize_templates.SYSTEM_PROMPT,
+            summarize_templates.SUMMARIZATION_TEMPLATE_PARAGRAPH,
+        )
+        summarization = self.stage("summarize", "summarization")
+        self.measure(
+            "summarize_prompt",
+            params,
+            lambda: summarize_prompt.format_messages(
+                input_texts=transcripts,
+                input_question=question,
+                format_instructions=summarization.XMLOutputParser(
+                    tags=["Output", "Summary"]
+                ).get_format_instructions(),
+            ),
+        )
+
+        validate_templates = self.stage("validate", "prompt_templates")
+        validate_prompt = chat_prompt(
+            validate_templates.SYSTEM_PROMPT,
+            validate_templates.TOPIC_CLASSIFICATION_TEMPLATE,
+        )
+        topic_classification = self.stage("validate", "topic_classification")
+        answers_w_index = [
+            {"index": f"answer{index}", "answer": text, "weight": 1}
+            for index, text in enumerate(transcripts, 1)
+        ]
+        self.measure(
+            "validate_prompt",
+            params,
+            lambda: validate_prompt.format_messages(
+                answer_json=answers_w_index,
+                input_question=question,
+                format_instructions=topic_classification.PydanticOutputParser(
+                    pydantic_object=topic_classification.AnswerAnomaly
+                ).get_format_instructions(),
+            ),
+        )
+
+    def parse_cases(self, words: int) -> None:
+        summary = " ".join(synthetic_answers(1, words, seed=words))
+        output = f"<Output><Summary>{summary}</Summary></Output>"
+        summarization = self.stage("summarize", "summarization")
+        summarize_utils = self.stage("summarize", "utils")
+        self.measure(
+            "parse_summary",
+            {"words": words},
+            lambda: summarize_utils.parse_summary(
+                summarization.XMLOutputParser(tags=["Output", "Summary"]).parse(output)
+            ),
+        )
+
+    def render_cases(self, pages: int) -> None:
+        generate = self.stage("generate")
+        document_generator = self.stage("generate", "document_generator")
+        document_sections = [("", build_document(pages))]
+        self.measure(
+            "render_html_body",
+            {"pages": pages},
+            lambda: generate.render_html_body("benchmark", document_sections),
+        )
+        html_document = document_generator.generate_html(
+            generate.render_html_body("benchmark", document_sections)
+        )
+        self.measure(
+            "html_to_pdf",
+            {"pages": pages},
+            lambda: document_generator.html_to_pdf(html_document, io.BytesIO()),
+        )
+
+    def pipeline_cases(self, answers: int, words: int) -> None:
+        seed_question_folder(
+            self.stand_ins.s3,
+            answers,
+            words,
+            folder="assets/audio_samples",
+            extension="mp3",
+        )
+        folder_uri = (
+            f"s3://{BUCKET_NAME}/assets/audio_samples/{question_name(answers, words)}/"
+        )
+        state_machine = LocalStateMachine(self.stand_ins)
+        preprocess = self.stage("preprocess")
+
+        def run_pipeline():
+            report = state_machine.run(
+                {"documentName": "benchmark", "audioFileFolderUri": folder_uri}
+            )
+            if report.status != "SUCCEEDED":
+                raise RuntimeError(json.dumps(report.output))
+
+        for mode, use_fast_path in (("stages", False), ("fastpath", True)):
+            preprocess.Connections.fast_path_enabled = use_fast_path
+            preprocess.Connections.fast_path_max_audio_files = answers
+            preprocess.Connections.fast_path_max_audio_bytes = sys.maxsize
+            self.measure(
+                "pipeline",
+                {"answers": answers, "words": words, "mode": mode},
+                run_pipeline,
+                setup=self.forget_outputs,
+            )
+
+    def forget_outputs(self) -> None:
+        """Delete the summaries and documents, so that every run writes them again."""
+        for bucket, key in list(self.stand_ins.s3.objects):
+            if "/summary/" in key or key.startswith("document_storage/"):
+                self.stand_ins.s3.objects.pop((bucket, key), None)
+
+
+def chat_prompt(system_prompt: str, human_template: str) -> ChatPromptTemplate:
+    """Build the chat prompt of a stage, like the stages do before every call."""
+    return ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate.from_template(system_prompt),
+            HumanMessagePromptTemplate.from_template(human_template),
+        ]
+    )
+
+
+def run_metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PARENT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(
+    results: Dict[str, dict],
+    baseline: Dict[str, dict],
+    threshold: float,
+    min_delta_ms: float,
+) -> List[str]:
+    """
+    Compare the median durations of the cases with the baseline.
+
+    Returns:
+    --------
+        List[str]: The names of the cases slower than the baseline by more
+            than the threshold, and by more than `min_delta_ms`.
+    """
+    regressions = []
+    header = f"{'case':<58}{'baseline ms':>12}{'ms':>10}{'delta':>9}"
+    print()
+    print(header)
+    print("-" * (len(header) + 12))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or base["error"] or result["error"] or not base["median_ms"]:
+            continue
+        delta = result["median_ms"] / base["median_ms"] - 1
+        regressed = (
+            delta > threshold and result["median_ms"] - base["median_ms"] > min_delta_ms
+        )
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<58}{base['median_ms']:>12.2f}{result['median_ms']:>10.2f}"
+            f"{delta:>+9.0%}{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--answers", type=int, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--words", type=int, nargs="+", default=[100, 400, 1600])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument(
+        "--pipeline-answers",
+        type=int,
+        nargs="+",
+        default=[3, 10],
+        help="Number of answers of the full pipeline cases",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="pipeline_suite_results.json")
+    parser.add_argument("--baseline", help="Results file of a previous run")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown of the median flagged as regression, 0.2 for 20%%",
+    )
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=1.0,
+        help="Smallest slowdown flagged as regression, to ignore timer noise",
+    )
+    args = parser.parse_args()
+
+    suite = Suite(args.repeat)
+    for answers in args.answers:
+        for words in args.words:
+            suite.answer_cases(answers, words)
+    for words in args.words:
+        suite.parse_cases(words)
+    for pages in args.pages:
+        suite.render_cases(pages)
+    for answers in args.pipeline_answers:
+        suite.pipeline_cases(answers, min(args.words))
+
+    results = {result.name: asdict(result) for result in suite.results}
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"metadata": run_metadata(), "results": results}, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cold, first-warm and steady-state render times of the generate lambda.
+
+Each configuration runs in a fresh interpreter, like a new Lambda execution
+environment:
+- init: importing the lambda module, including the priming render if enabled
+- first: the first document rendered by the handler code
+- steady: the median of the following renders
+
+Usage:
+    python -m benchmarks.render_warmup_benchmark [--renders 20]
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+DOCUMENT_TEXT = (
+    "## Summary\n\n"
+    "Most participants describe Amazon Bedrock as a managed service to build "
+    "generative AI applications with foundation models.\n\n"
+    "- Access to several foundation models through one API\n"
+    "- Private customization with fine-tuning and retrieval\n"
+)
+
+
+def measure(renders: int) -> dict:
+    """Measure the render times in the current interpreter."""
+    start = time.perf_counter()
+    from tools.stage_loader import load_stage_module
+
+    generate = load_stage_module("generate")
+    init_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for _ in range(renders + 1):
+        start = time.perf_counter()
+        generate.generate_pdf("benchmark", [("", DOCUMENT_TEXT)], io.BytesIO())
+        timings.append((time.perf_counter() - start) * 1000)
+
+    steady = sorted(timings[1:])
+    return {
+        "init_ms": init_ms,
+        "first_ms": timings[0],
+        "steady_ms": steady[len(steady) // 2],
+    }
+
+
+def run(renders: int):
+    header = f"{'priming':<10}{'init ms':>10}{'first ms':>10}{'steady ms':>11}{'cold total ms':>15}"
+    print(header)
+    print("-" * len(header))
+    for priming in ("false", "true"):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.render_warmup_benchmark",
+                "--renders",
+                str(renders),
+                "--child",
+            ],
+            env={
+                **os.environ,
+                "RENDERER_PRIMING_ENABLED": priming,
+                "POWERTOOLS_LOG_LEVEL": "ERROR",
+            },
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{priming:<10}{result['init_ms']:>10.0f}{result['first_ms']:>10.0f}"
+            f"{result['steady_ms']:>11.0f}"
+            f"{result['init_ms'] + result['first_ms']:>15.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--renders", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.renders)))
+    else:
+        run(args.renders)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Latency and throughput benchmark of the validate and summarize lambdas,
+replaying the Bedrock, Transcribe and S3 calls recorded from a real run.
+
+A first run with `--record` calls AWS once for a question folder that has
+already been transcribed, and writes the calls of both lambdas to cassette
+files, with the events of the lambdas. The credentials have to be set in the
+environmental variables 'AWS_ACCESS_KEY_ID' and 'AWS_SECRET_ACCESS_KEY'.
+
+The next runs replay the cassettes without calling AWS, so that the timings
+are reproducible and use realistic response bodies. With `--keep-latency`, a
+replayed call takes as long as the recorded one, which gives the end-to-end
+latency; without it, the timings cover the lambda code only. Throughput is
+measured by running the lambdas from several threads.
+
+Usage:
+    python -m benchmarks.replay_benchmark --record --document-name NAME
+        --transcribed-files s3://bucket/transcribe/question/answer1.txt ...
+    python -m benchmarks.replay_benchmark [--repeat 20] [--keep-latency]
+        [--concurrency 1 4 8]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+import numpy as np
+from tools.stage_loader import load_stage_module
+from tools.stand_ins import FakeLambdaContext
+
+EVENTS_FILE = "events.json"
+STAGES = ("validate", "summarize")
+
+
+def load_stages(mode: str, cassette_dir: str, keep_latency: bool = False) -> dict:
+    environment = {
+        "AWS_CASSETTE_MODE": mode,
+        "AWS_CASSETTE_DIR": cassette_dir,
+        "AWS_CASSETTE_REPLAY_LATENCY": str(keep_latency).lower(),
+    }
+    return {
+        stage: load_stage_module(stage, environment=environment) for stage in STAGES
+    }
+
+
+def record(cassette_dir: str, document_name: str, transcribed_files: List[str]):
+    """Run validate and summarize against AWS, recording their calls."""
+    os.makedirs(cassette_dir, exist_ok=True)
+    stages = load_stages("record", cassette_dir)
+    events = {
+        "validate": {
+            "statusCode": 200,
+            "documentName": document_name,
+            "transcribedFilesS3Uris": transcribed_files,
+            "serviceName": "app-transcribe",
+        }
+    }
+    output = stages["validate"].lambda_handler(
+        events["validate"], FakeLambdaContext("validate")
+    )
+    if not output.get("continueSummarization"):
+        raise SystemExit(f"The answers did not pass the validation: {output}")
+    events["summarize"] = output
+    stages["summarize"].lambda_handler(output, FakeLambdaContext("summarize"))
+
+    with open(os.path.join(cassette_dir, EVENTS_FILE), "w", encoding="utf-8") as file:
+        json.dump(events, file, indent=2)
+    print(f"Cassettes written to {cassette_dir}")
+
+
+def time_runs(function: Callable[[], object], runs: int, concurrency: int) -> list:
+    def timed(_):
+        start = time.perf_counter()
+        function()
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, range(runs)))
+
+
+def replay(cassette_dir: str, repeat: int, keep_latency: bool, concurrency: List[int]):
+    with open(os.path.join(cassette_dir, EVENTS_FILE), encoding="utf-8") as file:
+        events = json.load(file)
+    stages = load_stages("replay", cassette_dir, keep_latency)
+
+    print(f"{'stage':<12}{'threads':>8}{'median ms':>12}{'p95 ms':>10}{'runs/s':>10}")
+    for stage in STAGES:
+        handler = stages[stage].lambda_handler
+        context = FakeLambdaContext(stage)
+        handler(events[stage], context)  # warm-up
+
+        for threads in concurrency:
+            start = time.perf_counter()
+            timings = time_runs(
+                lambda: handler(events[stage], context), repeat, threads
+            )
+            throughput = repeat / (time.perf_counter() - start)
+            print(
+                f"{stage:<12}{threads:>8}{np.median(timings):>12.2f}"
+                f"{np.percentile(timings, 95):>10.2f}{throughput:>10.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--cassette-dir", default="cassettes")
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--document-name", help="Document name of the recorded run")
+    parser.add_argument(
+        "--transcribed-files",
+        nargs="+",
+        help="S3 URIs of the transcripts of the recorded run",
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep-latency", action="store_true")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.document_name or not args.transcribed_files:
+            parser.error("--record needs --document-name and --transcribed-files")
+        record(args.cassette_dir, args.document_name, args.transcribed_files)
+    else:
+        replay(args.cassette_dir, args.repeat, args.keep_latency, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of the per-section render cache of the generate lambda, on a
+multi-section document of about 200 pages, made of a few long sections and of
+many short ones.
+
+Three renders are timed with and without the section page cache:
+- first: nothing is cached
+- unchanged: the same sections are rendered again
+- one changed: a single section has a new summary of the same length
+
+Usage:
+    python -m benchmarks.section_cache_benchmark [--sections 40 --pages-per-section 5]
+"""
+
+import argparse
+import io
+import time
+from tools.stage_loader import load_stage_module
+
+PARAGRAPH = (
+    "Participants describe how foundation models accessed through a single API "
+    "help them prototype generative AI applications, and how private "
+    "customization keeps their data within their own account. "
+) * 8
+
+
+def build_sections(sections: int, pages_per_section: int) -> list:
+    """Build the title and markdown summary of every section."""
+    return [
+        (
+            f"Question {index}: what did the participants say?",
+            "\n\n".join(
+                f"{PARAGRAPH} (section {index}, page {page})"
+                for page in range(pages_per_section * 2)
+            ),
+        )
+        for index in range(1, sections + 1)
+    ]
+
+
+def timed_render(generate, document_sections: list) -> tuple:
+    cache = generate.section_page_cache
+    misses = cache.misses
+    start = time.perf_counter()
+    generate.generate_pdf("benchmark", document_sections, io.BytesIO())
+    return (time.perf_counter() - start) * 1000, cache.misses - misses
+
+
+def run(sections: int, pages_per_section: int):
+    generate = load_stage_module("generate")
+    print(f"\n{sections} sections of {pages_per_section} pages")
+    document_sections = build_sections(sections, pages_per_section)
+    changed_sections = list(document_sections)
+    title, text = changed_sections[sections // 2]
+    changed_sections[sections // 2] = (title, text.replace("help", "aid"))
+
+    header = f"{'page cache':<12}{'render':<14}{'ms':>10}{'sections laid out':>19}"
+    print(header)
+    print("-" * len(header))
+    for page_cache_enabled in (False, True):
+        generate.Connections.section_page_cache_enabled = page_cache_enabled
+        generate.section_html_cache = generate.RenderCache(
+            generate.Connections.section_cache_size
+        )
+        generate.section_page_cache = generate.RenderCache(
+            generate.Connections.section_cache_size,
+            max_weight=generate.Connections.section_page_cache_pages,
+        )
+        for name, rendered_sections in (
+            ("first", document_sections),
+            ("unchanged", document_sections),
+            ("one changed", changed_sections),
+        ):
+            elapsed_ms, laid_out = timed_render(generate, rendered_sections)
+            laid_out = laid_out if page_cache_enabled else "all"
+            print(
+                f"{str(page_cache_enabled):<12}{name:<14}{elapsed_ms:>10.0f}"
+                f"{laid_out:>19}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int)
+    parser.add_argument("--pages-per-section", type=int)
+    args = parser.parse_args()
+    if args.sections or args.pages_per_section:
+        run(args.sections or 10, args.pages_per_section or 20)
+    else:
+        # A few long sections, and many short ones
+        for sections, pages_per_section in ((10, 20), (40, 5)):
+            run(sections, pages_per_section)
+
+
+if __name__ == "__main__":
+    main()
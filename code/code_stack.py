@@ -1,6 +1,8 @@
+import json
 import os
 import os.path as path
 from aws_cdk import (
+    BundlingOptions,
     Duration,
     Stack,
     Aws,
@@ -10,6 +12,7 @@ from aws_cdk import (
     aws_iam as iam,
     aws_s3 as s3,
     aws_logs as logs,
+    aws_dynamodb as dynamodb,
     aws_lambda as lambda_,
     aws_s3_deployment as s3deploy,
     aws_stepfunctions as sfn,
@@ -23,10 +26,23 @@ from cdk_nag import NagSuppressions
 PARENT_DIR: str = path.join(os.path.dirname(__file__), "..")
 AUDIO_SAMPLES_PATH: str = path.join(PARENT_DIR, "assets", "audio_samples")
 LAMBDA_PATH: str = path.join(PARENT_DIR, "code", "lambdas")
+SHARED_PATH: str = path.join(LAMBDA_PATH, "shared")
 POWERTOOLS_ARN: str = (
     f"arn:aws:lambda:{Aws.REGION}:017000801446:layer:AWSLambdaPowertoolsPythonV2:67"
 )
 APP_LOG_LEVEL = "INFO"
+# Memory of the lambda functions in MB, overridden by the `memorySizes` context,
+# e.g. with the recommendation of `tools/memory_report.py`
+MEMORY_SIZES = {
+    "preprocess": 1024,
+    "transcribe": 1024,
+    "validate": 2048,
+    "summarize": 2048,
+    "generate": 2048,
+    # Memory sets the number of vCPUs, and so of worker processes (6 vCPUs)
+    "batch-generate": 10240,
+    "fastpath": 3008,
+}
 
 
 class CodeStack(Stack):
@@ -41,13 +57,15 @@ class CodeStack(Stack):
         audio_bucket: s3.Bucket = self.create_data_source_bucket(kms_key)
         sns_topic: sns.Topic = self.create_sns_topic(kms_key)
         self.upload_assets_to_bucket(audio_bucket, kms_key)
+        idempotency_table: dynamodb.Table = self.create_idempotency_table(kms_key)
         (
             lambda_function_preprocess,
             lambda_function_transcribe,
             lambda_function_validate,
             lambda_function_summarize,
             lambda_function_generate,
-        ) = self.create_lambda_functions(audio_bucket, kms_key)
+            lambda_function_fastpath,
+        ) = self.create_lambda_functions(audio_bucket, kms_key, idempotency_table)
         self.create_step_functions_state_machine(
             kms_key,
             sns_topic,
@@ -56,6 +74,7 @@ class CodeStack(Stack):
             lambda_function_validate,
             lambda_function_summarize,
             lambda_function_generate,
+            lambda_function_fastpath,
         )
 
     def create_sns_topic(self, kms_key: kms.Key) -> sns.Topic:
@@ -161,10 +180,42 @@ class CodeStack(Stack):
             server_side_encryption_aws_kms_key_id=kms_key.key_id,
         )
 
-    def create_lambda_functions(self, bucket: s3.Bucket, kms_key: kms.Key):
+    def create_idempotency_table(self, kms_key: kms.Key) -> dynamodb.Table:
+        """
+        Create a DynamoDB table to store the idempotency records of the lambda
+        handlers, expired with a TTL
+        """
+        idempotency_table = dynamodb.Table(
+            self,
+            "IdempotencyTable",
+            table_name=f"{Aws.STACK_NAME}-idempotency",
+            partition_key=dynamodb.Attribute(
+                name="id", type=dynamodb.AttributeType.STRING
+            ),
+            time_to_live_attribute="expiration",
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            encryption=dynamodb.TableEncryption.CUSTOMER_MANAGED,
+            encryption_key=kms_key,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        NagSuppressions.add_resource_suppressions(
+            idempotency_table,
+            suppressions=[
+                {
+                    "id": "AwsSolutions-DDB3",
+                    "reason": "Idempotency records expire within hours, so point-in-time recovery is not enabled",
+                }
+            ],
+        )
+        return idempotency_table
+
+    def create_lambda_functions(
+        self, bucket: s3.Bucket, kms_key: kms.Key, idempotency_table: dynamodb.Table
+    ):
         """
         Create lambda functions
         """
+        memory_sizes = self.get_memory_sizes()
 
         bedrock_policy = iam.Policy(
             self,
@@ -227,11 +278,35 @@ class CodeStack(Stack):
         lambda_role.attach_inline_policy(s3_policy)
         lambda_role.attach_inline_policy(xray_policy)
         kms_key.grant_encrypt_decrypt(lambda_role)
+        idempotency_table.grant_read_write_data(lambda_role)
 
         powertools_layer = lambda_.LayerVersion.from_layer_version_arn(
             self, id="PowertoolsLayer", layer_version_arn=POWERTOOLS_ARN
         )
 
+        # The modules shared by the lambdas, e.g. instrumentation and
+        # idempotency, for the functions deployed from a zip file. The
+        # container images copy the shared folder instead.
+        shared_layer = lambda_.LayerVersion(
+            self,
+            "SharedLayer",
+            layer_version_name=f"{Aws.STACK_NAME}-shared",
+            description="Modules shared by the lambda functions",
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
+            compatible_architectures=[lambda_.Architecture.ARM_64],
+            code=lambda_.Code.from_asset(
+                SHARED_PATH,
+                bundling=BundlingOptions(
+                    image=lambda_.Runtime.PYTHON_3_12.bundling_image,
+                    command=[
+                        "bash",
+                        "-c",
+                        "mkdir -p /asset-output/python && cp *.py /asset-output/python",
+                    ],
+                ),
+            ),
+        )
+
         # create preprocessing lambda function
         lambda_function_preprocess = lambda_.Function(
             self,
@@ -251,8 +326,8 @@ class CodeStack(Stack):
             environment_encryption=kms_key,
             role=lambda_role,
             timeout=Duration.minutes(15),
-            memory_size=1024,
-            layers=[powertools_layer],
+            memory_size=memory_sizes["preprocess"],
+            layers=[powertools_layer, shared_layer],
             tracing=lambda_.Tracing.ACTIVE,
         )
 
@@ -271,18 +346,20 @@ class CodeStack(Stack):
                 "POWERTOOLS_SERVICE_NAME": "app-transcribe",
                 "POWERTOOLS_METRICS_NAMESPACE": f"{Aws.STACK_NAME}-ns",
                 "POWERTOOLS_LOG_LEVEL": APP_LOG_LEVEL,
+                "IDEMPOTENCY_TABLE_NAME": idempotency_table.table_name,
             },
             environment_encryption=kms_key,
             role=lambda_role,
             timeout=Duration.minutes(15),
-            memory_size=1024,
-            layers=[powertools_layer],
+            memory_size=memory_sizes["transcribe"],
+            layers=[powertools_layer, shared_layer],
             tracing=lambda_.Tracing.ACTIVE,
         )
 
         # create lambda function for answer analysis using LLM (3)
         ecr_image_answer_analysis = lambda_.EcrImageCode.from_asset_image(
-            directory=path.join(LAMBDA_PATH, "validate"),
+            directory=LAMBDA_PATH,
+            file=path.join("validate", "Dockerfile"),
             platform=Platform.LINUX_ARM64,
         )
 
@@ -300,17 +377,19 @@ class CodeStack(Stack):
                 "POWERTOOLS_SERVICE_NAME": "app-validate",
                 "POWERTOOLS_METRICS_NAMESPACE": f"{Aws.STACK_NAME}-ns",
                 "POWERTOOLS_LOG_LEVEL": APP_LOG_LEVEL,
+                "IDEMPOTENCY_TABLE_NAME": idempotency_table.table_name,
             },
             environment_encryption=kms_key,
             role=lambda_role,
             timeout=Duration.minutes(15),
-            memory_size=2048,
+            memory_size=memory_sizes["validate"],
             tracing=lambda_.Tracing.ACTIVE,
         )
 
         # create lambda function for summary using LLM (7)
         ecr_image_summary = lambda_.EcrImageCode.from_asset_image(
-            directory=path.join(LAMBDA_PATH, "summarize"),
+            directory=LAMBDA_PATH,
+            file=path.join("summarize", "Dockerfile"),
             platform=Platform.LINUX_ARM64,
         )
 
@@ -328,17 +407,21 @@ class CodeStack(Stack):
                 "POWERTOOLS_SERVICE_NAME": "app-summarize",
                 "POWERTOOLS_METRICS_NAMESPACE": f"{Aws.STACK_NAME}-ns",
                 "POWERTOOLS_LOG_LEVEL": APP_LOG_LEVEL,
+                "IDEMPOTENCY_TABLE_NAME": idempotency_table.table_name,
+                "TRANSCRIPT_COMPRESSION_ENABLED": "false",
+                "TRANSCRIPT_COMPRESSION_RATIO": "0.6",
             },
             environment_encryption=kms_key,
             role=lambda_role,
             timeout=Duration.minutes(15),
-            memory_size=2048,
+            memory_size=memory_sizes["summarize"],
             tracing=lambda_.Tracing.ACTIVE,
         )
 
         # create lambda function for document generation, using container (4)
         ecr_image_docgen = lambda_.EcrImageCode.from_asset_image(
-            directory=path.join(LAMBDA_PATH, "generate"),
+            directory=LAMBDA_PATH,
+            file=path.join("generate", "Dockerfile"),
             platform=Platform.LINUX_ARM64,
         )
 
@@ -356,11 +439,78 @@ class CodeStack(Stack):
                 "POWERTOOLS_SERVICE_NAME": "app-generate",
                 "POWERTOOLS_METRICS_NAMESPACE": f"{Aws.STACK_NAME}-ns",
                 "POWERTOOLS_LOG_LEVEL": APP_LOG_LEVEL,
+                "IDEMPOTENCY_TABLE_NAME": idempotency_table.table_name,
             },
             environment_encryption=kms_key,
             role=lambda_role,
             timeout=Duration.minutes(15),
-            memory_size=2048,
+            memory_size=memory_sizes["generate"],
+            tracing=lambda_.Tracing.ACTIVE,
+        )
+
+        # create lambda function for batch document generation, using the
+        # container of the generate lambda with another entry point (5)
+        ecr_image_batch_docgen = lambda_.EcrImageCode.from_asset_image(
+            directory=LAMBDA_PATH,
+            file=path.join("generate", "Dockerfile"),
+            platform=Platform.LINUX_ARM64,
+            cmd=["batch_generate.lambda_handler"],
+        )
+
+        lambda_.Function(
+            self,
+            "BatchGenerateLambda",
+            function_name=f"{Aws.STACK_NAME}-batch-generate",
+            description="Lambda code for generating batches of documents",
+            architecture=lambda_.Architecture.ARM_64,
+            handler=lambda_.Handler.FROM_IMAGE,
+            runtime=lambda_.Runtime.FROM_IMAGE,
+            code=ecr_image_batch_docgen,
+            environment={
+                "DATA_SOURCE_BUCKET_NAME": bucket.bucket_name,
+                "POWERTOOLS_SERVICE_NAME": "app-batch-generate",
+                "POWERTOOLS_METRICS_NAMESPACE": f"{Aws.STACK_NAME}-ns",
+                "POWERTOOLS_LOG_LEVEL": APP_LOG_LEVEL,
+                # The pages laid out by the worker processes are lost with them
+                "SECTION_PAGE_CACHE_ENABLED": "false",
+            },
+            environment_encryption=kms_key,
+            role=lambda_role,
+            timeout=Duration.minutes(15),
+            memory_size=memory_sizes["batch-generate"],
+            tracing=lambda_.Tracing.ACTIVE,
+        )
+
+        # create lambda function running all the stages for small documents,
+        # built from the lambdas folder as it bundles the code of every stage (6)
+        ecr_image_fastpath = lambda_.EcrImageCode.from_asset_image(
+            directory=LAMBDA_PATH,
+            file=path.join("fastpath", "Dockerfile"),
+            platform=Platform.LINUX_ARM64,
+        )
+
+        lambda_function_fastpath = lambda_.Function(
+            self,
+            "FastPathLambda",
+            function_name=f"{Aws.STACK_NAME}-fastpath",
+            description="Lambda code for generating small documents in a single invocation",
+            architecture=lambda_.Architecture.ARM_64,
+            handler=lambda_.Handler.FROM_IMAGE,
+            runtime=lambda_.Runtime.FROM_IMAGE,
+            code=ecr_image_fastpath,
+            environment={
+                "DATA_SOURCE_BUCKET_NAME": bucket.bucket_name,
+                "POWERTOOLS_SERVICE_NAME": "app-fastpath",
+                "POWERTOOLS_METRICS_NAMESPACE": f"{Aws.STACK_NAME}-ns",
+                "POWERTOOLS_LOG_LEVEL": APP_LOG_LEVEL,
+                "IDEMPOTENCY_TABLE_NAME": idempotency_table.table_name,
+                "TRANSCRIPT_COMPRESSION_ENABLED": "false",
+                "TRANSCRIPT_COMPRESSION_RATIO": "0.6",
+            },
+            environment_encryption=kms_key,
+            role=lambda_role,
+            timeout=Duration.minutes(15),
+            memory_size=memory_sizes["fastpath"],
             tracing=lambda_.Tracing.ACTIVE,
         )
 
@@ -370,8 +520,19 @@ class CodeStack(Stack):
             lambda_function_validate,
             lambda_function_summarize,
             lambda_function_generate,
+            lambda_function_fastpath,
         )
 
+    def get_memory_sizes(self) -> dict:
+        """
+        Get the memory of every lambda function, from the `memorySizes` context
+        as an object or a JSON string, e.g. `-c memorySizes='{"generate": 1536}'`
+        """
+        memory_sizes = self.node.try_get_context("memorySizes") or {}
+        if isinstance(memory_sizes, str):
+            memory_sizes = json.loads(memory_sizes)
+        return {**MEMORY_SIZES, **{k: int(v) for k, v in memory_sizes.items()}}
+
     def create_step_functions_state_machine(
         self,
         kms_key: kms.Key,
@@ -381,6 +542,7 @@ class CodeStack(Stack):
         lambda_function_validate: lambda_.Function,
         lambda_function_summarize: lambda_.Function,
         lambda_function_generate: lambda_.Function,
+        lambda_function_fastpath: lambda_.Function,
     ):
         """
         Create a Step Functions state machine using the JSON definition file
@@ -433,6 +595,7 @@ class CodeStack(Stack):
                 "validate_lambda_arn": lambda_function_validate.function_arn,
                 "summarize_lambda_arn": lambda_function_summarize.function_arn,
                 "generate_lambda_arn": lambda_function_generate.function_arn,
+                "fastpath_lambda_arn": lambda_function_fastpath.function_arn,
             },
             tracing_configuration=sfn.CfnStateMachine.TracingConfigurationProperty(
                 enabled=True
@@ -0,0 +1,39 @@
+import os
+import boto3
+from aws_lambda_powertools import Logger, Tracer, Metrics
+from object_cache import S3ObjectCache
+from recorder import attach_recorder
+from instrumentation import instrument_client
+
+tracer = Tracer()
+logger = Logger(log_uncaught_exceptions=True, serialize_stacktrace=True)
+metrics = Metrics()
+
+
+class Connections:
+    """
+    A class to maintain connections to external dependencies
+
+    Attributes
+    ----------
+    region_name : str
+        The AWS Region name where the AWS Lambda function is running.
+        Depends on the environmental variable 'AWS_REGION'
+    service_name: str
+        Name of the service assigned and configured through AWS Powertools for
+        logging. Depends on the environmental variable 'POWERTOOLS_SERVICE_NAME'
+    s3_client : boto3.client
+        Boto3 client to interact with AWS S3 bucket
+    s3_object_cache : S3ObjectCache
+        The S3 client given to the stages. It keeps the objects written by a
+        stage in memory, so that the next stages read them without S3 round trips,
+        and only writes the outputs of the pipeline to S3.
+    """
+
+    region_name = os.environ["AWS_REGION"]
+    service_name = os.environ["POWERTOOLS_SERVICE_NAME"]
+
+    s3_client = instrument_client(
+        attach_recorder(boto3.client(service_name="s3", region_name=region_name))
+    )
+    s3_object_cache = S3ObjectCache(s3_client)
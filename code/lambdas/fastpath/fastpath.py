@@ -0,0 +1,229 @@
+from aws_lambda_powertools.metrics import MetricUnit
+from aws_lambda_powertools.utilities.typing import LambdaContext
+from aws_lambda_powertools.utilities.parser import event_parser, BaseModel
+from connections import Connections, tracer, logger, metrics
+from instrumentation import instrument_handler
+from idempotency import idempotent_handler
+from dataclasses import dataclass, field
+from exceptions import CodeError
+from stage_loader import STAGE_HANDLERS, load_stage_module
+from typing import Dict, List, Optional
+import os
+import time
+
+# The outputs of these stages, the transcripts and the summary, are only read
+# by the next stages, so they are kept in memory instead of written to S3
+INTERMEDIATE_OBJECTS_IN_MEMORY = (
+    os.environ.get("INTERMEDIATE_OBJECTS_IN_MEMORY", "true").lower() == "true"
+)
+INTERMEDIATE_STAGES = ("transcribe", "summarize")
+
+
+def stage_s3_client(stage: str):
+    if INTERMEDIATE_OBJECTS_IN_MEMORY and stage in INTERMEDIATE_STAGES:
+        return Connections.s3_object_cache.in_memory()
+    return Connections.s3_object_cache
+
+
+def stage_environment(stage: str) -> Dict[str, str]:
+    # The stored responses of these stages would refer to objects that are
+    # gone after the invocation, so they run again on every invocation, and
+    # the idempotency record of the fast path stands for the whole pipeline
+    if INTERMEDIATE_OBJECTS_IN_MEMORY and stage in INTERMEDIATE_STAGES:
+        return {"IDEMPOTENCY_ENABLED": "false"}
+    return {}
+
+
+# Import every stage during the lambda initialization, which also primes the
+# PDF renderer of the generate stage
+stages = {
+    stage: load_stage_module(
+        stage,
+        clients={"s3": stage_s3_client(stage)},
+        environment=stage_environment(stage),
+    )
+    for stage in STAGE_HANDLERS
+}
+
+
+@dataclass
+class Response:
+    """
+    A class for representing the Output format of the AWS Lambda
+
+    Attributes:
+    -----------
+    statusCode: int
+        A HTTP status code that denotes the output status of the pipeline.
+        A `200` values means the document was generated successfully
+    pdfFileS3Uri: str
+        A string that denotes the S3 object URL of the generated PDF file.
+    documentName: str
+        A string that denotes the name of the document that is being processed.
+    outputS3Uris: Dict[str, str]
+        The S3 object URL of the generated file of every output format.
+    stageDurations: Dict[str, float]
+        The duration of every stage, in seconds.
+    serviceName: str
+        The name of the AWS Lambda as configured through AWS powertools
+    costLedger: Dict[str, dict]
+        The billed usage of every stage that processed the document.
+    correlationId: str
+        The identifier correlating the traces and logs of every stage.
+    """
+
+    statusCode: int
+    pdfFileS3Uri: str
+    documentName: str
+    outputS3Uris: Dict[str, str] = field(default_factory=dict)
+    stageDurations: Dict[str, float] = field(default_factory=dict)
+    serviceName: str = Connections.service_name
+    costLedger: Dict[str, dict] = field(default_factory=dict)
+    correlationId: str = ""
+
+
+class Request(BaseModel):
+    """
+    A class for representing the Input format of the AWS Lambda
+
+    Attributes:
+    -----------
+    documentName: str
+        A string that denotes the name of the document that is being processed.
+    audioFileFolderUri: str
+        The S3 folder path containing the audio files to be processed. Used
+        when `audioFilesS3Uris` is empty, to run the preprocess stage.
+    audioFilesS3Uris: List[str]
+        The S3 object URLs of the audio files, as found by the `preprocess`
+        lambda when it routes the document to the fast path.
+    costLedger: Dict[str, dict]
+        The billed usage of the `preprocess` lambda, when it routes the
+        document to the fast path.
+    correlationId: str
+        The identifier correlating the traces and logs of every stage,
+        generated when not given.
+    """
+
+    documentName: str
+    audioFileFolderUri: Optional[str] = None
+    audioFilesS3Uris: List[str] = []
+    costLedger: Dict[str, dict] = {}
+    correlationId: Optional[str] = None
+
+
+@logger.inject_lambda_context(log_event=True, clear_state=True)
+@tracer.capture_lambda_handler
+@metrics.log_metrics(capture_cold_start_metric=True)
+@idempotent_handler(
+    "fastpath",
+    "documentName",
+    "audioFileFolderUri",
+    "audioFilesS3Uris",
+    s3_client=Connections.s3_client,
+)
+@event_parser(model=Request)
+@instrument_handler("fastpath", cost_ledger=False)
+def lambda_handler(event: Request, context: LambdaContext):
+    """
+    This is main function that is invoked when AWS Lambda is triggered.
+    It runs all the stages of the pipeline for a small document in this
+    process, by calling the handler of every stage with the output of the
+    previous one. The objects written by a stage are read by the next stages
+    from memory instead of S3, and the transcripts and the summary are not
+    written to S3.
+
+    Arguments:
+    ----------
+        event (Request): The input data from Step function, or from the user
+        context (LambdaContext): This object provides methods and
+            properties that provide information about the invocation,
+            function, and execution environment.
+
+    Returns:
+    --------
+        dict: Returns a JSON or dict object that conforms to the Output format
+            defined by the `Response` class
+    """
+    Connections.s3_object_cache.clear()
+    durations = {}
+
+    if event.audioFilesS3Uris:
+        output = {
+            "statusCode": 200,
+            "documentName": event.documentName,
+            "audioFilesS3Uris": event.audioFilesS3Uris,
+            "serviceName": "app-preprocess",
+            "costLedger": event.costLedger,
+            "correlationId": event.correlationId,
+        }
+    else:
+        output = run_stage(
+            "preprocess",
+            {
+                "documentName": event.documentName,
+                "audioFileFolderUri": event.audioFileFolderUri,
+                "correlationId": event.correlationId,
+            },
+            context,
+            durations,
+        )
+    for stage in ("transcribe", "validate", "summarize", "generate"):
+        output = run_stage(stage, output, context, durations)
+
+    metrics.add_metric(name="FastPathSuccessful", unit=MetricUnit.Count, value=1)
+    metrics.add_metric(
+        name="FastPathDuration",
+        unit=MetricUnit.Seconds,
+        value=sum(durations.values()),
+    )
+    metrics.add_metric(
+        name="FastPathInMemoryReads",
+        unit=MetricUnit.Count,
+        value=Connections.s3_object_cache.hits,
+    )
+
+    response = Response(
+        statusCode=output["statusCode"],
+        pdfFileS3Uri=output["pdfFileS3Uri"],
+        documentName=event.documentName,
+        outputS3Uris=output["outputS3Uris"],
+        stageDurations=durations,
+        costLedger=output["costLedger"],
+    ).__dict__
+
+    logger.info(f"Lambda Output: {response}")
+
+    return response
+
+
+@tracer.capture_method
+def run_stage(
+    stage: str, stage_input: dict, context: LambdaContext, durations: Dict[str, float]
+) -> dict:
+    """
+    This method is to run the handler of a stage, and stop the pipeline when
+    the stage does not succeed, like the state machine does
+
+    Arguments:
+    ----------
+        stage (str): The name of the stage, e.g. "validate"
+        stage_input (dict): The input of the stage, i.e. the output of the
+            previous stage
+        context (LambdaContext): The context of the invocation
+        durations (Dict[str, float]): The duration of every stage, updated
+            with the duration of this stage
+
+    Returns:
+    --------
+        dict: The output of the stage
+    """
+    start = time.perf_counter()
+    output = stages[stage].lambda_handler(stage_input, context)
+    durations[stage] = round(time.perf_counter() - start, 3)
+    logger.info(f"Stage {stage} finished in {durations[stage]} seconds")
+
+    if stage == "validate" and not output.get("continueSummarization"):
+        raise CodeError("Validation failed during to answer analysis")
+    if output.get("statusCode") != 200:
+        raise CodeError(f"Stage {stage} failed: {output}")
+    return output
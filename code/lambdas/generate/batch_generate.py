@@ -0,0 +1,335 @@
+from aws_lambda_powertools.metrics import MetricUnit
+from aws_lambda_powertools.utilities.typing import LambdaContext
+from aws_lambda_powertools.utilities.parser import event_parser, BaseModel
+from concurrent.futures import Future, ThreadPoolExecutor
+from connections import Connections, tracer, logger, metrics
+from dataclasses import dataclass, field
+from generate import (
+    Request,
+    get_document_sections,
+    get_document_file_path,
+    get_document_metadata,
+    get_unchanged_document_uri,
+    render_document_file,
+    upload_document_to_s3,
+)
+from instrumentation import in_trace_context
+from multiprocessing.connection import Connection, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import io
+import multiprocessing
+
+# A document to render: its position in the batch, name, sections and formats
+RenderJob = Tuple[int, str, List[Tuple[str, str]], List[str]]
+
+
+@dataclass
+class DocumentResult:
+    """
+    A class for representing the outcome of one document of the batch
+
+    Attributes:
+    -----------
+    documentName: str
+        A string that denotes the name of the document.
+    statusCode: int
+        A HTTP status code that denotes the output status of the document.
+        A `200` value means the document was generated successfully
+    outputS3Uris: Dict[str, str]
+        The S3 object URL of the generated file of every requested output format.
+    error: str
+        The reason the document could not be generated, empty on success.
+    """
+
+    documentName: str
+    statusCode: int = 200
+    outputS3Uris: Dict[str, str] = field(default_factory=dict)
+    error: str = ""
+
+
+@dataclass
+class Response:
+    """
+    A class for representing the Output format of the AWS Lambda
+
+    Attributes:
+    -----------
+    statusCode: int
+        A HTTP status code that denotes the output status of the batch.
+        `200` when all documents were generated, `207` when some failed
+        and `400` when all failed.
+    documents: List[dict]
+        The outcome of every document, in the order of the request.
+    succeeded: int
+        The number of documents generated successfully.
+    failed: int
+        The number of documents that could not be generated.
+    serviceName: str
+        The name of the AWS Lambda as configured through AWS powertools
+    """
+
+    statusCode: int
+    documents: List[dict]
+    succeeded: int
+    failed: int
+    serviceName: str = Connections.service_name
+
+
+class BatchRequest(BaseModel):
+    """
+    A class for representing the Input format of the AWS Lambda
+
+    Attributes:
+    -----------
+    documents: List[Request]
+        The documents to generate, in the input format of the `generate` lambda.
+    """
+
+    documents: List[Request]
+
+
+@logger.inject_lambda_context(log_event=True, clear_state=True)
+@tracer.capture_lambda_handler
+@metrics.log_metrics(capture_cold_start_metric=True)
+@event_parser(model=BatchRequest)
+def lambda_handler(event: BatchRequest, context: LambdaContext):
+    """
+    This is main function that is invoked when AWS Lambda is triggered.
+    It generates a batch of documents, laying them out in a pool of worker
+    processes sized to the available vCPUs. Every file is uploaded to S3 as
+    soon as its document is rendered, and a failed document does not fail
+    the batch.
+
+    Arguments:
+    ----------
+        event (BatchRequest): The documents to generate
+        context (LambdaContext): This object provides methods and
+            properties that provide information about the invocation,
+            function, and execution environment.
+
+    Returns:
+    --------
+        dict: Returns a JSON or dict object that conforms to the Output format
+            defined by the `Response` class
+    """
+    metrics.add_metric(
+        name="TotalBatchGenerateInvocation", unit=MetricUnit.Count, value=1
+    )
+    results = [DocumentResult(document.documentName) for document in event.documents]
+    jobs, metadata = prepare_jobs(event.documents, results)
+
+    workers = max(1, min(Connections.batch_workers, len(jobs)))
+    logger.info(f"Rendering {len(jobs)} documents with {workers} worker processes")
+
+    # Upload in threads, so that the parent process keeps feeding the workers
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        uploads: List[Tuple[int, str, Future]] = []
+        for index, files, error in render_in_process_pool(jobs, workers):
+            if error:
+                fail_document(results[index], error)
+                continue
+            file_path = get_document_file_path(results[index].documentName)
+            for output_format, content in files.items():
+                uploads.append(
+                    (
+                        index,
+                        output_format,
+                        executor.submit(
+                            in_trace_context(upload_document_to_s3),
+                            io.BytesIO(content),
+                            file_path,
+                            metadata[index],
+                            output_format,
+                        ),
+                    )
+                )
+
+        for index, output_format, upload in uploads:
+            try:
+                results[index].outputS3Uris[output_format] = upload.result()
+            except Exception as error:
+                fail_document(results[index], str(error))
+
+    failed = sum(result.statusCode != 200 for result in results)
+    succeeded = len(results) - failed
+    metrics.add_metric(
+        name="DocumentGenerationSuccessful", unit=MetricUnit.Count, value=succeeded
+    )
+    metrics.add_metric(
+        name="DocumentGenerationFailed", unit=MetricUnit.Count, value=failed
+    )
+
+    response = Response(
+        statusCode=200 if failed == 0 else 207 if succeeded else 400,
+        documents=[result.__dict__ for result in results],
+        succeeded=succeeded,
+        failed=failed,
+    ).__dict__
+
+    logger.debug(f"Lambda Output: {response}")
+
+    return response
+
+
+def fail_document(result: DocumentResult, error: str) -> None:
+    """
+    This method is to record the failure of a document of the batch
+
+    Arguments:
+    ----------
+        result (DocumentResult): The outcome of the document
+        error (str): The reason the document could not be generated
+    """
+    logger.warning(f"Unable to generate document {result.documentName}: {error}")
+    result.statusCode = 400
+    result.error = error
+
+
+@tracer.capture_method
+def prepare_jobs(
+    documents: List[Request], results: List[DocumentResult]
+) -> Tuple[List[RenderJob], Dict[int, dict]]:
+    """
+    This method is to get the answer summaries of the documents, and find the
+    files that must be rendered because their inputs have changed
+
+    Arguments:
+    ----------
+        documents (List[Request]): The documents of the batch
+        results (List[DocumentResult]): The outcome of every document, updated
+            with the reused files and the failures
+
+    Returns:
+    --------
+        Tuple[List[RenderJob], Dict[int, dict]]: The documents to render, and
+            the S3 object metadata of every document to render, by position
+    """
+    jobs = []
+    metadata = {}
+    for index, document in enumerate(documents):
+        try:
+            output_formats = list(dict.fromkeys(document.outputFormats))
+            if not output_formats:
+                raise ValueError("No output format requested")
+            document_sections = get_document_sections(document)
+            if not "".join(text for _, text in document_sections):
+                raise ValueError("No data available to render as document")
+
+            file_path = get_document_file_path(document.documentName)
+            document_metadata = get_document_metadata(document_sections)
+            pending_formats = []
+            for output_format in output_formats:
+                s3_url = None
+                if Connections.skip_unchanged_documents:
+                    s3_url = get_unchanged_document_uri(
+                        file_path, document_metadata, output_format
+                    )
+                if s3_url:
+                    results[index].outputS3Uris[output_format] = s3_url
+                else:
+                    pending_formats.append(output_format)
+        except Exception as error:
+            fail_document(results[index], str(error))
+            continue
+
+        if pending_formats:
+            jobs.append(
+                (index, document.documentName, document_sections, pending_formats)
+            )
+            metadata[index] = document_metadata
+    return jobs, metadata
+
+
+def render_worker(connection: Connection) -> None:
+    """
+    This method is the main loop of a worker process. It renders the documents
+    received from the parent process, until it receives `None`.
+
+    Arguments:
+    ----------
+        connection (Connection): The worker end of the pipe to the parent process
+    """
+    while True:
+        job = connection.recv()
+        if job is None:
+            break
+        index, document_name, document_sections, output_formats = job
+        try:
+            files = {}
+            for output_format in output_formats:
+                document_file = io.BytesIO()
+                render_document_file(
+                    document_name, document_sections, output_format, document_file
+                )
+                files[output_format] = document_file.getvalue()
+            connection.send((index, files, None))
+        except Exception as error:
+            connection.send((index, None, f"{type(error).__name__}: {error}"))
+    connection.close()
+
+
+def render_in_process_pool(
+    jobs: Iterable[RenderJob], workers: int
+) -> Iterator[Tuple[int, Optional[Dict[str, bytes]], Optional[str]]]:
+    """
+    This method is to render documents in a pool of worker processes, yielding
+    every document as soon as it is rendered.
+
+    AWS Lambda has no shared memory (`/dev/shm`), which `multiprocessing.Pool`
+    and `multiprocessing.Queue` require, so every worker gets its own pipe.
+    The workers are forked, and inherit the fonts and stylesheet already
+    loaded by the parent process.
+
+    Arguments:
+    ----------
+        jobs (Iterable[RenderJob]): The documents to render
+        workers (int): The number of worker processes
+
+    Returns:
+    --------
+        Iterator[Tuple[int, Optional[Dict[str, bytes]], Optional[str]]]: The position
+            of every document in the batch, with its rendered files by output format,
+            or the reason it could not be rendered
+    """
+    pending = iter(jobs)
+    context = multiprocessing.get_context("fork")
+    processes = []
+    busy: Dict[Connection, int] = {}
+
+    def dispatch(connection: Connection) -> None:
+        job = next(pending, None)
+        connection.send(job)
+        if job is not None:
+            busy[connection] = job[0]
+
+    try:
+        for _ in range(workers):
+            parent_connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=render_worker, args=(worker_connection,), daemon=True
+            )
+            process.start()
+            worker_connection.close()
+            processes.append(process)
+            dispatch(parent_connection)
+
+        while busy:
+            for connection in wait(list(busy)):
+                try:
+                    index, files, error = connection.recv()
+                except EOFError:
+                    # The worker process exited, e.g. when it ran out of memory
+                    yield busy.pop(connection), None, "Worker process exited"
+                    continue
+                busy.pop(connection)
+                yield index, files, error
+                dispatch(connection)
+
+        # All the workers exited before the end of the batch
+        for job in pending:
+            yield job[0], None, "No worker process available"
+    finally:
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
@@ -1,6 +1,8 @@
 import os
 import boto3
 from aws_lambda_powertools import Logger, Tracer, Metrics
+from recorder import attach_recorder
+from instrumentation import instrument_client
 
 tracer = Tracer()
 logger = Logger(log_uncaught_exceptions=True, serialize_stacktrace=True)
@@ -21,6 +23,62 @@ class Connections:
     service_name: str
         Name of the service assigned and configured through AWS Powertools for
         logging. Depends on the environmental variable 'POWERTOOLS_SERVICE_NAME'
+    skip_unchanged_documents : bool
+        Whether to reuse the PDF file of a previous run when the summary and the
+        render version are unchanged. Depends on the environmental variable
+        'SKIP_UNCHANGED_DOCUMENTS'
+    pdf_spool_max_bytes : int
+        Size above which the rendered PDF file is spilled from memory to a
+        temporary file. Depends on the environmental variable 'PDF_SPOOL_MAX_SIZE_MB'
+    multipart_threshold_bytes : int
+        Size above which the PDF file is uploaded with a multipart upload.
+        Depends on the environmental variable 'MULTIPART_THRESHOLD_MB'
+    multipart_chunksize_bytes : int
+        Size of the parts of a multipart upload.
+        Depends on the environmental variable 'MULTIPART_CHUNKSIZE_MB'
+    renderer_priming_enabled : bool
+        Whether to render a short document during the lambda initialization.
+        Depends on the environmental variable 'RENDERER_PRIMING_ENABLED'
+    section_fetch_workers : int
+        Number of answer summaries of a multi-section document fetched concurrently.
+        Depends on the environmental variable 'SECTION_FETCH_WORKERS'
+    section_page_cache_enabled : bool
+        Whether to lay out the sections of a multi-section document separately and
+        reuse the pages of unchanged sections across warm invocations.
+        Depends on the environmental variable 'SECTION_PAGE_CACHE_ENABLED'
+    section_cache_size : int
+        Number of rendered section bodies kept in memory across warm invocations.
+        Depends on the environmental variable 'SECTION_CACHE_SIZE'
+    section_page_cache_pages : int
+        Number of pages of the laid out sections kept in memory across warm
+        invocations. A laid out section holds the boxes of all its pages, so the
+        cache is bounded by pages rather than by sections.
+        Depends on the environmental variable 'SECTION_PAGE_CACHE_PAGES'
+    batch_workers : int
+        Number of worker processes rendering the documents of a batch, defaults
+        to the number of vCPUs. Depends on the environmental variable 'BATCH_WORKERS'
+    pdf_optimization_level : str
+        Optimization level of the PDF files, among 'none', 'standard', 'images'
+        and 'small'. Depends on the environmental variable 'PDF_OPTIMIZATION_LEVEL'
+    pdf_size_budget_bytes : int
+        Size above which the PDF files are written again at the next optimization
+        levels. Depends on the environmental variable 'PDF_SIZE_BUDGET_KB'
+    pdf_variant : str
+        PDF variant of the PDF files, e.g. 'pdf/a-3b' for archiving.
+        Depends on the environmental variable 'PDF_VARIANT'
+    pdf_measure_unoptimized_size : bool
+        Whether to also write the PDF files at the 'none' optimization level, to
+        report their unoptimized size. Depends on the environmental variable
+        'PDF_MEASURE_UNOPTIMIZED_SIZE'
+    cost_ledger_enabled : bool
+        Whether to write the cost ledger of the documents.
+        Depends on the environmental variable 'COST_LEDGER_ENABLED'
+    cost_price_table : str
+        JSON object of the prices overriding the default prices of the cost
+        ledger. Depends on the environmental variable 'COST_PRICE_TABLE'
+    cost_ledger_prefix : str
+        S3 prefix of the Parquet dataset of the cost ledgers.
+        Depends on the environmental variable 'COST_LEDGER_PREFIX'
     s3_client : boto3.client
         Boto3 client to interact with AWS S3 bucket
     """
@@ -28,5 +86,42 @@ class Connections:
     region_name = os.environ["AWS_REGION"]
     s3_bucket_name = os.environ["DATA_SOURCE_BUCKET_NAME"]
     service_name = os.environ["POWERTOOLS_SERVICE_NAME"]
+    skip_unchanged_documents = (
+        os.environ.get("SKIP_UNCHANGED_DOCUMENTS", "true").lower() == "true"
+    )
+    pdf_spool_max_bytes = int(os.environ.get("PDF_SPOOL_MAX_SIZE_MB", "64")) * 1024**2
+    multipart_threshold_bytes = (
+        int(os.environ.get("MULTIPART_THRESHOLD_MB", "8")) * 1024**2
+    )
+    multipart_chunksize_bytes = (
+        int(os.environ.get("MULTIPART_CHUNKSIZE_MB", "8")) * 1024**2
+    )
+    renderer_priming_enabled = (
+        os.environ.get("RENDERER_PRIMING_ENABLED", "true").lower() == "true"
+    )
+    section_fetch_workers = int(os.environ.get("SECTION_FETCH_WORKERS", "16"))
+    section_page_cache_enabled = (
+        os.environ.get("SECTION_PAGE_CACHE_ENABLED", "true").lower() == "true"
+    )
+    section_cache_size = int(os.environ.get("SECTION_CACHE_SIZE", "256"))
+    section_page_cache_pages = int(os.environ.get("SECTION_PAGE_CACHE_PAGES", "400"))
+    batch_workers = int(os.environ.get("BATCH_WORKERS") or os.cpu_count() or 1)
+    pdf_optimization_level = os.environ.get("PDF_OPTIMIZATION_LEVEL", "images")
+    pdf_size_budget_bytes = (
+        int(os.environ["PDF_SIZE_BUDGET_KB"]) * 1024
+        if os.environ.get("PDF_SIZE_BUDGET_KB")
+        else None
+    )
+    pdf_variant = os.environ.get("PDF_VARIANT") or None
+    pdf_measure_unoptimized_size = (
+        os.environ.get("PDF_MEASURE_UNOPTIMIZED_SIZE", "false").lower() == "true"
+    )
+    cost_ledger_enabled = (
+        os.environ.get("COST_LEDGER_ENABLED", "true").lower() == "true"
+    )
+    cost_price_table = os.environ.get("COST_PRICE_TABLE", "")
+    cost_ledger_prefix = os.environ.get("COST_LEDGER_PREFIX", "cost_ledger")
 
-    s3_client = boto3.client(service_name="s3", region_name=region_name)
+    s3_client = instrument_client(
+        attach_recorder(boto3.client(service_name="s3", region_name=region_name))
+    )
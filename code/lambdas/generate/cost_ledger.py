@@ -0,0 +1,223 @@
+import io
+import json
+from connections import Connections, tracer
+from exceptions import CodeError
+from time import gmtime, strftime
+from typing import Dict
+
+# Prices in us-east-1, in USD; Claude 3 Sonnet for Amazon Bedrock
+DEFAULT_PRICE_TABLE = {
+    "transcribePerMinute": 0.024,
+    "transcribeMinimumSeconds": 15,
+    "bedrockInputPer1kTokens": 0.003,
+    "bedrockOutputPer1kTokens": 0.015,
+    "lambdaPerGbSecond": 0.0000166667,
+    "lambdaPerRequest": 0.0000002,
+    "s3PutPer1kRequests": 0.005,
+    "s3GetPer1kRequests": 0.0004,
+}
+
+# S3 operations billed at the PUT, COPY, POST and LIST price
+S3_PUT_OPERATIONS = (
+    "PutObject",
+    "CopyObject",
+    "CreateMultipartUpload",
+    "UploadPart",
+    "CompleteMultipartUpload",
+    "ListObjects",
+    "ListObjectsV2",
+    "ListParts",
+    "ListMultipartUploads",
+)
+
+# S3 operations that are not billed; the other ones are billed at the GET price
+S3_FREE_OPERATIONS = (
+    "DeleteObject",
+    "DeleteObjects",
+    "AbortMultipartUpload",
+)
+
+
+def get_price_table() -> Dict[str, float]:
+    """
+    This method is to get the price table, i.e. the default prices updated
+    with the prices configured in the lambda
+
+    Raises:
+    -------
+        CodeError: If the configured price table is not a JSON object
+
+    Returns:
+    --------
+        Dict[str, float]: The price of every billed unit
+    """
+    try:
+        prices = json.loads(Connections.cost_price_table or "{}")
+    except ValueError as error:
+        raise CodeError(f"Invalid price table: {error}")
+    if not isinstance(prices, dict):
+        raise CodeError("Invalid price table: not a JSON object")
+    return {**DEFAULT_PRICE_TABLE, **prices}
+
+
+def price_stage(usage: dict, prices: Dict[str, float]) -> dict:
+    """
+    This method is to price the usage of one stage
+
+    Arguments:
+    ----------
+        usage (dict): The billed usage of the stage, from the cost ledger
+        prices (Dict[str, float]): The price of every billed unit
+
+    Returns:
+    --------
+        dict: The usage of the stage, with the cost of every service and the
+            total cost, in USD
+    """
+    s3_requests = usage.get("s3Requests", {})
+    s3_put_requests = sum(
+        count for name, count in s3_requests.items() if name in S3_PUT_OPERATIONS
+    )
+    s3_get_requests = sum(
+        count
+        for name, count in s3_requests.items()
+        if name not in S3_PUT_OPERATIONS and name not in S3_FREE_OPERATIONS
+    )
+    transcribe_minutes = transcribe_billed_minutes(usage, prices)
+    costs = {
+        "transcribeCost": transcribe_minutes * prices["transcribePerMinute"],
+        "bedrockCost": (
+            usage.get("bedrockInputTokens", 0) * prices["bedrockInputPer1kTokens"]
+            + usage.get("bedrockOutputTokens", 0) * prices["bedrockOutputPer1kTokens"]
+        )
+        / 1000,
+        "lambdaCost": usage.get("lambdaGbSeconds", 0) * prices["lambdaPerGbSecond"]
+        + usage.get("lambdaInvocations", 0) * prices["lambdaPerRequest"],
+        "s3Cost": (
+            s3_put_requests * prices["s3PutPer1kRequests"]
+            + s3_get_requests * prices["s3GetPer1kRequests"]
+        )
+        / 1000,
+    }
+    costs["totalCost"] = sum(costs.values())
+    return {
+        **usage,
+        "transcribeBilledMinutes": round(transcribe_minutes, 4),
+        "s3PutRequests": s3_put_requests,
+        "s3GetRequests": s3_get_requests,
+        **{name: round(cost, 8) for name, cost in costs.items()},
+    }
+
+
+def transcribe_billed_minutes(usage: dict, prices: Dict[str, float]) -> float:
+    """
+    This method is to get the billed minutes of the Amazon Transcribe jobs of
+    a stage, which bills a minimum duration for every job
+
+    Arguments:
+    ----------
+        usage (dict): The billed usage of the stage, from the cost ledger
+        prices (Dict[str, float]): The price of every billed unit
+
+    Returns:
+    --------
+        float: The billed duration of the jobs, in minutes
+    """
+    minimum_seconds = prices["transcribeMinimumSeconds"]
+    if "transcribeJobSeconds" in usage:
+        job_seconds = usage["transcribeJobSeconds"]
+        return sum(max(seconds, minimum_seconds) for seconds in job_seconds) / 60
+    # Ledgers written before the duration of every job was recorded
+    return max(
+        usage.get("transcribeAudioMinutes", 0),
+        usage.get("transcribeJobs", 0) * minimum_seconds / 60,
+    )
+
+
+def price_ledger(
+    document_name: str, ledger: Dict[str, dict], prices: Dict[str, float]
+) -> dict:
+    """
+    This method is to price the cost ledger of a document
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document
+        ledger (Dict[str, dict]): The billed usage of every stage
+        prices (Dict[str, float]): The price of every billed unit
+
+    Returns:
+    --------
+        dict: The priced usage of every stage, the total cost of the document
+            and the price table
+    """
+    stages = {stage: price_stage(usage, prices) for stage, usage in ledger.items()}
+    return {
+        "documentName": document_name,
+        "createdAt": strftime("%Y-%m-%dT%H:%M:%SZ", gmtime()),
+        "stages": stages,
+        "totalCost": round(sum(stage["totalCost"] for stage in stages.values()), 8),
+        "prices": prices,
+    }
+
+
+@tracer.capture_method
+def write_cost_ledger(
+    s3_client, document_name: str, file_path: str, ledger: Dict[str, dict]
+) -> dict:
+    """
+    This method is to write the priced cost ledger of a document as a JSON
+    file next to the document, and as a partition of the Parquet dataset
+    aggregating the cost of every document, one row per stage
+
+    Arguments:
+    ----------
+        s3_client (boto3.client): The S3 client
+        document_name (str): Name of the document
+        file_path (str): The path of the document files in S3, without extension
+        ledger (Dict[str, dict]): The billed usage of every stage
+
+    Returns:
+    --------
+        dict: The priced cost ledger
+    """
+    priced_ledger = price_ledger(document_name, ledger, get_price_table())
+    s3_client.put_object(
+        Bucket=Connections.s3_bucket_name,
+        Key=f"{file_path}.cost.json",
+        Body=json.dumps(priced_ledger, indent=2).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+    # Imported here, as the dataset is optional and pandas is slow to import
+    import pandas as pd
+
+    rows = pd.DataFrame(
+        [
+            {
+                "documentName": document_name,
+                "createdAt": priced_ledger["createdAt"],
+                "stage": stage,
+                **{
+                    name: value
+                    for name, value in usage.items()
+                    if not isinstance(value, (dict, list))
+                },
+                "s3Requests": json.dumps(usage.get("s3Requests", {})),
+            }
+            for stage, usage in priced_ledger["stages"].items()
+        ]
+    )
+    parquet_file = io.BytesIO()
+    rows.to_parquet(parquet_file, index=False)
+    date = priced_ledger["createdAt"][:10]
+    timestamp = priced_ledger["createdAt"].replace("-", "").replace(":", "")
+    s3_client.put_object(
+        Bucket=Connections.s3_bucket_name,
+        Key=(
+            f"{Connections.cost_ledger_prefix}/date={date}/"
+            f"{document_name.replace('/', '_')}-{timestamp}.parquet"
+        ),
+        Body=parquet_file.getvalue(),
+    )
+    return priced_ledger
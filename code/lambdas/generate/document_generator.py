@@ -1,37 +1,125 @@
-from weasyprint import HTML
+from weasyprint import CSS, HTML, Document
+from weasyprint.text.fonts import FontConfiguration
 from exceptions import CodeError
 from dominate.util import raw
-from dominate.tags import html, head, style, body, h1, h2, u
-from connections import logger
+from dominate.tags import html, head, header, style, body, h1, h2, u, nav, ul, li, a
+from connections import Connections, logger
+from dataclasses import dataclass
 import markdown
+import hashlib
+import io
 import os
 from time import localtime, strftime
+from typing import BinaryIO, List, Optional, Tuple
 
-# Stylesheet to use for rendering the final PDF document
+# Stylesheet to use for rendering the final PDF document.
+# The generation timestamp is a `header` element of each document, moved into
+# the page margin as a running element, so the stylesheet itself is static.
 STYLE_CSS = """
-        h1 {{
+        h1 {
             position: center;
-        }}
-        header {{
+        }
+        nav.toc ul {
+            list-style: none;
+            padding-left: 0;
+        }
+        nav.toc a {
+            color: inherit;
+            text-decoration: none;
+        }
+        nav.toc a::after {
+            content: leader('.') target-counter(attr(href), page);
+        }
+        nav.toc a[data-page]::after {
+            content: leader('.') attr(data-page);
+        }
+        header {
             position: running(header);
-        }}
-        @page {{
+            font-size: 10px;
+        }
+        @page {
             size: Letter portrait;
             margin-top: 3cm;
 
-            @top-right {{
-                content: '{0}';
-                font-size: 10px;
-            }}
-            @bottom-center {{
+            @top-right {
+                content: element(header);
+            }
+            @bottom-center {
                 content: counter(page);
-            }}
-            @bottom-right {{
+            }
+            @bottom-right {
                 content: 'Document generated using AWS Bedrock Service';
                 font-size: 10px;
-            }}
-        }}
+            }
+        }
+    """
+
+# Bump when the HTML layout produced by this module changes, so that documents
+# rendered with the previous layout are generated again
+TEMPLATE_VERSION = "4"
+
+# WeasyPrint output options of every optimization level, from the fastest to
+# the smallest output. Unless disabled, fonts are subset and streams compressed.
+PDF_OPTIMIZATION_LEVELS = {
+    "none": {"full_fonts": True, "uncompressed_pdf": True},
+    "standard": {},
+    "images": {"optimize_images": True, "jpeg_quality": 85, "dpi": 150},
+    "small": {"optimize_images": True, "jpeg_quality": 60, "dpi": 96},
+}
+
+
+def render_version(*parts: object) -> str:
+    """Hash the template versions, stylesheet and options a document is rendered with."""
+    return hashlib.sha256(":".join(map(str, parts)).encode("utf-8")).hexdigest()[:16]
+
+
+# Identifies the template, stylesheet and output options used to render a PDF
+# document
+RENDER_VERSION = render_version(
+    TEMPLATE_VERSION,
+    STYLE_CSS,
+    Connections.pdf_optimization_level,
+    Connections.pdf_size_budget_bytes,
+    Connections.pdf_variant,
+)
+
+# Identifies the template and stylesheet of a standalone HTML document
+HTML_RENDER_VERSION = render_version(TEMPLATE_VERSION, STYLE_CSS)
+
+
+@dataclass
+class PdfSizeReport:
     """
+    A class for representing the size of a generated PDF file
+
+    Attributes:
+    -----------
+    level: str
+        The optimization level the PDF file was written with.
+    initial_bytes: int
+        Size of the PDF file at the configured optimization level.
+    final_bytes: int
+        Size of the PDF file at the optimization level it was written with.
+    within_budget: bool
+        Whether the PDF file fits in the size budget.
+    unoptimized_bytes: int
+        Size of the PDF file at the 'none' optimization level, i.e. what the
+        optimization saves, when the file was written at that level or the
+        unoptimized size is measured.
+    """
+
+    level: str
+    initial_bytes: int
+    final_bytes: int
+    within_budget: bool
+    unoptimized_bytes: Optional[int] = None
+
+
+# WeasyPrint resources kept across warm invocations: the font configuration,
+# the stylesheet compiled against it, and the cache of fetched images.
+font_config = FontConfiguration()
+stylesheet = CSS(string=STYLE_CSS, font_config=font_config)
+resource_cache = {}
 
 
 def markdown_to_html(markdown_text: str) -> str:
@@ -54,7 +142,12 @@ def markdown_to_html(markdown_text: str) -> str:
     return html
 
 
-def generate_html(html_body: str) -> str:
+def generate_html(
+    html_body: str,
+    inline_style: bool = False,
+    header_text: str | None = None,
+    first_page: int | None = None,
+) -> str:
     """
     Generates a new HTML document based in the HTML Boday data passed.
     This function is used to generate the HTML document for the PDF generation.
@@ -63,6 +156,13 @@ def generate_html(html_body: str) -> str:
     -----------
     html_body: str
         HTML body data to be used to generate the HTML document
+    inline_style: bool
+        Whether to embed the stylesheet in the document. PDF rendering
+        applies the precompiled stylesheet instead.
+    header_text: str
+        Text of the page header, defaults to the current date and time.
+    first_page: int
+        Page number of the first page, for documents assembled from several renders.
 
     Returns:
     --------
@@ -73,15 +173,19 @@ def generate_html(html_body: str) -> str:
     """
     logger.debug(f"HTML document generated for body {html_body}")
 
-    current_time = strftime("%m-%d-%Y %H:%M:%S", localtime())
+    if header_text is None:
+        header_text = strftime("%m-%d-%Y %H:%M:%S", localtime())
+    html_head = head(style(STYLE_CSS)) if inline_style else head()
+    if first_page is not None:
+        html_head.add(style(f"@page :first {{ counter-reset: page {first_page} }}"))
     html_doc = html()
-    html_doc.add(head(style(STYLE_CSS.format(current_time))))
-    html_doc.add(body(raw(html_body)))
+    html_doc.add(html_head)
+    html_doc.add(body(header(header_text), raw(html_body)))
 
     return html_doc.render()
 
 
-def html_to_pdf(html_document: str, pdf_path: str) -> None:
+def html_to_pdf(html_document: str, pdf_file: BinaryIO) -> PdfSizeReport:
     """
     Converts given HTML document to PDF file.
 
@@ -89,18 +193,149 @@ def html_to_pdf(html_document: str, pdf_path: str) -> None:
     -----------
     html_document: str
         HTML document, in string encoded format, to be converted to PDF file
-    pdf_path: str
-        Path where the PDF file will be generated.
+    pdf_file: BinaryIO
+        Binary file object where the PDF file will be written.
+
+    Returns:
+    --------
+    PdfSizeReport:
+        The size of the PDF file, before and after applying the size budget.
     """
+    report = write_optimized_pdf(render_document(html_document), pdf_file)
+    logger.debug(f"PDF file generated: {pdf_file}")
+    return report
+
+
+def write_optimized_pdf(document: Document, pdf_file: BinaryIO) -> PdfSizeReport:
+    """
+    Writes a laid out document as PDF file, at the configured optimization level.
+    While the PDF file is larger than the size budget, it is written again at
+    the next optimization levels, without laying out the document again.
+
+    Arguments:
+    -----------
+    document: Document
+        Laid out document to write.
+    pdf_file: BinaryIO
+        Binary file object where the PDF file will be written.
+
+    Returns:
+    --------
+    PdfSizeReport:
+        The size of the PDF file, before and after applying the size budget.
+    """
+    levels = list(PDF_OPTIMIZATION_LEVELS)
+    if Connections.pdf_optimization_level not in levels:
+        raise CodeError(
+            f"Unknown PDF optimization level: {Connections.pdf_optimization_level}"
+        )
+
+    initial_bytes = None
+    unoptimized_bytes = None
+    budget = Connections.pdf_size_budget_bytes
     try:
-        HTML(string=html_document, base_url=os.getcwd()).write_pdf(pdf_path)
-        logger.debug(f"PDF file generated at: {pdf_path}")
+        for level in levels[levels.index(Connections.pdf_optimization_level) :]:
+            pdf_bytes = document.write_pdf(**pdf_options(level))
+            initial_bytes = initial_bytes or len(pdf_bytes)
+            if level == "none":
+                unoptimized_bytes = len(pdf_bytes)
+            within_budget = budget is None or len(pdf_bytes) <= budget
+            if within_budget:
+                break
+            logger.info(
+                f"PDF file of {len(pdf_bytes)} bytes at optimization level "
+                f"{level} exceeds the size budget of {budget} bytes"
+            )
+        pdf_file.write(pdf_bytes)
+        if unoptimized_bytes is None and Connections.pdf_measure_unoptimized_size:
+            unoptimized_bytes = len(document.write_pdf(**pdf_options("none")))
     except Exception as exception:
         raise CodeError(f"Error while generating PDF file: {exception}")
-    return None
+    return PdfSizeReport(
+        level, initial_bytes, len(pdf_bytes), within_budget, unoptimized_bytes
+    )
+
 
+def pdf_options(level: str) -> dict:
+    """
+    Returns the WeasyPrint output options of an optimization level.
+
+    Arguments:
+    -----------
+    level: str
+        Optimization level, among the keys of `PDF_OPTIMIZATION_LEVELS`.
 
-def add_header(header_name: str) -> str:
+    Returns:
+    --------
+    dict:
+        The options of the level, with the configured PDF variant.
+    """
+    options = dict(PDF_OPTIMIZATION_LEVELS[level])
+    if Connections.pdf_variant:
+        options["pdf_variant"] = Connections.pdf_variant
+    return options
+
+
+def prime_renderer() -> None:
+    """
+    Renders a short document and discards it, so that the font discovery and
+    the first layout pass are paid during the AWS Lambda initialization rather
+    than by the first invocation.
+    """
+    html_to_pdf(
+        generate_html(add_document_title("Priming") + markdown_to_html("Priming")),
+        io.BytesIO(),
+    )
+    logger.debug("PDF renderer primed")
+
+
+def render_document(html_document: str) -> Document:
+    """
+    Lays out given HTML document into pages, without writing the PDF file.
+
+    Arguments:
+    -----------
+    html_document: str
+        HTML document, in string encoded format, to be laid out
+
+    Returns:
+    --------
+    Document:
+        The laid out pages of the document.
+    """
+    try:
+        return HTML(string=html_document, base_url=os.getcwd()).render(
+            stylesheets=[stylesheet],
+            font_config=font_config,
+            cache=resource_cache,
+        )
+    except Exception as exception:
+        raise CodeError(f"Error while rendering document: {exception}")
+
+
+def write_documents(documents: List[Document], pdf_file: BinaryIO) -> PdfSizeReport:
+    """
+    Writes the pages of laid out documents, in order, as a single PDF file.
+
+    Arguments:
+    -----------
+    documents: List[Document]
+        Laid out documents, the metadata of the first one is used.
+    pdf_file: BinaryIO
+        Binary file object where the PDF file will be written.
+
+    Returns:
+    --------
+    PdfSizeReport:
+        The size of the PDF file, before and after applying the size budget.
+    """
+    pages = [page for document in documents for page in document.pages]
+    report = write_optimized_pdf(documents[0].copy(pages), pdf_file)
+    logger.debug(f"PDF file generated from {len(pages)} pages: {pdf_file}")
+    return report
+
+
+def add_header(header_name: str, anchor: str | None = None) -> str:
     """
     Adds a header to the HTML document.
 
@@ -108,15 +343,57 @@ def add_header(header_name: str) -> str:
     -----------
     header_name: str
         Name of the header to be added to the HTML document.
+    anchor: str
+        Identifier of the header, linked to from the table of contents.
 
     Returns:
     --------
     str:
         HTML document encoded as string with the header added as H2 tag.
     """
+    if anchor:
+        return h2(header_name, id=anchor).render()
     return h2(header_name).render()
 
 
+def add_table_of_contents(
+    contents: List[Tuple[str, str]], page_numbers: List[int] | None = None
+) -> str:
+    """
+    Adds a table of contents to the HTML document.
+
+    Arguments:
+    -----------
+    contents: List[Tuple[str, str]]
+        Name and anchor of every header listed in the table of contents.
+    page_numbers: List[int]
+        Page number of every header. By default, the page numbers are resolved
+        by WeasyPrint during the layout, which requires the headers to be part
+        of the same render.
+
+    Returns:
+    --------
+    str:
+        HTML document encoded as string with the table of contents as a list of links.
+    """
+    return nav(
+        h2("Contents"),
+        ul(
+            *[
+                (
+                    li(a(name, href=f"#{anchor}"))
+                    if page_numbers is None
+                    else li(a(name, href=f"#{anchor}", data_page=str(page_number)))
+                )
+                for (name, anchor), page_number in zip(
+                    contents, page_numbers or [None] * len(contents)
+                )
+            ]
+        ),
+        cls="toc",
+    ).render()
+
+
 def add_document_title(title_text: str) -> str:
     """
     Adds document title to the HTML document.
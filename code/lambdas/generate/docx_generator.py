@@ -0,0 +1,142 @@
+from docx import Document
+from docx.shared import Pt
+from html.parser import HTMLParser
+from exceptions import CodeError
+from connections import logger
+from importlib.metadata import version
+from typing import BinaryIO
+
+# Bump when the Word documents produced by this module change, so that the
+# documents converted by the previous version are generated again
+DOCX_TEMPLATE_VERSION = "1"
+
+# The python-docx release writing the Word documents
+PYTHON_DOCX_VERSION = version("python-docx")
+
+# Word heading level of every HTML heading, the document title uses level 0
+HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+# Word list styles of the default template, nested up to three levels
+LIST_STYLES = {"ul": "List Bullet", "ol": "List Number"}
+MAX_LIST_LEVEL = 3
+
+
+class DocxBuilder(HTMLParser):
+    """
+    A class for converting the HTML generated from the Markdown summaries
+    into the paragraphs and runs of a Word document, without page layout.
+
+    Attributes:
+    -----------
+    document: Document
+        The Word document the HTML is added to.
+    """
+
+    def __init__(self, document: Document):
+        super().__init__(convert_charrefs=True)
+        self.document = document
+        self.paragraph = None
+        self.lists = []
+        self.bold = 0
+        self.italic = 0
+        self.code = 0
+        self.preformatted = 0
+
+    def new_paragraph(self, style: str | None = None):
+        self.paragraph = self.document.add_paragraph(style=style)
+        return self.paragraph
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in HEADING_LEVELS:
+            self.paragraph = self.document.add_heading("", HEADING_LEVELS[tag])
+        elif tag in LIST_STYLES:
+            self.lists.append(tag)
+        elif tag == "li":
+            level = min(len(self.lists), MAX_LIST_LEVEL)
+            style = LIST_STYLES[self.lists[-1] if self.lists else "ul"]
+            self.new_paragraph(style if level <= 1 else f"{style} {level}")
+        elif tag == "p":
+            # Loose Markdown lists wrap the text of list items in paragraphs
+            if not (self.lists and self.paragraph and not self.paragraph.text):
+                self.new_paragraph()
+        elif tag == "blockquote":
+            self.new_paragraph("Quote")
+        elif tag == "pre":
+            self.preformatted += 1
+            self.new_paragraph()
+        elif tag in ("strong", "b"):
+            self.bold += 1
+        elif tag in ("em", "i"):
+            self.italic += 1
+        elif tag == "code":
+            self.code += 1
+        elif tag == "br" and self.paragraph is not None:
+            self.paragraph.add_run().add_break()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in HEADING_LEVELS or tag in ("p", "li", "blockquote"):
+            self.paragraph = None
+        elif tag in LIST_STYLES and self.lists:
+            self.lists.pop()
+            self.paragraph = None
+        elif tag == "pre":
+            self.preformatted -= 1
+            self.paragraph = None
+        elif tag in ("strong", "b"):
+            self.bold -= 1
+        elif tag in ("em", "i"):
+            self.italic -= 1
+        elif tag == "code":
+            self.code -= 1
+
+    def handle_data(self, data: str) -> None:
+        if not self.preformatted:
+            data = data.replace("\n", " ")
+            if self.paragraph is None or not self.paragraph.text:
+                data = data.lstrip()
+        if not data:
+            return
+        if self.paragraph is None:
+            self.new_paragraph()
+        run = self.paragraph.add_run(data)
+        run.bold = self.bold > 0 or None
+        run.italic = self.italic > 0 or None
+        if self.code or self.preformatted:
+            run.font.name = "Courier New"
+            run.font.size = Pt(9)
+
+
+def html_to_docx(
+    document_name: str, html_body: str, header_text: str, docx_file: BinaryIO
+) -> None:
+    """
+    Converts given HTML body to a Word document.
+
+    Arguments:
+    -----------
+    document_name: str
+        Name of the document, added as the document title.
+    html_body: str
+        HTML body, in string encoded format, to be converted to Word document
+    header_text: str
+        Text of the page header, i.e. the generation date and time.
+    docx_file: BinaryIO
+        Binary file object where the Word document will be written.
+    """
+    try:
+        document = Document()
+        section = document.sections[0]
+        section.header.paragraphs[0].text = header_text
+        section.footer.paragraphs[0].text = (
+            "Document generated using AWS Bedrock Service"
+        )
+        document.add_heading(document_name, 0)
+
+        builder = DocxBuilder(document)
+        builder.feed(html_body)
+        builder.close()
+
+        document.save(docx_file)
+        logger.debug(f"DOCX file generated: {docx_file}")
+    except Exception as exception:
+        raise CodeError(f"Error while generating DOCX file: {exception}")
@@ -5,17 +5,92 @@ from document_generator import (
     markdown_to_html,
     generate_html,
     html_to_pdf,
+    render_document,
+    write_documents,
     add_document_title,
+    add_header,
+    add_table_of_contents,
+    prime_renderer,
+    render_version,
+    PdfSizeReport,
+    HTML_RENDER_VERSION,
+    RENDER_VERSION,
+    TEMPLATE_VERSION,
 )
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor
+from docx_generator import DOCX_TEMPLATE_VERSION, PYTHON_DOCX_VERSION, html_to_docx
+from botocore.exceptions import ClientError
 from connections import Connections, tracer, logger, metrics
-from dataclasses import dataclass
+from cost_ledger import write_cost_ledger
+from instrumentation import (
+    current_cost_entry,
+    in_trace_context,
+    instrument_handler,
+    phase,
+)
+from idempotency import idempotent_handler
+from pipeline_state import record_stage_state
+from dataclasses import dataclass, field
 from exceptions import CodeError
+from render_cache import RenderCache, content_hash
 from s3url import S3Url
+from typing import BinaryIO, Dict, List, Literal, Optional, Tuple
+import hashlib
+import json
 import tempfile
-import uuid
+from time import localtime, strftime
 
 s3_client = Connections.s3_client
 
+OutputFormat = Literal["pdf", "html", "md", "docx"]
+
+# Content type of the uploaded file of every output format
+OUTPUT_CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "html": "text/html; charset=utf-8",
+    "md": "text/markdown; charset=utf-8",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+# Bump when the layout of the Markdown documents changes, so that they are
+# generated again
+MARKDOWN_TEMPLATE_VERSION = "1"
+
+# Identifies how the file of every output format is rendered, so that a change
+# to one format only generates the files of that format again. The Word
+# documents are converted from the HTML of the sections, and the PDF files of
+# multi-section documents are laid out differently with the section page cache.
+RENDER_VERSIONS: Dict[str, str] = {
+    "pdf": render_version(RENDER_VERSION, Connections.section_page_cache_enabled),
+    "html": HTML_RENDER_VERSION,
+    "md": render_version(MARKDOWN_TEMPLATE_VERSION),
+    "docx": render_version(
+        TEMPLATE_VERSION, DOCX_TEMPLATE_VERSION, PYTHON_DOCX_VERSION
+    ),
+}
+
+# Documents larger than the threshold are uploaded in parts, concurrently
+transfer_config = TransferConfig(
+    multipart_threshold=Connections.multipart_threshold_bytes,
+    multipart_chunksize=Connections.multipart_chunksize_bytes,
+)
+
+# Rendered sections kept across warm invocations, keyed by content hash. The
+# laid out sections hold a WeasyPrint document each, whose size grows with its
+# number of pages, so they are kept up to a number of pages
+section_html_cache = RenderCache(Connections.section_cache_size)
+section_page_cache = RenderCache(
+    Connections.section_cache_size, max_weight=Connections.section_page_cache_pages
+)
+
+# Pay the font discovery and first layout pass during the lambda initialization
+if Connections.renderer_priming_enabled:
+    try:
+        prime_renderer()
+    except CodeError as error:
+        logger.warning(f"Unable to prime the PDF renderer: {error}")
+
 
 @dataclass
 class Response:
@@ -28,17 +103,44 @@ class Response:
         A HTTP status code that denotes the output status of validation.
         A `200` values means validation completed successfully
     pdfFileS3Uri: str
-        A string that denotes the S3 object URL of the generated PDF file.
+        A string that denotes the S3 object URL of the generated PDF file,
+        empty if the PDF format was not requested.
     documentName: str
         A string that denotes the name of the document that is being processed.
     serviceName: str
         The name of the AWS Lambda as configured through AWS powertools
+    outputS3Uris: Dict[str, str]
+        The S3 object URL of the generated file of every requested output format.
+    costLedger: Dict[str, dict]
+        The billed usage of every stage that processed the document.
+    correlationId: str
+        The identifier correlating the traces and logs of every stage.
     """
 
     statusCode: int
     pdfFileS3Uri: str
     documentName: str
     serviceName: str = Connections.service_name
+    outputS3Uris: Dict[str, str] = field(default_factory=dict)
+    costLedger: Dict[str, dict] = field(default_factory=dict)
+    correlationId: str = ""
+
+
+class Section(BaseModel):
+    """
+    A class for representing one question of a multi-section document
+
+    Attributes:
+    -----------
+    title: str
+        A string that denotes the heading of the section, i.e. the question.
+    summarizedAnswerS3Uri: str
+        A string that contains the S3 object URL of the answer summary of the
+        question that was generated by `Summary` lambda
+    """
+
+    title: str
+    summarizedAnswerS3Uri: str
 
 
 class Request(BaseModel):
@@ -51,17 +153,41 @@ class Request(BaseModel):
         A string that denotes the name of the document that is being processed.
     summarizedAnswerS3Uri: str
         A string that contains the S3 object URL of the answer summary that
-        was generated by `Summary` lambda
+        was generated by `Summary` lambda. Used when `sections` is empty.
+    sections: List[Section]
+        The questions to render as sections of a single document, in order,
+        with a table of contents.
+    outputFormats: List[OutputFormat]
+        The formats to generate the document in, among `pdf`, `html`, `md`
+        (Markdown) and `docx` (Word). Defaults to PDF only.
+    costLedger: Dict[str, dict]
+        The billed usage of every previous stage, by stage.
+    correlationId: str
+        The identifier correlating the traces and logs of every stage.
     """
 
     documentName: str
-    summarizedAnswerS3Uri: str
+    summarizedAnswerS3Uri: Optional[str] = None
+    sections: List[Section] = []
+    outputFormats: List[OutputFormat] = ["pdf"]
+    costLedger: Dict[str, dict] = {}
+    correlationId: Optional[str] = None
 
 
 @logger.inject_lambda_context(log_event=True, clear_state=True)
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
+@idempotent_handler(
+    "generate",
+    "documentName",
+    "summarizedAnswerS3Uri",
+    "sections",
+    "outputFormats",
+    s3_client=Connections.s3_client,
+)
+@record_stage_state("generate", Connections.s3_client)
 @event_parser(model=Request)
+@instrument_handler("generate")
 def lambda_handler(event: Request, context: LambdaContext):
     """
     This is main function that is invoked when AWS Lambda is triggered.
@@ -91,24 +217,33 @@ def lambda_handler(event: Request, context: LambdaContext):
 
     logger.debug(f"Message body is {event}")
 
-    # Get answer summary location parsed from S3 URI input
-    input_uri = S3Url(event.summarizedAnswerS3Uri)
-    documentText = get_object_content(input_uri.bucket, input_uri.key, input_uri.url)
+    output_formats = list(dict.fromkeys(event.outputFormats))
+    if not output_formats:
+        logger.error("No output format requested")
+        raise CodeError("No output format requested")
+
+    with phase("generate", event.documentName, name="load"):
+        documentSections = get_document_sections(event)
+    documentText = "".join(text for _, text in documentSections)
     logger.info(f"Document Text for processing is {documentText}")
+    metrics.add_metric(
+        name="DocumentSections", unit=MetricUnit.Count, value=len(documentSections)
+    )
 
     # Initialize final output variables
-    s3_url = None
+    file_path = get_document_file_path(event.documentName)
+    document_metadata = get_document_metadata(documentSections)
 
     if len(documentText) > 0:
-        # Generate PDF file from Answer Summary records
-        pdf_file_path = generate_pdf(event.documentName, documentText)
-        logger.debug(f"PDF file path is {pdf_file_path}")
-
-        # Upload the generated PDF file to S3 location previously identified
-        s3_url = upload_pdf_to_s3(
-            pdf_file_path, f"document_storage/{event.documentName}".replace("//", "/")
+        # Generate the files of every output format from Answer Summary records
+        outputS3Uris = generate_documents(
+            event.documentName,
+            documentSections,
+            output_formats,
+            file_path,
+            document_metadata,
         )
-        logger.debug(f"S3 URL is {s3_url}")
+        logger.debug(f"S3 URLs are {outputS3Uris}")
     else:
         # No data available to render as document
         # Raise exception and return error response to Step function
@@ -116,22 +251,25 @@ def lambda_handler(event: Request, context: LambdaContext):
         raise CodeError("No data available to render as document")
 
     # Validate Output variable and set status code appropriately
-    if s3_url:
+    if all(outputS3Uris.get(output_format) for output_format in output_formats):
         statusCode = 200
         metric_name = "DocumentGenerationSuccessful"
     else:
         statusCode = 400
         metric_name = "DocumentGenerationFailed"
-        s3_url = ""
         logger.info("Document generation failed")
 
     metrics.add_metric(name=metric_name, unit=MetricUnit.Count, value=1)
 
+    if statusCode == 200 and Connections.cost_ledger_enabled:
+        record_cost_ledger(event, context, file_path)
+
     # Generate JSON Step Function output and return
     response = Response(
         statusCode=statusCode,
-        pdfFileS3Uri=s3_url,
+        pdfFileS3Uri=outputS3Uris.get("pdf") or "",
         documentName=event.documentName,
+        outputS3Uris=outputS3Uris,
     ).__dict__
 
     logger.debug(f"Lambda Output: {response}")
@@ -139,15 +277,293 @@ def lambda_handler(event: Request, context: LambdaContext):
     return response
 
 
+def record_cost_ledger(event: Request, context: LambdaContext, file_path: str):
+    """
+    This method is to write the cost ledger of the document, with the usage of
+    this invocation so far. The document is not failed when the ledger cannot
+    be written.
+
+    Arguments:
+    ----------
+        event (Request): The input data from Step function
+        context (LambdaContext): The context of the invocation
+        file_path (str): The final path of the files in S3, without extension
+    """
+    ledger = {**event.costLedger, "generate": current_cost_entry(context)}
+    try:
+        priced_ledger = write_cost_ledger(
+            s3_client, event.documentName, file_path, ledger
+        )
+    except (ClientError, CodeError, ImportError, ValueError) as error:
+        logger.warning(f"Unable to write the cost ledger: {error}")
+        return
+    metrics.add_metric(
+        name="DocumentCost", unit=MetricUnit.NoUnit, value=priced_ledger["totalCost"]
+    )
+
+
 @tracer.capture_method
-def upload_pdf_to_s3(pdf_file_path: str, file_path: str) -> str | None:
+def generate_documents(
+    document_name: str,
+    document_sections: List[Tuple[str, str]],
+    output_formats: List[OutputFormat],
+    file_path: str,
+    document_metadata: dict,
+) -> Dict[str, str]:
+    """
+    This method is to generate and upload the document in every output format.
+    The formats are rendered concurrently, so that the formats that do not need
+    a PDF layout are not held up by WeasyPrint.
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document from `document` table.
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        output_formats (List[OutputFormat]): The formats to generate
+        file_path (str): The final path of the files in S3, without extension
+        document_metadata (dict): The S3 object metadata identifying the inputs
+            of the document, i.e. the summary hash
+
+    Returns:
+    --------
+        Dict[str, str]: The S3 URI of the document in every output format
+    """
+    with ThreadPoolExecutor(max_workers=len(output_formats)) as executor:
+        futures = {
+            output_format: executor.submit(
+                in_trace_context(generate_document),
+                document_name,
+                document_sections,
+                output_format,
+                file_path,
+                document_metadata,
+            )
+            for output_format in output_formats
+        }
+        return {
+            output_format: future.result() for output_format, future in futures.items()
+        }
+
+
+def generate_document(
+    document_name: str,
+    document_sections: List[Tuple[str, str]],
+    output_format: OutputFormat,
+    file_path: str,
+    document_metadata: dict,
+) -> str:
+    """
+    This method is to generate and upload the document in one output format,
+    unless it was already generated from the same inputs.
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document from `document` table.
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        output_format (OutputFormat): The format to generate
+        file_path (str): The final path of the file in S3, without extension
+        document_metadata (dict): The S3 object metadata identifying the inputs
+            of the document, i.e. the summary hash
+
+    Returns:
+    --------
+        str: The S3 URI of the document
     """
-    This method is to upload a PDF file to S3 bucket.
+    # Reuse the file of a previous run if it was rendered from the same inputs
+    if Connections.skip_unchanged_documents:
+        s3_url = get_unchanged_document_uri(file_path, document_metadata, output_format)
+        if s3_url:
+            logger.info(f"Document is unchanged, skipping generation: {s3_url}")
+            metrics.add_metric(
+                name="DocumentGenerationSkipped", unit=MetricUnit.Count, value=1
+            )
+            return s3_url
+
+    # Render the file in memory, spilling to disk above the size limit.
+    # The spooled file is deleted when the block exits.
+    with tempfile.SpooledTemporaryFile(
+        max_size=Connections.pdf_spool_max_bytes
+    ) as document_file:
+        with phase("generate", document_name, name="render"):
+            render_document_file(
+                document_name, document_sections, output_format, document_file
+            )
+
+        # Upload the generated file to S3 location previously identified
+        with phase("generate", document_name, name="upload"):
+            return upload_document_to_s3(
+                document_file, file_path, document_metadata, output_format
+            )
+
+
+def render_document_file(
+    document_name: str,
+    document_sections: List[Tuple[str, str]],
+    output_format: OutputFormat,
+    document_file: BinaryIO,
+) -> None:
+    """
+    This method is to render the document in one output format
 
     Arguments:
     ----------
-        pdf_file_path (str): The path of the PDF file to be uploaded to S3.
-        file_path (str): The final path of the file in S3
+        document_name (str): Name of the document from `document` table.
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        output_format (OutputFormat): The format to render
+        document_file (BinaryIO): The binary file object the document is written to.
+    """
+    renderers = {
+        "pdf": generate_pdf,
+        "html": generate_html_document,
+        "md": generate_markdown_document,
+        "docx": generate_docx_document,
+    }
+    renderers[output_format](document_name, document_sections, document_file)
+
+
+@tracer.capture_method
+def get_document_sections(event: Request) -> List[Tuple[str, str]]:
+    """
+    This method is to get the answer summaries to render as document
+
+    Arguments:
+    ----------
+        event (Request): The input data of the document
+
+    Raises:
+    -------
+        CodeError: A custom exception object that is raised if the input has
+            no answer summary, or if an answer summary cannot be read.
+
+    Returns:
+    --------
+        List[Tuple[str, str]]: The title and answer summary of every section, in order
+    """
+    if event.sections:
+        # Get the answer summaries of all the questions of the document
+        return get_section_contents(event.sections)
+
+    if event.summarizedAnswerS3Uri:
+        # Get answer summary location parsed from S3 URI input
+        input_uri = S3Url(event.summarizedAnswerS3Uri)
+        return [
+            ("", get_object_content(input_uri.bucket, input_uri.key, input_uri.url))
+        ]
+
+    logger.error("No answer summary to render as document")
+    raise CodeError("No answer summary to render as document")
+
+
+def get_document_file_path(document_name: str) -> str:
+    """
+    This method is to get the path of the document files in S3
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document
+
+    Returns:
+    --------
+        str: The final path of the files in S3, without extension
+    """
+    return f"document_storage/{document_name}".replace("//", "/")
+
+
+def get_document_metadata(document_sections: List[Tuple[str, str]]) -> dict:
+    """
+    This method is to identify the inputs of a document
+
+    Arguments:
+    ----------
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document
+
+    Returns:
+    --------
+        dict: The S3 object metadata with the summary hash
+    """
+    return {
+        "summary-sha256": hashlib.sha256(
+            json.dumps(document_sections).encode("utf-8")
+        ).hexdigest(),
+    }
+
+
+def get_format_metadata(document_metadata: dict, output_format: OutputFormat) -> dict:
+    """
+    This method is to identify the inputs of the file of one output format
+
+    Arguments:
+    ----------
+        document_metadata (dict): The S3 object metadata identifying the inputs
+            of the document, i.e. the summary hash
+        output_format (OutputFormat): The format of the file
+
+    Returns:
+    --------
+        dict: The S3 object metadata with the summary hash and the render
+            version of the format
+    """
+    return {**document_metadata, "render-version": RENDER_VERSIONS[output_format]}
+
+
+@tracer.capture_method
+def get_unchanged_document_uri(
+    file_path: str, document_metadata: dict, output_format: OutputFormat = "pdf"
+) -> str | None:
+    """
+    This method is to find a document file that was generated from the same inputs.
+
+    Arguments:
+    ----------
+        file_path (str): The final path of the file in S3, without extension
+        document_metadata (dict): The S3 object metadata identifying the inputs
+            of the document, i.e. the summary hash
+        output_format (OutputFormat): The format of the file, used as extension
+
+    Returns:
+    --------
+        str: The S3 URI of the existing file, or None if it must be generated
+    """
+    try:
+        response = s3_client.head_object(
+            Bucket=Connections.s3_bucket_name, Key=f"{file_path}.{output_format}"
+        )
+    except ClientError as error:
+        logger.info(f"No previous {output_format} file to reuse: {error}")
+        return None
+
+    existing_metadata = response.get("Metadata", {})
+    format_metadata = get_format_metadata(document_metadata, output_format)
+    if any(existing_metadata.get(k) != v for k, v in format_metadata.items()):
+        logger.info(f"Previous {output_format} file is outdated: {existing_metadata}")
+        return None
+
+    return "s3://{0}/{1}.{2}".format(
+        Connections.s3_bucket_name, file_path, output_format
+    )
+
+
+@tracer.capture_method
+def upload_document_to_s3(
+    document_file: BinaryIO,
+    file_path: str,
+    document_metadata: dict | None = None,
+    output_format: OutputFormat = "pdf",
+) -> str | None:
+    """
+    This method is to upload a document file to S3 bucket.
+
+    Arguments:
+    ----------
+        document_file (BinaryIO): The binary file object of the document to be uploaded to S3.
+        file_path (str): The final path of the file in S3, without extension
+        document_metadata (dict): The S3 object metadata identifying the inputs of
+            the document, stored with the file and the render version of the format
+        output_format (OutputFormat): The format of the file, used as extension
 
     Raises:
     -------
@@ -157,17 +573,27 @@ def upload_pdf_to_s3(pdf_file_path: str, file_path: str) -> str | None:
 
     Returns:
     --------
-        str: The path of the PDF file that is uploaded to S3.
+        str: The path of the document file that is uploaded to S3.
     """
-    logger.info(f"Uploading PDF file to S3: {pdf_file_path}")
+    file_key = f"{file_path}.{output_format}"
+    file_size = document_file.seek(0, 2)
+    logger.info(f"Uploading document file of {file_size} bytes to S3: {file_key}")
+    metrics.add_metric(name="DocumentSize", unit=MetricUnit.Bytes, value=file_size)
     response = None
     try:
-        with open(pdf_file_path, "rb") as file:
-            s3_client.upload_fileobj(
-                file, Connections.s3_bucket_name, f"{file_path}.pdf"
-            )
+        document_file.seek(0)
+        s3_client.upload_fileobj(
+            document_file,
+            Connections.s3_bucket_name,
+            file_key,
+            ExtraArgs={
+                "ContentType": OUTPUT_CONTENT_TYPES[output_format],
+                "Metadata": get_format_metadata(document_metadata or {}, output_format),
+            },
+            Config=transfer_config,
+        )
 
-        response = "s3://{0}/{1}.pdf".format(Connections.s3_bucket_name, file_path)
+        response = "s3://{0}/{1}".format(Connections.s3_bucket_name, file_key)
 
     except Exception as error:
         logger.warning(f"Error occurred while uploading file: {error}")
@@ -176,26 +602,91 @@ def upload_pdf_to_s3(pdf_file_path: str, file_path: str) -> str | None:
 
 
 @tracer.capture_method
-def generate_pdf(document_name: str, document_text: str) -> str:
+def generate_html_document(
+    document_name: str, document_sections: List[Tuple[str, str]], html_file: BinaryIO
+) -> None:
     """
-    This method is to generate PDF file from the answer summary records
+    This method is to generate a standalone HTML file, without PDF layout
 
     Arguments:
     ----------
         document_name (str): Name of the document from `document` table.
-        answer_summary_records (tuple[Any, ...]): Answer summary details from executing SQL query
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        html_file (BinaryIO): The binary file object the HTML file is written to.
+    """
+    document_body = render_html_body(document_name, document_sections)
+    html_document = generate_html(document_body, inline_style=True)
+    html_file.write(html_document.encode("utf-8"))
 
-    Returns:
-    --------
-        str: PDF file path generated from the answer summary records
+
+@tracer.capture_method
+def generate_markdown_document(
+    document_name: str, document_sections: List[Tuple[str, str]], md_file: BinaryIO
+) -> None:
+    """
+    This method is to generate a Markdown file from the raw answer summaries
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document from `document` table.
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        md_file (BinaryIO): The binary file object the Markdown file is written to.
+    """
+    markdown_text = f"# {document_name}\n\n"
+    for title, document_text in document_sections:
+        if title:
+            markdown_text = markdown_text + f"## {title}\n\n"
+        markdown_text = markdown_text + decode_summary_text(document_text) + "\n\n"
+    md_file.write(markdown_text.encode("utf-8"))
+
+
+@tracer.capture_method
+def generate_docx_document(
+    document_name: str, document_sections: List[Tuple[str, str]], docx_file: BinaryIO
+) -> None:
     """
-    # Set temp file location for final PDF generation
-    tmp_dir_name = tempfile.gettempdir()
-    file_path = f"{tmp_dir_name}/{str(uuid.uuid4())}.pdf"
-    logger.info(f"PDF file path: {file_path}")
+    This method is to generate a Word document natively, without PDF layout
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document from `document` table.
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        docx_file (BinaryIO): The binary file object the Word document is written to.
+    """
+    anchors = section_anchors(len(document_sections))
+    html_body = "".join(
+        render_section_html(title, document_text, anchor)
+        for (title, document_text), anchor in zip(document_sections, anchors)
+    )
+    header_text = strftime("%m-%d-%Y %H:%M:%S", localtime())
+    html_to_docx(document_name, html_body, header_text, docx_file)
+
+
+@tracer.capture_method
+def generate_pdf(
+    document_name: str, document_sections: List[Tuple[str, str]], pdf_file: BinaryIO
+) -> None:
+    """
+    This method is to generate PDF file from the answer summary records.
+    All the sections are laid out by a single WeasyPrint render, unless the
+    section page cache is enabled for multi-section documents.
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document from `document` table.
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        pdf_file (BinaryIO): The binary file object the PDF file is written to.
+    """
+    if Connections.section_page_cache_enabled and len(document_sections) > 1:
+        assemble_pdf_from_sections(document_name, document_sections, pdf_file)
+        return None
 
     # Generate HTML body from the answer summary records
-    document_body = render_html_body(document_name, document_text)
+    document_body = render_html_body(document_name, document_sections)
     logger.debug(f"HTML body: {document_body}")
     logger.info("Document body generation completed successfully")
 
@@ -205,7 +696,7 @@ def generate_pdf(document_name: str, document_text: str) -> str:
         logger.info("Complete HTML document generated")
 
         # Generate PDF file from HTML document
-        html_to_pdf(html_document, file_path)
+        report_pdf_size(html_to_pdf(html_document, pdf_file))
         logger.info("HTML to PDF conversion completed successfully")
     else:
         # Unable to generate document contents
@@ -213,18 +704,167 @@ def generate_pdf(document_name: str, document_text: str) -> str:
         logger.warning("Unable to generate document contents")
         raise CodeError("Unable to generate document contents")
 
-    return file_path
+
+def report_pdf_size(report: PdfSizeReport) -> None:
+    """
+    This method is to report the size of a generated PDF file
+
+    Arguments:
+    ----------
+        report (PdfSizeReport): The size of the PDF file, before and after
+            applying the size budget, and without optimization when known
+    """
+    logger.info(
+        f"PDF file of {report.initial_bytes} bytes before and {report.final_bytes} "
+        f"bytes after the size budget, at optimization level {report.level}"
+    )
+    metrics.add_metric(
+        name="PdfSizeBeforeBudget", unit=MetricUnit.Bytes, value=report.initial_bytes
+    )
+    metrics.add_metric(
+        name="PdfSizeAfterBudget", unit=MetricUnit.Bytes, value=report.final_bytes
+    )
+    if report.unoptimized_bytes is not None:
+        logger.info(
+            f"PDF file of {report.unoptimized_bytes} bytes without optimization"
+        )
+        metrics.add_metric(
+            name="PdfSizeUnoptimized",
+            unit=MetricUnit.Bytes,
+            value=report.unoptimized_bytes,
+        )
+    if not report.within_budget:
+        logger.warning("PDF file exceeds the size budget at every optimization level")
+        metrics.add_metric(name="PdfSizeBudgetExceeded", unit=MetricUnit.Count, value=1)
+
+
+@tracer.capture_method
+def assemble_pdf_from_sections(
+    document_name: str, document_sections: List[Tuple[str, str]], pdf_file: BinaryIO
+) -> None:
+    """
+    This method is to generate PDF file by assembling sections laid out separately.
+    Every section starts on a new page, and its pages are reused from previous
+    invocations when its content and first page number are unchanged. Since pages
+    are reused during the day, the page header shows the generation date only.
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document from `document` table.
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
+        pdf_file (BinaryIO): The binary file object the PDF file is written to.
+    """
+    header_text = strftime("%m-%d-%Y", localtime())
+    anchors = section_anchors(len(document_sections))
+    section_bodies = [
+        render_section_html(title, document_text, anchor)
+        for (title, document_text), anchor in zip(document_sections, anchors)
+    ]
+    contents = [
+        (title, anchor)
+        for (title, _), anchor in zip(document_sections, anchors)
+        if title
+    ]
+    hits, misses = section_page_cache.hits, section_page_cache.misses
+
+    # The front matter is laid out first with placeholder page numbers, to know
+    # the page number of the first section. The number of pages of the table of
+    # contents does not depend on the page numbers, unless the title wraps.
+    front_matter_body = add_document_title(document_name)
+    front_pages = len(
+        render_document(
+            generate_html(
+                front_matter_body
+                + add_table_of_contents(contents, [0] * len(contents)),
+                header_text=header_text,
+            )
+        ).pages
+    )
+    for _ in range(3):
+        documents = []
+        first_pages = {}
+        first_page = front_pages + 1
+        for section_body, anchor in zip(section_bodies, anchors):
+            document = render_section_pages(section_body, first_page, header_text)
+            documents.append(document)
+            first_pages[anchor] = first_page
+            first_page += len(document.pages)
+
+        front_matter = render_document(
+            generate_html(
+                front_matter_body
+                + add_table_of_contents(
+                    contents, [first_pages[anchor] for _, anchor in contents]
+                ),
+                header_text=header_text,
+            )
+        )
+        if len(front_matter.pages) == front_pages:
+            break
+        front_pages = len(front_matter.pages)
+
+    report_pdf_size(write_documents([front_matter] + documents, pdf_file))
+    logger.info(
+        f"Assembled {first_page - 1} pages from {len(documents)} sections, "
+        f"{section_page_cache.hits - hits} sections reused"
+    )
+    if first_page - front_pages - 1 > section_page_cache.max_weight:
+        logger.warning(
+            f"The {first_page - front_pages - 1} pages of the sections exceed the "
+            f"{section_page_cache.max_weight} pages of the section page cache, "
+            "so they will not all be reused by the next invocation"
+        )
+    metrics.add_metric(
+        name="SectionPageCacheHits",
+        unit=MetricUnit.Count,
+        value=section_page_cache.hits - hits,
+    )
+    metrics.add_metric(
+        name="SectionPageCacheMisses",
+        unit=MetricUnit.Count,
+        value=section_page_cache.misses - misses,
+    )
+
+
+@tracer.capture_method
+def render_section_pages(section_body: str, first_page: int, header_text: str):
+    """
+    This method is to lay out a section of the document, or reuse its pages.
+
+    Arguments:
+    ----------
+        section_body (str): HTML body of the section
+        first_page (int): Page number of the first page of the section
+        header_text (str): Text of the page header
+
+    Returns:
+    --------
+        Document: The laid out pages of the section
+    """
+    key = (content_hash(section_body), first_page, header_text)
+    document = section_page_cache.get(key)
+    if document is None:
+        document = render_document(
+            generate_html(section_body, header_text=header_text, first_page=first_page)
+        )
+        section_page_cache.put(key, document, weight=len(document.pages))
+    return document
 
 
 @tracer.capture_method
-def render_html_body(document_name: str, document_text: str) -> str:
+def render_html_body(
+    document_name: str, document_sections: List[Tuple[str, str]]
+) -> str:
     """
-    This method is to generate HTML body from the answer summary records
+    This method is to generate HTML body from the answer summary records.
+    Sections with a title get a `h2` heading and an entry in the table of contents.
 
     Arguments:
     ----------
         document_name (str): Name of the document.
-        document_text (str): Content of the document from previous StepFunction
+        document_sections (List[Tuple[str, str]]): Title and content of every
+            section of the document, from previous StepFunction
 
     Returns:
     --------
@@ -232,19 +872,113 @@ def render_html_body(document_name: str, document_text: str) -> str:
     """
     # Initialize document with Document Name
     document_body = "" + add_document_title(document_name)
+    anchors = section_anchors(len(document_sections))
+    contents = [
+        (title, anchor)
+        for (title, _), anchor in zip(document_sections, anchors)
+        if title
+    ]
+    if contents:
+        document_body = document_body + add_table_of_contents(contents)
+
+    for (title, document_text), anchor in zip(document_sections, anchors):
+        document_body = document_body + render_section_html(
+            title, document_text, anchor
+        )
+
+    return document_body
+
+
+def section_anchors(count: int) -> List[str]:
+    """
+    This method is to name the anchors of the section headers
+
+    Arguments:
+    ----------
+        count (int): Number of sections
+
+    Returns:
+    --------
+        List[str]: The anchor of every section, linked to from the table of contents
+    """
+    return [f"section-{index}" for index in range(1, count + 1)]
+
+
+def decode_summary_text(document_text: str) -> str:
+    """
+    This method is to decode the escaped answer summary written by `Summary` lambda
+
+    Arguments:
+    ----------
+        document_text (str): Content of the answer summary file
+
+    Returns:
+    --------
+        str: Markdown text of the answer summary
+    """
+    text = bytes(document_text, "utf-8").decode("unicode_escape")
+    if text.startswith('"') and text.endswith('"'):
+        text = text[1:-1]
+    return text.strip()
+
+
+def render_section_html(title: str, document_text: str, anchor: str) -> str:
+    """
+    This method is to generate the HTML of a section, or reuse it from the cache
+
+    Arguments:
+    ----------
+        title (str): Title of the section, rendered as a `h2` header if not empty
+        document_text (str): Markdown summary of the section
+        anchor (str): Identifier of the section header
+
+    Returns:
+    --------
+        str: HTML of the section
+    """
+    key = content_hash(f"{title}\0{anchor}\0{document_text}")
+    section_body = section_html_cache.get(key)
+    if section_body is not None:
+        return section_body
+
     try:
-        logger.info("Building document section with text summary")
-        text = bytes(document_text, "utf-8").decode("unicode_escape")
-        if text.startswith('"') and text.endswith('"'):
-            text = text[1:-1]
-        document_body = document_body + markdown_to_html(text.strip())
+        logger.info(f"Building document section with text summary: {title}")
+        section_body = add_header(title, anchor) if title else ""
+        section_body = section_body + markdown_to_html(
+            decode_summary_text(document_text)
+        )
     except Exception as exception:
         # Unable to generate document contents
         # Raise exception and return error response to Step function
         logger.warning(f"Error while generating HTML body: {exception}")
         raise CodeError(f"Error while generating HTML body: {exception}")
 
-    return document_body
+    section_html_cache.put(key, section_body)
+    return section_body
+
+
+@tracer.capture_method
+def get_section_contents(sections: List[Section]) -> List[Tuple[str, str]]:
+    """
+    This method is to get the answer summaries of the sections concurrently
+
+    Arguments:
+    ----------
+        sections (List[Section]): The sections of the document
+
+    Returns:
+    --------
+        List[Tuple[str, str]]: The title and answer summary of every section, in order
+    """
+    input_uris = [S3Url(section.summarizedAnswerS3Uri) for section in sections]
+    with ThreadPoolExecutor(max_workers=Connections.section_fetch_workers) as executor:
+        contents = executor.map(
+            in_trace_context(
+                lambda uri: get_object_content(uri.bucket, uri.key, uri.url)
+            ),
+            input_uris,
+        )
+        return [(section.title, text) for section, text in zip(sections, contents)]
 
 
 @tracer.capture_method
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable
+import hashlib
+
+
+def content_hash(text: str) -> str:
+    """
+    Hashes the content of a section.
+
+    Arguments:
+    ----------
+    text: str
+        Content to hash.
+
+    Returns:
+    --------
+    str:
+        SHA-256 hex digest of the content.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    A class for caching rendered sections across warm invocations of the AWS
+    Lambda, evicting the least recently used entries.
+
+    Attributes:
+    -----------
+    max_size: int
+        Number of entries kept in the cache.
+    max_weight: int | None
+        Total weight of the entries kept in the cache, e.g. their number of
+        pages, or no bound when `None`. An entry heavier than the bound is
+        not kept.
+    weight: int
+        Total weight of the entries in the cache.
+    hits: int
+        Number of lookups that found an entry.
+    misses: int
+        Number of lookups that found no entry.
+    """
+
+    def __init__(self, max_size: int, max_weight: int | None = None):
+        self.max_size = max_size
+        self.max_weight = max_weight
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any, weight: int = 1) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.weight -= self._entries.pop(key)[1]
+            if self.max_weight is not None and weight > self.max_weight:
+                return
+            self._entries[key] = (value, weight)
+            self.weight += weight
+            while len(self._entries) > self.max_size or (
+                self.max_weight is not None and self.weight > self.max_weight
+            ):
+                self.weight -= self._entries.popitem(last=False)[1][1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
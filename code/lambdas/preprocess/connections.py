@@ -1,6 +1,8 @@
 import os
 import boto3
 from aws_lambda_powertools import Logger, Tracer, Metrics
+from recorder import attach_recorder
+from instrumentation import instrument_client
 
 tracer = Tracer()
 logger = Logger(log_uncaught_exceptions=True, serialize_stacktrace=True)
@@ -21,6 +23,15 @@ class Connections:
     service_name: str
         Name of the service assigned and configured through AWS Powertools for
         logging. Depends on the environmental variable 'POWERTOOLS_SERVICE_NAME'
+    fast_path_enabled : bool
+        Whether small documents are routed to the all-in-one fast path lambda.
+        Depends on the environmental variable 'FAST_PATH_ENABLED'
+    fast_path_max_audio_files : int
+        Largest number of audio files of a document routed to the fast path.
+        Depends on the environmental variable 'FAST_PATH_MAX_AUDIO_FILES'
+    fast_path_max_audio_bytes : int
+        Largest total size of the audio files of a document routed to the fast
+        path. Depends on the environmental variable 'FAST_PATH_MAX_AUDIO_MB'
     s3_client : boto3.client
         Boto3 client to interact with AWS S3 bucket
     """
@@ -29,4 +40,13 @@ class Connections:
     s3_bucket_name = os.environ["DATA_SOURCE_BUCKET_NAME"]
     service_name = os.environ["POWERTOOLS_SERVICE_NAME"]
 
-    s3_client = boto3.client(service_name="s3", region_name=region_name)
+    # Small documents run all the stages in a single lambda invocation
+    fast_path_enabled = os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true"
+    fast_path_max_audio_files = int(os.environ.get("FAST_PATH_MAX_AUDIO_FILES", "5"))
+    fast_path_max_audio_bytes = (
+        int(os.environ.get("FAST_PATH_MAX_AUDIO_MB", "25")) * 1024 * 1024
+    )
+
+    s3_client = instrument_client(
+        attach_recorder(boto3.client(service_name="s3", region_name=region_name))
+    )
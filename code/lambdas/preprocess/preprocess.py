@@ -2,10 +2,12 @@ from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools.utilities.parser import event_parser, BaseModel
 from connections import Connections, tracer, logger, metrics
-from dataclasses import dataclass
+from instrumentation import current_cost_entry, instrument_handler
+from pipeline_state import PIPELINE_STATE_ENABLED, resume_point
+from dataclasses import dataclass, field
 from exceptions import CodeError
 from s3url import S3Url
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 s3_client = Connections.s3_client
 
@@ -25,14 +27,32 @@ class Response:
     audioFilesS3Uris: List[str]
         A list of string containing the S3 object URLs of the audio files in the
         given path as input
+    useFastPath: bool
+        Whether the document is small enough to run all the stages in the
+        all-in-one fast path lambda, instead of one lambda per stage
     serviceName: str
         The name of the AWS Lambda as configured through AWS powertools
+    costLedger: Dict[str, dict]
+        The billed usage of every stage that processed the document.
+    correlationId: str
+        The identifier correlating the traces and logs of every stage that
+        processed the document.
+    resumeFrom: str
+        The first stage whose inputs changed since the previous execution of
+        the document, where the state machine starts after the preprocessing.
+    resumeInput: dict
+        The recorded output of the stage before `resumeFrom`, as its input.
     """
 
     statusCode: int
     documentName: str
     audioFilesS3Uris: List[str]
+    useFastPath: bool = False
     serviceName: str = Connections.service_name
+    costLedger: Dict[str, dict] = field(default_factory=dict)
+    correlationId: str = ""
+    resumeFrom: str = "transcribe"
+    resumeInput: dict = field(default_factory=dict)
 
 
 class Request(BaseModel):
@@ -45,16 +65,21 @@ class Request(BaseModel):
         The S3 folder path containing the audio files to be processed.
     documentName: str
         A string that denotes the name of the document that is being processed.
+    correlationId: str
+        The identifier correlating the traces and logs of every stage, generated
+        when not given.
     """
 
     documentName: str
     audioFileFolderUri: str
+    correlationId: Optional[str] = None
 
 
 @logger.inject_lambda_context(log_event=True, clear_state=True)
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
 @event_parser(model=Request)
+@instrument_handler("preprocess")
 def lambda_handler(event: Request, context: LambdaContext):
     """
     This is main function that is invoked when AWS Lambda is triggered.
@@ -94,14 +119,32 @@ def lambda_handler(event: Request, context: LambdaContext):
         )
 
     # Identify the audio files present in the S3 folder path
-    audio_files_s3_uris = get_audio_files_s3_uris(event.audioFileFolderUri)
+    audio_files = get_audio_files(event.audioFileFolderUri)
+    audio_files_s3_uris = list(audio_files)
     logger.info(f"Audio files S3 URIs are {audio_files_s3_uris}")
 
+    use_fast_path = is_fast_path_eligible(audio_files)
+    metrics.add_metric(
+        name="FastPathRouted", unit=MetricUnit.Count, value=int(use_fast_path)
+    )
+
     statusCode = 200 if len(audio_files_s3_uris) > 0 else 400
+    resume_from, resume_input = get_resume_point(
+        event.documentName, audio_files_s3_uris
+    )
+    if resume_input:
+        # The resumed stages continue the traces and the cost ledger of this
+        # execution, not the ones of the execution that recorded their input
+        resume_input["correlationId"] = event.correlationId
+        resume_input["costLedger"] = {"preprocess": current_cost_entry(context)}
+
     response = Response(
         statusCode=statusCode,
         documentName=event.documentName,
         audioFilesS3Uris=audio_files_s3_uris,
+        useFastPath=use_fast_path,
+        resumeFrom=resume_from,
+        resumeInput=resume_input,
     ).__dict__
     metrics.add_metric(name="PreprocessingSuccessful", unit=MetricUnit.Count, value=1)
 
@@ -111,10 +154,10 @@ def lambda_handler(event: Request, context: LambdaContext):
 
 
 @tracer.capture_method
-def get_audio_files_s3_uris(audio_file_folder_uri: str) -> List[str]:
+def get_audio_files(audio_file_folder_uri: str) -> Dict[str, int]:
     """
     This function identifies the audio files present in the S3 folder path
-    mentioned.
+    mentioned, with their size.
 
     Arguments:
     ----------
@@ -123,11 +166,11 @@ def get_audio_files_s3_uris(audio_file_folder_uri: str) -> List[str]:
 
     Returns:
     --------
-        List[str]: A list of string containing the S3 object URLs of the
-            audio files in the given path as input
+        Dict[str, int]: The size in bytes of the audio files in the given
+            path as input, by S3 object URL
     """
     # Identify the audio files present in the S3 folder path
-    audio_files_s3_uris = []
+    audio_files = {}
     try:
         logger.info("Parsing input S3 URI")
         audio_file_folder_uri_parsed = S3Url(audio_file_folder_uri)
@@ -139,9 +182,10 @@ def get_audio_files_s3_uris(audio_file_folder_uri: str) -> List[str]:
             Prefix=audio_file_folder_uri_parsed.key,
         )
         for content in response.get("Contents", []):
-            audio_files_s3_uris.append(
+            audio_file_uri = (
                 f's3://{audio_file_folder_uri_parsed.bucket}/{content["Key"]}'
             )
+            audio_files[audio_file_uri] = content.get("Size", 0)
     except Exception as e:
         msg = f"Error while identifying audio files: {e}"
         logger.warning(msg, stack_info=True)
@@ -150,8 +194,73 @@ def get_audio_files_s3_uris(audio_file_folder_uri: str) -> List[str]:
             f"Error while identifying audio files in the S3 folder path: {audio_file_folder_uri}",
         )
 
-    if len(audio_files_s3_uris) == 0:
+    if len(audio_files) == 0:
         msg = f"No audio files found in the S3 folder path: {audio_file_folder_uri}"
         raise CodeError(msg)
 
-    return audio_files_s3_uris
+    return audio_files
+
+
+@tracer.capture_method
+def get_resume_point(
+    document_name: str, audio_files_s3_uris: List[str]
+) -> Tuple[str, dict]:
+    """
+    This function finds the first stage whose inputs changed since the
+    previous execution of the document, from the pipeline state recorded by
+    the stages. The stages before it are skipped by the state machine.
+
+    Arguments:
+    ----------
+        document_name (str): Name of the document.
+        audio_files_s3_uris (List[str]): The audio files of the document.
+
+    Returns:
+    --------
+        Tuple[str, dict]: The stage to resume from, and its input
+    """
+    if not PIPELINE_STATE_ENABLED or not audio_files_s3_uris:
+        return "transcribe", {}
+    try:
+        resume_from, resume_input = resume_point(
+            s3_client,
+            Connections.s3_bucket_name,
+            document_name,
+            audio_files_s3_uris,
+        )
+    except Exception as e:
+        logger.warning(f"Unable to read the pipeline state, running every stage: {e}")
+        return "transcribe", {}
+    logger.info(f"Resuming the pipeline of {document_name} from {resume_from}")
+    metrics.add_metric(
+        name=f"ResumedFrom{resume_from.capitalize()}", unit=MetricUnit.Count, value=1
+    )
+    return resume_from, resume_input
+
+
+def is_fast_path_eligible(audio_files: Dict[str, int]) -> bool:
+    """
+    This function decides whether a document is small enough to run all the
+    stages in the all-in-one fast path lambda. Orchestrating one lambda per
+    stage costs more than the work itself for a handful of short recordings.
+
+    Arguments:
+    ----------
+        audio_files (Dict[str, int]): The size in bytes of the audio files
+            of the document, by S3 object URL
+
+    Returns:
+    --------
+        bool: True when the document must be routed to the fast path
+    """
+    total_bytes = sum(audio_files.values())
+    use_fast_path = (
+        Connections.fast_path_enabled
+        and len(audio_files) <= Connections.fast_path_max_audio_files
+        and total_bytes <= Connections.fast_path_max_audio_bytes
+    )
+    logger.info(
+        f"{len(audio_files)} audio files of {total_bytes} bytes, "
+        f"fast path: {use_fast_path}"
+    )
+    return use_fast_path
@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable
+
+
+@dataclass(frozen=True)
+class CompiledChain:
+    """
+    A class for a chain built once and shared by the invocations of the AWS
+    Lambda.
+
+    Attributes:
+    -----------
+    chain: Runnable
+        The prompt, LLM and output parser chained together.
+    parser: BaseOutputParser
+        The output parser of the chain.
+    format_instructions: str
+        The format instructions of the parser, rendered once.
+    """
+
+    chain: Any
+    parser: Any
+    format_instructions: str = ""
+
+
+class ChainRegistry:
+    """
+    A class for the chains of the process, keyed by chain name, model, prompt
+    version and maximum number of tokens. The chains are stateless, so one
+    chain serves the warm invocations and the concurrent calls of the
+    process. A chain is built once, even when concurrent calls ask for it
+    before it exists.
+
+    Attributes:
+    -----------
+    builds: int
+        Number of chains built.
+    hits: int
+        Number of lookups that found a built chain.
+    """
+
+    def __init__(self):
+        self.builds = 0
+        self.hits = 0
+        self._chains: Dict[Hashable, CompiledChain] = {}
+        self._lock = Lock()
+
+    def get(self, key: Hashable, builder: Callable[[], CompiledChain]) -> CompiledChain:
+        """
+        Return the chain of a key, built with the builder on the first lookup.
+
+        Arguments:
+        ----------
+            key (Hashable): The chain name, model, prompt version and maximum
+                number of tokens.
+            builder (Callable[[], CompiledChain]): Builds the chain of the key.
+
+        Returns:
+        --------
+            CompiledChain: The chain of the key.
+        """
+        # Lookups of built chains skip the lock
+        compiled = self._chains.get(key)
+        if compiled is not None:
+            self.hits += 1
+            return compiled
+        with self._lock:
+            compiled = self._chains.get(key)
+            if compiled is None:
+                compiled = builder()
+                self._chains[key] = compiled
+                self.builds += 1
+            else:
+                self.hits += 1
+            return compiled
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chains.clear()
+
+    def __len__(self) -> int:
+        return len(self._chains)
+
+
+# The chains of the process, reused across warm invocations
+chain_registry = ChainRegistry()
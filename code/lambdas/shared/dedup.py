@@ -0,0 +1,126 @@
+import re
+import zlib
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List
+
+TOKEN_PATTERN = re.compile(rb"[a-z0-9]+")
+
+# MinHash signature length, split into LSH bands of rows.
+# With 16 bands of 8 rows, pairs above ~0.7 Jaccard similarity become candidates.
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 3
+
+# Multiply-shift hash family: h(x) = (a * x + b) mod 2^64 >> 32, with odd a
+_random = np.random.default_rng(seed=1)
+PERMUTATION_A = _random.integers(0, 2**63, NUM_PERMUTATIONS, np.uint64) * 2 + 1
+PERMUTATION_B = _random.integers(0, 2**63, NUM_PERMUTATIONS, np.uint64)
+SHINGLE_MULTIPLIERS = np.array(
+    [0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64
+)
+
+
+def shingle_hashes(token_hashes: np.ndarray) -> np.ndarray:
+    """
+    Combine the hashes of consecutive tokens into word shingle hashes.
+
+    Args:
+        token_hashes (np.ndarray): The hash of every token of a text, in order.
+
+    Returns:
+        np.ndarray: The shingle hashes.
+    """
+    size = min(SHINGLE_SIZE, len(token_hashes))
+    if size == 0:
+        return np.zeros(1, dtype=np.uint64)
+    count = len(token_hashes) - size + 1
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        shingles += token_hashes[offset : offset + count] * SHINGLE_MULTIPLIERS[offset]
+    return shingles
+
+
+def minhash_signatures(texts: List[str]) -> np.ndarray:
+    """
+    Compute the MinHash signature of every text.
+
+    Args:
+        texts (List[str]): The input texts.
+
+    Returns:
+        np.ndarray: The signatures, one row of NUM_PERMUTATIONS values per text.
+    """
+    token_hashes = [
+        np.fromiter(
+            map(zlib.crc32, TOKEN_PATTERN.findall(text.lower().encode("utf-8"))),
+            dtype=np.uint64,
+        )
+        for text in texts
+    ]
+
+    signatures = np.empty((len(texts), NUM_PERMUTATIONS), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for i, hashes in enumerate(map(shingle_hashes, token_hashes)):
+            permuted = (
+                PERMUTATION_A[:, None] * hashes[None, :] + PERMUTATION_B[:, None]
+            ) >> np.uint64(32)
+            signatures[i] = permuted.min(axis=1)
+    return signatures
+
+
+def _find(parents: List[int], i: int) -> int:
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def cluster_near_duplicates(
+    texts: List[str], threshold: float = 0.8
+) -> List[List[int]]:
+    """
+    Group near-identical texts using MinHash signatures and LSH banding.
+
+    Candidate pairs sharing an LSH band are merged when their estimated
+    Jaccard similarity reaches the threshold.
+
+    Args:
+        texts (List[str]): The input texts.
+        threshold (float): Minimum estimated Jaccard similarity of word shingles
+            for two texts to be considered near-duplicates.
+
+    Returns:
+        List[List[int]]: Clusters of text positions, in order of first appearance.
+            The first position of each cluster is its representative (the longest text).
+    """
+    if not texts:
+        return []
+
+    signatures = minhash_signatures(texts)
+    parents = list(range(len(texts)))
+
+    for band in range(LSH_BANDS):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        band_rows = signatures[:, band * LSH_ROWS : (band + 1) * LSH_ROWS]
+        for i, row in enumerate(band_rows):
+            buckets[row.tobytes()].append(i)
+
+        for members in buckets.values():
+            # Skip buckets whose members were already merged by a previous band
+            if len({_find(parents, i) for i in members}) < 2:
+                continue
+            candidates = signatures[members]
+            similarity = (candidates[:, None, :] == candidates[None, :, :]).mean(axis=2)
+            for a, b in zip(*np.nonzero(np.triu(similarity >= threshold, k=1))):
+                parents[_find(parents, members[b])] = _find(parents, members[a])
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(_find(parents, i), []).append(i)
+
+    return [
+        sorted(members, key=lambda i: (-len(texts[i]), i))
+        for members in clusters.values()
+    ]
@@ -0,0 +1,211 @@
+import datetime
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.idempotency import (
+    BasePersistenceLayer,
+    DynamoDBPersistenceLayer,
+    IdempotencyConfig,
+    idempotent,
+)
+from aws_lambda_powertools.utilities.idempotency.exceptions import (
+    IdempotencyAlreadyInProgressError,
+    IdempotencyItemAlreadyExistsError,
+    IdempotencyItemNotFoundError,
+)
+from aws_lambda_powertools.utilities.idempotency.persistence.datarecord import (
+    STATUS_CONSTANTS,
+    DataRecord,
+)
+from pipeline_state import inputs_hash
+
+# Invocations with the same document name and inputs, and the same content
+# of the S3 objects of the inputs, as an earlier one return its stored
+# response instead of doing the work again
+IDEMPOTENCY_ENABLED = os.environ.get("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+
+# The DynamoDB table of the idempotency records; without one, the records are
+# kept in the memory of the execution environment
+IDEMPOTENCY_TABLE_NAME = os.environ.get("IDEMPOTENCY_TABLE_NAME", "")
+
+# How long a stored response is returned to the duplicates of an invocation
+IDEMPOTENCY_EXPIRES_AFTER_SECONDS = int(
+    os.environ.get("IDEMPOTENCY_EXPIRES_AFTER_SECONDS", "3600")
+)
+
+# The time left to the invocation when a duplicate stops waiting for the
+# invocation in progress and fails, to be retried by the state machine
+IN_PROGRESS_WAIT_MARGIN_SECONDS = 10.0
+IN_PROGRESS_MAX_POLL_SECONDS = 8.0
+
+# Field added to the event for the key, with the hash of the content of the
+# S3 objects of the inputs
+INPUTS_HASH_FIELD = "inputsHash"
+
+logger = Logger(child=True)
+
+
+class InMemoryPersistenceLayer(BasePersistenceLayer):
+    """
+    An idempotency persistence layer keeping the records in memory, shared by
+    the threads of the process. It stands in for the DynamoDB table in local
+    runs and tests, and only sees the duplicates reaching the same execution
+    environment when deployed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._records: Dict[str, DataRecord] = {}
+        self._lock = threading.Lock()
+
+    def _get_record(self, idempotency_key) -> DataRecord:
+        with self._lock:
+            if idempotency_key not in self._records:
+                raise IdempotencyItemNotFoundError
+            return self._records[idempotency_key]
+
+    def _put_record(self, data_record: DataRecord) -> None:
+        now = datetime.datetime.now().timestamp()
+        with self._lock:
+            existing = self._records.get(data_record.idempotency_key)
+            # Same conditions as the conditional write of the DynamoDB layer
+            if existing is not None and not (
+                existing.is_expired
+                or (
+                    existing.status == STATUS_CONSTANTS["INPROGRESS"]
+                    and existing.in_progress_expiry_timestamp is not None
+                    and existing.in_progress_expiry_timestamp < now * 1000
+                )
+            ):
+                raise IdempotencyItemAlreadyExistsError(old_data_record=existing)
+            self._records[data_record.idempotency_key] = data_record
+
+    def _update_record(self, data_record: DataRecord) -> None:
+        with self._lock:
+            self._records[data_record.idempotency_key] = data_record
+
+    def _delete_record(self, data_record: DataRecord) -> None:
+        with self._lock:
+            self._records.pop(data_record.idempotency_key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+
+class UnsuccessfulResponse(Exception):
+    """
+    Raised for a response whose status code is not 200, so that the record of
+    the invocation is deleted instead of being returned to its retries.
+    """
+
+    def __init__(self, response: dict):
+        super().__init__(f"Unsuccessful response: {response.get('statusCode')}")
+        self.response = response
+
+
+def get_persistence_layer() -> BasePersistenceLayer:
+    """
+    Return the DynamoDB persistence layer of the idempotency table when it is
+    configured, and an in-memory one otherwise.
+    """
+    if IDEMPOTENCY_TABLE_NAME:
+        return DynamoDBPersistenceLayer(table_name=IDEMPOTENCY_TABLE_NAME)
+    return InMemoryPersistenceLayer()
+
+
+def _remaining_seconds(context: Any) -> float:
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    return get_remaining_time() / 1000 if get_remaining_time else float("inf")
+
+
+def idempotent_handler(
+    stage: str,
+    *fields: str,
+    s3_client: Any,
+    persistence_store: Optional[BasePersistenceLayer] = None,
+) -> Callable:
+    """
+    Decorate a lambda handler to run once per document name and inputs, with
+    the idempotency utility of Powertools. The key is the hash of the stage,
+    of the given fields of the event, which leave out the `costLedger` and
+    the `correlationId` of the event, and of the ETags of the S3 objects the
+    fields refer to, so that an invocation whose inputs have the same names
+    but a new content is not a duplicate. A duplicate of a completed invocation returns its stored response. A duplicate of an
+    invocation in progress waits for it, and raises
+    `IdempotencyAlreadyInProgressError` for the state machine to retry if the
+    invocation is still in progress close to the timeout. Failed invocations,
+    including the responses whose status code is not 200, are not stored.
+
+    The idempotency utility reads the raw event, so the decorator goes above
+    `event_parser`.
+
+    Arguments:
+    ----------
+        stage (str): Name of the stage, e.g. "validate".
+        fields (str): The fields of the event keying the invocation, e.g.
+            "documentName" and "transcribedFilesS3Uris".
+        s3_client (boto3.client): The S3 client reading the ETags of the S3
+            objects of the fields.
+        persistence_store (BasePersistenceLayer): The store of the records,
+            defaults to the one of `get_persistence_layer`.
+
+    Returns:
+    --------
+        Callable: The decorator.
+    """
+
+    def decorator(handler: Callable) -> Callable:
+        if not IDEMPOTENCY_ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def run(event: Any, context: Any, **kwargs):
+            event = {k: v for k, v in event.items() if k != INPUTS_HASH_FIELD}
+            response = handler(event, context, **kwargs)
+            if isinstance(response, dict) and response.get("statusCode", 200) != 200:
+                raise UnsuccessfulResponse(response)
+            return response
+
+        idempotent_run = idempotent(
+            run,
+            persistence_store=persistence_store or get_persistence_layer(),
+            config=IdempotencyConfig(
+                # The stage keeps apart the stages run by the same function
+                event_key_jmespath=(
+                    f"['{stage}', {', '.join(fields)}, {INPUTS_HASH_FIELD}]"
+                ),
+                expires_after_seconds=IDEMPOTENCY_EXPIRES_AFTER_SECONDS,
+                use_local_cache=True,
+            ),
+        )
+
+        @functools.wraps(handler)
+        def wrapper(event: Any, context: Any, **kwargs):
+            if isinstance(event, dict):
+                inputs = {name: event.get(name) for name in fields}
+                event = {**event, INPUTS_HASH_FIELD: inputs_hash(s3_client, inputs)}
+            poll_seconds = 1.0
+            while True:
+                try:
+                    return idempotent_run(event, context, **kwargs)
+                except UnsuccessfulResponse as error:
+                    return error.response
+                except IdempotencyAlreadyInProgressError:
+                    if (
+                        _remaining_seconds(context) - poll_seconds
+                        < IN_PROGRESS_WAIT_MARGIN_SECONDS
+                    ):
+                        raise
+                    logger.info(
+                        f"Waiting {poll_seconds:g}s for the same {stage} invocation in progress"
+                    )
+                    time.sleep(poll_seconds)
+                    poll_seconds = min(poll_seconds * 2, IN_PROGRESS_MAX_POLL_SECONDS)
+
+        return wrapper
+
+    return decorator
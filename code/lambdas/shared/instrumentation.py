@@ -0,0 +1,506 @@
+import contextvars
+import functools
+import io
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from aws_lambda_powertools import Tracer
+from aws_lambda_powertools.metrics import EphemeralMetrics, MetricUnit
+from botocore.response import StreamingBody
+
+# Performance metrics of the stages, emitted with the stage and phase
+# dimensions; the document name is metadata, to keep the metric count bounded
+STAGE_METRICS_ENABLED = (
+    os.environ.get("STAGE_METRICS_ENABLED", "true").lower() == "true"
+)
+
+# Peak Python allocations of every phase, to size the memory of the lambdas;
+# tracemalloc slows the allocations down, so it is opt-in
+MEMORY_PROFILING = os.environ.get("MEMORY_PROFILING", "false").lower() == "true"
+
+S3_WRITE_OPERATIONS = ("PutObject", "UploadPart")
+
+# The phases measuring the calls of the current invocation, outermost first.
+# The handlers of concurrent in-process invocations, e.g. of the load
+# generator, run in their own threads and get their own phases, and the
+# worker threads of an invocation get its phases with `in_trace_context`.
+_active_phases: contextvars.ContextVar[Tuple["PhaseMetrics", ...]] = (
+    contextvars.ContextVar("active_phases", default=())
+)
+# Every phase being measured in the process, and the number of outermost ones,
+# i.e. of the invocations in progress
+_process_phases: List["PhaseMetrics"] = []
+_invocations = 0
+_lock = threading.Lock()
+
+tracer = Tracer()
+
+
+@dataclass
+class PhaseMetrics:
+    """
+    The resources used by a phase of a stage
+
+    Attributes:
+    -----------
+    stage: str
+        Name of the stage, e.g. "validate".
+    document_name: str
+        Name of the document being processed.
+    phase: str
+        Name of the phase, "handler" for the whole invocation.
+    duration: float
+        Duration of the phase, in seconds.
+    s3_bytes_read: int
+        Bytes of the S3 objects read.
+    s3_bytes_written: int
+        Bytes of the S3 objects written.
+    s3_objects: Set[Tuple[str, str]]
+        Bucket and key of the S3 objects read, written or checked.
+    s3_requests: Dict[str, int]
+        Number of S3 requests, by operation, including the failed ones.
+    bedrock_input_tokens: int
+        Input tokens of the Bedrock model invocations.
+    bedrock_output_tokens: int
+        Output tokens of the Bedrock model invocations.
+    transcribe_audio_seconds: float
+        Duration of the audio transcribed by Amazon Transcribe.
+    transcribe_jobs: int
+        Number of Amazon Transcribe jobs whose output was read.
+    transcribe_job_seconds: List[float]
+        Duration of the audio of every Amazon Transcribe job, as the jobs are
+        billed a minimum duration each.
+    peak_rss_mb: float
+        Peak resident memory of the execution environment at the end of the
+        phase, in megabytes.
+    python_peak_mb: float
+        Peak of the Python allocations during the phase, in megabytes, when
+        the memory profiling is enabled.
+    input_bytes: int
+        Bytes read from S3 by the invocation until the end of the phase, as
+        the input size of the memory profile.
+    """
+
+    stage: str
+    document_name: str
+    phase: str = "handler"
+    duration: float = 0.0
+    s3_bytes_read: int = 0
+    s3_bytes_written: int = 0
+    s3_objects: Set[Tuple[str, str]] = field(default_factory=set)
+    s3_requests: Dict[str, int] = field(default_factory=dict)
+    bedrock_input_tokens: int = 0
+    bedrock_output_tokens: int = 0
+    transcribe_audio_seconds: float = 0.0
+    transcribe_jobs: int = 0
+    transcribe_job_seconds: List[float] = field(default_factory=list)
+    peak_rss_mb: float = 0.0
+    python_peak_mb: float = 0.0
+    input_bytes: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def cost_entry(self, memory_limit_in_mb: int) -> dict:
+        """
+        Return the billed usage of the phase so far, as an entry of the cost
+        ledger of the document.
+
+        Arguments:
+        ----------
+            memory_limit_in_mb (int): Memory of the lambda function.
+
+        Returns:
+        --------
+            dict: The usage of every billed service.
+        """
+        duration = time.perf_counter() - self.started_at
+        return {
+            "transcribeAudioMinutes": round(self.transcribe_audio_seconds / 60, 4),
+            "transcribeJobs": self.transcribe_jobs,
+            "transcribeJobSeconds": [
+                round(seconds, 3) for seconds in self.transcribe_job_seconds
+            ],
+            "bedrockInputTokens": self.bedrock_input_tokens,
+            "bedrockOutputTokens": self.bedrock_output_tokens,
+            "lambdaGbSeconds": round(duration * memory_limit_in_mb / 1024, 4),
+            "lambdaInvocations": 1,
+            "s3Requests": dict(self.s3_requests),
+        }
+
+    def emit(self, namespace: Optional[str] = None) -> None:
+        """Print the metrics of the phase as a CloudWatch EMF blob."""
+        metrics = EphemeralMetrics(namespace=namespace)
+        metrics.add_dimension(name="stage", value=self.stage)
+        metrics.add_dimension(name="phase", value=self.phase)
+        metrics.add_metadata(key="documentName", value=self.document_name)
+        for name, unit, value in (
+            ("StageDuration", MetricUnit.Seconds, self.duration),
+            ("S3BytesRead", MetricUnit.Bytes, self.s3_bytes_read),
+            ("S3BytesWritten", MetricUnit.Bytes, self.s3_bytes_written),
+            ("S3ObjectsTouched", MetricUnit.Count, len(self.s3_objects)),
+            ("BedrockInputTokens", MetricUnit.Count, self.bedrock_input_tokens),
+            ("BedrockOutputTokens", MetricUnit.Count, self.bedrock_output_tokens),
+            (
+                "TranscribeAudioSeconds",
+                MetricUnit.Seconds,
+                self.transcribe_audio_seconds,
+            ),
+            ("PeakRSS", MetricUnit.Megabytes, self.peak_rss_mb),
+        ):
+            metrics.add_metric(name=name, unit=unit, value=value)
+        if MEMORY_PROFILING:
+            metrics.add_metric(
+                name="PythonPeakMemory",
+                unit=MetricUnit.Megabytes,
+                value=self.python_peak_mb,
+            )
+            metrics.add_metric(
+                name="InputBytes", unit=MetricUnit.Bytes, value=self.input_bytes
+            )
+        metrics.flush_metrics()
+
+
+def _record(update: Callable[[PhaseMetrics], None]) -> None:
+    phases = _active_phases.get()
+    with _lock:
+        # The calls of the threads the invocation does not start itself, e.g.
+        # of the S3 transfers, are counted when only one invocation is running,
+        # as in a lambda execution environment
+        if not phases and _invocations == 1:
+            phases = _process_phases
+        for phase_metrics in phases:
+            update(phase_metrics)
+
+
+def _fold_python_peak() -> None:
+    """
+    Record the peak of the Python allocations since the last call in the
+    active phases, and start a new peak. Called with the lock held, whenever
+    a phase starts or ends, so that nested phases get their own peak.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        return
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+    for phase_metrics in _process_phases:
+        phase_metrics.python_peak_mb = max(phase_metrics.python_peak_mb, peak_mb)
+    tracemalloc.reset_peak()
+
+
+@contextmanager
+def phase(
+    stage: str,
+    document_name: str,
+    name: str = "handler",
+    namespace: Optional[str] = None,
+) -> Iterator[PhaseMetrics]:
+    """
+    Measure a phase of a stage, and emit its metrics when it ends.
+
+    The S3, Bedrock and Transcribe calls of the clients passed to
+    `instrument_client` are counted in every phase active at the time of the
+    call, i.e. the calls of a nested phase also count in the enclosing one.
+    Phases other than "handler" are also traced as a `## <name>` X-Ray
+    subsegment, so the trace analyzer can attribute their time.
+
+    Arguments:
+    ----------
+        stage (str): Name of the stage, e.g. "validate".
+        document_name (str): Name of the document being processed.
+        name (str): Name of the phase, e.g. "llm".
+        namespace (str): Namespace of the metrics, defaults to the
+            environmental variable 'POWERTOOLS_METRICS_NAMESPACE'.
+
+    Returns:
+    --------
+        Iterator[PhaseMetrics]: The metrics of the phase, updated until it ends.
+    """
+    phase_metrics = PhaseMetrics(stage=stage, document_name=document_name, phase=name)
+    if not STAGE_METRICS_ENABLED:
+        yield phase_metrics
+        return
+
+    global _invocations
+    enclosing_phases = _active_phases.get()
+    with _lock:
+        if MEMORY_PROFILING:
+            _fold_python_peak()
+        _process_phases.append(phase_metrics)
+        _invocations += not enclosing_phases
+    token = _active_phases.set(enclosing_phases + (phase_metrics,))
+    try:
+        if name == "handler":
+            yield phase_metrics
+        else:
+            with tracer.provider.in_subsegment(name=f"## {name}") as subsegment:
+                subsegment.put_annotation("stage", stage)
+                subsegment.put_annotation("phase", name)
+                yield phase_metrics
+    finally:
+        phase_metrics.duration = time.perf_counter() - phase_metrics.started_at
+        # ru_maxrss is in kilobytes on Linux
+        phase_metrics.peak_rss_mb = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        )
+        _active_phases.reset(token)
+        with _lock:
+            if MEMORY_PROFILING:
+                _fold_python_peak()
+            # The input of the invocation is read by its handler phase
+            handler_phase = next(
+                (
+                    active
+                    for active in reversed(enclosing_phases)
+                    if active.phase == "handler" and active.stage == stage
+                ),
+                phase_metrics,
+            )
+            phase_metrics.input_bytes = handler_phase.s3_bytes_read
+            _process_phases.remove(phase_metrics)
+            _invocations -= not enclosing_phases
+        phase_metrics.emit(namespace)
+
+
+def in_trace_context(function: Callable) -> Callable:
+    """
+    Wrap a function run by a worker thread, e.g. of a `ThreadPoolExecutor`,
+    so that its X-Ray subsegments and the traced calls of its clients are
+    attached to the current trace entity of the calling thread, and the calls
+    of its clients are counted in the active phases of the calling thread.
+    The X-Ray context and the active phases are local to each thread, so they
+    are lost otherwise.
+
+    Arguments:
+    ----------
+        function (Callable): The function to run in the worker thread.
+
+    Returns:
+    --------
+        Callable: The function, run in the trace entity and the phases of the
+            calling thread.
+    """
+    entity = tracer.provider.get_trace_entity()
+    phases = _active_phases.get()
+
+    @functools.wraps(function)
+    def run(*args, **kwargs):
+        token = _active_phases.set(phases)
+        if entity is not None:
+            tracer.provider.set_trace_entity(entity)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if entity is not None:
+                tracer.provider.clear_trace_entities()
+            _active_phases.reset(token)
+
+    return run
+
+
+def instrument_handler(
+    stage: str, namespace: Optional[str] = None, cost_ledger: bool = True
+) -> Callable:
+    """
+    Decorate a lambda handler to measure its invocations as the "handler"
+    phase of the stage. The document name is read from the parsed event, so
+    the decorator goes below `event_parser`.
+
+    The usage of the invocation is added as the entry of the stage to the
+    `costLedger` of the event, and returned in the `costLedger` of the
+    response, when the response has one.
+
+    The `correlationId` of the event, or a new one for the first stage, is
+    added to the X-Ray trace as an annotation with the stage and the document
+    name, and returned in the `correlationId` of the response.
+
+    Arguments:
+    ----------
+        stage (str): Name of the stage, e.g. "validate".
+        namespace (str): Namespace of the metrics.
+        cost_ledger (bool): Whether to add the entry of the stage to the cost
+            ledger, i.e. False for a handler that calls the other stages.
+
+    Returns:
+    --------
+        Callable: The decorator.
+    """
+
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        def wrapper(event: Any, context: Any, *args, **kwargs):
+            document_name = getattr(event, "documentName", None) or "unknown"
+            correlation_id = getattr(event, "correlationId", None) or str(uuid.uuid4())
+            if hasattr(event, "correlationId"):
+                event.correlationId = correlation_id
+            tracer.put_annotation(key="correlationId", value=correlation_id)
+            tracer.put_annotation(key="stage", value=stage)
+            tracer.put_annotation(key="documentName", value=document_name)
+            with phase(stage, document_name, namespace=namespace) as phase_metrics:
+                response = handler(event, context, *args, **kwargs)
+                if isinstance(response, dict) and "correlationId" in response:
+                    response["correlationId"] = correlation_id
+                if cost_ledger and isinstance(response, dict):
+                    if "costLedger" in response:
+                        response["costLedger"] = dict(
+                            getattr(event, "costLedger", None) or {},
+                            **{stage: phase_metrics.cost_entry(_memory_limit(context))},
+                        )
+                return response
+
+        return wrapper
+
+    return decorator
+
+
+def current_cost_entry(context: Any) -> dict:
+    """
+    Return the billed usage of the invocation so far, for a handler that
+    writes the cost ledger before it returns.
+
+    Arguments:
+    ----------
+        context (LambdaContext): The context of the invocation.
+
+    Returns:
+    --------
+        dict: The usage of every billed service, empty when the metrics are
+            disabled.
+    """
+    handler_phases = [p for p in _active_phases.get() if p.phase == "handler"]
+    if not handler_phases:
+        return {}
+    return handler_phases[-1].cost_entry(_memory_limit(context))
+
+
+def _memory_limit(context: Any) -> int:
+    return int(getattr(context, "memory_limit_in_mb", 0) or 0)
+
+
+def add_transcribe_audio_seconds(seconds: float) -> None:
+    """Count a job of Amazon Transcribe and its audio in the active phases."""
+
+    def update(phase_metrics: PhaseMetrics):
+        phase_metrics.transcribe_audio_seconds += seconds
+        phase_metrics.transcribe_jobs += 1
+        phase_metrics.transcribe_job_seconds.append(seconds)
+
+    _record(update)
+
+
+def transcript_audio_seconds(transcribe_output: dict) -> float:
+    """Return the duration of the audio of an Amazon Transcribe output."""
+    end_times = [
+        float(item["end_time"])
+        for item in transcribe_output.get("results", {}).get("items", [])
+        if "end_time" in item
+    ]
+    return max(end_times, default=0.0)
+
+
+def _body_size(body: Any) -> int:
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    try:
+        position = body.tell()
+        body.seek(0, io.SEEK_END)
+        size = body.tell() - position
+        body.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def _before_parameter_build(params, context, **_):
+    if "Key" in params:
+        context["instrumentation_object"] = (params.get("Bucket"), params["Key"])
+
+
+def _before_call(model, params, context, **_):
+    if model.name in S3_WRITE_OPERATIONS:
+        context["instrumentation_bytes_written"] = _body_size(params.get("body"))
+
+
+def _after_call(http_response, parsed, model, context, **_):
+    service = model.service_model.service_name
+    if service == "s3":
+        # Failed requests are billed too
+        def count(phase_metrics: PhaseMetrics):
+            requests = phase_metrics.s3_requests
+            requests[model.name] = requests.get(model.name, 0) + 1
+
+        _record(count)
+    if getattr(http_response, "status_code", 200) >= 300:
+        return
+    if service == "s3":
+        bytes_read = parsed.get("ContentLength", 0) if model.name == "GetObject" else 0
+        bytes_written = context.get("instrumentation_bytes_written", 0)
+        s3_object = context.get("instrumentation_object")
+
+        def update(phase_metrics: PhaseMetrics):
+            phase_metrics.s3_bytes_read += bytes_read
+            phase_metrics.s3_bytes_written += bytes_written
+            if s3_object:
+                phase_metrics.s3_objects.add(s3_object)
+
+        _record(update)
+    elif service == "bedrock-runtime" and model.name == "InvokeModel":
+        input_tokens, output_tokens = _bedrock_usage(parsed)
+
+        def update(phase_metrics: PhaseMetrics):
+            phase_metrics.bedrock_input_tokens += input_tokens
+            phase_metrics.bedrock_output_tokens += output_tokens
+
+        _record(update)
+
+
+def _bedrock_usage(parsed: dict) -> Tuple[int, int]:
+    """Read the token counts from the headers, or else from the response usage."""
+    headers = parsed.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    if "x-amzn-bedrock-input-token-count" in headers:
+        return (
+            int(headers["x-amzn-bedrock-input-token-count"]),
+            int(headers.get("x-amzn-bedrock-output-token-count", 0)),
+        )
+    body = parsed.get("body")
+    if not isinstance(body, StreamingBody):
+        return 0, 0
+    # Read the body, and give the caller a fresh one
+    content = body.read()
+    parsed["body"] = StreamingBody(io.BytesIO(content), len(content))
+    try:
+        usage = json.loads(content).get("usage", {})
+    except ValueError:
+        return 0, 0
+    return int(usage.get("input_tokens", 0)), int(usage.get("output_tokens", 0))
+
+
+def instrument_client(client: Any) -> Any:
+    """
+    Count the S3 bytes and objects and the Bedrock tokens of the calls of a
+    boto3 client, in the active phases.
+
+    Arguments:
+    ----------
+        client (boto3.client): The client to instrument. Clients that are not
+            botocore clients, e.g. in-memory stand-ins, are left as is.
+
+    Returns:
+    --------
+        boto3.client: The given client.
+    """
+    events = getattr(getattr(client, "meta", None), "events", None)
+    if not STAGE_METRICS_ENABLED or events is None:
+        return client
+    events.register("before-parameter-build.*.*", _before_parameter_build)
+    # Runs before the recorder, which answers the calls it replays
+    events.register_first("before-call.*.*", _before_call)
+    events.register("after-call.*.*", _after_call)
+    return client
@@ -0,0 +1,222 @@
+import functools
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+# Each stage records its output and the hash of its inputs, so that a new
+# execution of the document skips the stages whose inputs did not change
+PIPELINE_STATE_ENABLED = (
+    os.environ.get("PIPELINE_STATE_ENABLED", "true").lower() == "true"
+)
+PIPELINE_STATE_PREFIX = os.environ.get("PIPELINE_STATE_PREFIX", "pipeline_state")
+
+# The stages after preprocess, in the order of the state machine
+STAGES = ("transcribe", "validate", "summarize", "generate")
+
+# The fields of the event holding the inputs of every stage
+STAGE_INPUTS: Dict[str, Tuple[str, ...]] = {
+    "transcribe": ("audioFilesS3Uris",),
+    "validate": ("transcribedFilesS3Uris",),
+    "summarize": ("validAnswersS3Uris", "invalidAnswersS3Uris"),
+    "generate": ("summarizedAnswerS3Uri", "sections", "outputFormats"),
+}
+
+logger = Logger(child=True)
+
+
+def state_key(document_name: str, stage: str) -> str:
+    return f"{PIPELINE_STATE_PREFIX}/{document_name}/{stage}.json"
+
+
+def read_stage_state(
+    s3_client: Any, bucket_name: str, document_name: str, stage: str
+) -> Optional[dict]:
+    """
+    Read the recorded state of a stage of a document.
+
+    Arguments:
+    ----------
+        s3_client (boto3.client): The S3 client.
+        bucket_name (str): The bucket of the pipeline state.
+        document_name (str): Name of the document.
+        stage (str): Name of the stage.
+
+    Returns:
+    --------
+        dict: The inputs, the hash of the inputs and the output of the stage,
+            None when the stage was not recorded.
+    """
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=state_key(document_name, stage)
+        )
+    except ClientError as error:
+        if error.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(response["Body"].read())
+
+
+def _content_version(s3_client: Any, value: Any) -> Any:
+    """Replace the S3 URIs of a value with the ETags of their objects."""
+    if isinstance(value, str) and value.startswith("s3://"):
+        bucket_name, _, key = value[len("s3://") :].partition("/")
+        try:
+            return s3_client.head_object(Bucket=bucket_name, Key=key)["ETag"]
+        except ClientError:
+            return None
+    if isinstance(value, dict):
+        return {k: _content_version(s3_client, v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_content_version(s3_client, v) for v in value]
+    return value
+
+
+def inputs_hash(s3_client: Any, inputs: dict) -> str:
+    """
+    Hash the inputs of a stage with the content of the S3 objects they refer
+    to, i.e. their ETags.
+
+    Arguments:
+    ----------
+        s3_client (boto3.client): The S3 client.
+        inputs (dict): The input fields of the stage.
+
+    Returns:
+    --------
+        str: SHA-256 hex digest of the inputs and of their content versions.
+    """
+    versioned = {"inputs": inputs, "versions": _content_version(s3_client, inputs)}
+    return hashlib.sha256(
+        json.dumps(versioned, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def stage_inputs(stage: str, event: dict) -> dict:
+    return {name: event.get(name) for name in STAGE_INPUTS[stage]}
+
+
+def is_completed(output: dict) -> bool:
+    """Whether the output of a stage lets the state machine go on."""
+    return (
+        output.get("statusCode", 200) == 200
+        and output.get("continueSummarization") is not False
+    )
+
+
+def record_stage_state(stage: str, s3_client: Any) -> Callable:
+    """
+    Decorate a lambda handler to record the output of the stage and the hash
+    of its inputs in the pipeline state of the document, once the stage is
+    completed. Recording the state never fails the stage. The decorator reads
+    the raw event, so it goes above `event_parser`.
+
+    Arguments:
+    ----------
+        stage (str): Name of the stage, e.g. "validate".
+        s3_client (boto3.client): The S3 client of the lambda.
+
+    Returns:
+    --------
+        Callable: The decorator.
+    """
+
+    def decorator(handler: Callable) -> Callable:
+        if not PIPELINE_STATE_ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event: Any, context: Any, **kwargs):
+            response = handler(event, context, **kwargs)
+            if (
+                isinstance(event, dict)
+                and isinstance(response, dict)
+                and is_completed(response)
+            ):
+                try:
+                    write_stage_state(s3_client, stage, event, response)
+                except Exception as error:
+                    logger.warning(
+                        f"Unable to record the {stage} pipeline state: {error}"
+                    )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def write_stage_state(s3_client: Any, stage: str, event: dict, output: dict) -> None:
+    """
+    Record the output of a completed stage and the hash of its inputs.
+
+    Arguments:
+    ----------
+        s3_client (boto3.client): The S3 client.
+        stage (str): Name of the stage.
+        event (dict): The input of the stage.
+        output (dict): The output of the stage.
+    """
+    bucket_name = os.environ["DATA_SOURCE_BUCKET_NAME"]
+    document_name = event["documentName"]
+    inputs = stage_inputs(stage, event)
+    # One object per stage, so the stages of concurrent executions of the
+    # document never overwrite the state of each other
+    state = {
+        "documentName": document_name,
+        "stage": stage,
+        "inputs": inputs,
+        "inputsHash": inputs_hash(s3_client, inputs),
+        "output": output,
+        "completedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=state_key(document_name, stage),
+        Body=json.dumps(state, indent=2, default=str).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def resume_point(
+    s3_client: Any, bucket_name: str, document_name: str, audio_files_s3_uris: list
+) -> Tuple[str, dict]:
+    """
+    Find the first stage of a new execution of a document whose inputs changed
+    since it was completed, following the recorded outputs of the stages
+    from the audio files. A recorded stage is skipped when its inputs are the
+    outputs of the previous stage and their content did not change.
+
+    Arguments:
+    ----------
+        s3_client (boto3.client): The S3 client.
+        bucket_name (str): The bucket of the pipeline state.
+        document_name (str): Name of the document.
+        audio_files_s3_uris (list): The audio files of the new execution.
+
+    Returns:
+    --------
+        Tuple[str, dict]: The stage to resume from, and the recorded output of
+            the previous stage as its input, which is empty for "transcribe".
+            Resumes from "generate" when no input changed, so that the
+            document is generated again.
+    """
+    next_input = {"audioFilesS3Uris": audio_files_s3_uris}
+    resume_input: dict = {}
+    for stage in STAGES:
+        record = read_stage_state(s3_client, bucket_name, document_name, stage)
+        inputs = stage_inputs(stage, next_input)
+        if (
+            record is None
+            or record["inputs"] != inputs
+            or record["inputsHash"] != inputs_hash(s3_client, inputs)
+        ):
+            return stage, resume_input
+        if stage == "generate":
+            break
+        resume_input = next_input = record["output"]
+    return "generate", resume_input
@@ -0,0 +1,237 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+# "record" captures the calls of the boto3 clients to cassette files, "replay"
+# serves them back from the cassette files without calling AWS
+CASSETTE_MODE = "AWS_CASSETTE_MODE"
+CASSETTE_DIR = "AWS_CASSETTE_DIR"
+CASSETTE_REPLAY_LATENCY = "AWS_CASSETTE_REPLAY_LATENCY"
+
+# Response members holding a streaming body
+STREAMING_MEMBERS = ("Body", "body", "AudioStream")
+
+
+class CassetteMiss(LookupError):
+    """An exception class for calls that have no recorded interaction to replay"""
+
+
+def encode(value: Any) -> Any:
+    """Convert a request or response value into JSON serializable data."""
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def decode(value: Any) -> Any:
+    """Convert data encoded by `encode` back into request or response values."""
+    if isinstance(value, dict):
+        if "__datetime__" in value:
+            return datetime.fromisoformat(value["__datetime__"])
+        if "__bytes__" in value:
+            return base64.b64decode(value["__bytes__"])
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def payload_digest(value: Any) -> Any:
+    """Replace the payloads of request parameters by their size and digest."""
+    if isinstance(value, dict):
+        return {key: payload_digest(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [payload_digest(item) for item in value]
+    if isinstance(value, str) and len(value) > 256:
+        value = value.encode("utf-8")
+    if isinstance(value, (bytes, bytearray)):
+        return {"size": len(value), "sha256": hashlib.sha256(value).hexdigest()}
+    if hasattr(value, "read"):
+        return {"size": stream_size(value)}
+    return encode(value)
+
+
+def stream_size(stream: Any) -> Optional[int]:
+    try:
+        position = stream.tell()
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell() - position
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class Cassette:
+    """
+    A class for recording the calls of a boto3 client to a cassette file, and
+    replaying them, through the `before-call` and `after-call` events of botocore.
+
+    Every interaction is a JSON line with the operation, a key derived from
+    the serialized request (payloads are replaced by their digest), the
+    response and the latency of the call. On replay, a call gets the response
+    recorded with the same key, or else the next response recorded for the
+    operation, e.g. for the job names that contain a timestamp.
+
+    Attributes:
+    -----------
+    path: str
+        Path of the cassette file.
+    mode: str
+        "record" or "replay".
+    replay_latency: bool
+        Whether the replayed calls wait for the recorded latency.
+    """
+
+    def __init__(self, path: str, mode: str, replay_latency: bool = False):
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, List[dict]] = {}
+        self._by_operation: Dict[str, List[dict]] = {}
+        self._replayed: Dict[str, int] = {}
+        if mode == "replay":
+            self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                self._by_key.setdefault(interaction["key"], []).append(interaction)
+                self._by_operation.setdefault(interaction["operation"], []).append(
+                    interaction
+                )
+
+    def request_key(self, operation: str, request_dict: dict) -> str:
+        request = json.dumps(
+            payload_digest(
+                {
+                    name: request_dict.get(name)
+                    for name in ("method", "url_path", "query_string", "body")
+                }
+            ),
+            sort_keys=True,
+        )
+        return hashlib.sha256(f"{operation}:{request}".encode("utf-8")).hexdigest()
+
+    def next_interaction(self, key: str, operation: str) -> dict:
+        """Return the interaction to replay, cycling through the recorded ones."""
+        for counter, interactions in (
+            (key, self._by_key.get(key)),
+            (operation, self._by_operation.get(operation)),
+        ):
+            if interactions:
+                with self._lock:
+                    index = self._replayed.get(counter, 0)
+                    self._replayed[counter] = index + 1
+                return interactions[index % len(interactions)]
+        raise CassetteMiss(f"No recorded {operation} call in {self.path}")
+
+    def before_call(self, model, params, context, **_):
+        operation = model.name
+        key = self.request_key(operation, params)
+        context["cassette_key"] = key
+        context["cassette_start"] = time.perf_counter()
+        if self.mode != "replay":
+            return None
+
+        interaction = self.next_interaction(key, operation)
+        if self.replay_latency:
+            time.sleep(interaction["latency_ms"] / 1000)
+        parsed = decode(interaction["response"])
+        for member in STREAMING_MEMBERS:
+            if isinstance(parsed.get(member), bytes):
+                content = parsed[member]
+                parsed[member] = StreamingBody(io.BytesIO(content), len(content))
+        http_response = AWSResponse(
+            url="", status_code=interaction["status_code"], headers={}, raw=None
+        )
+        return http_response, parsed
+
+    def after_call(self, http_response, parsed, model, context, **_):
+        if self.mode != "record" or "cassette_start" not in context:
+            return
+        latency_ms = (time.perf_counter() - context["cassette_start"]) * 1000
+        response = dict(parsed)
+        response_bytes = 0
+        for member in STREAMING_MEMBERS:
+            if isinstance(parsed.get(member), StreamingBody):
+                # Read the streaming body, and give the caller a fresh one
+                content = parsed[member].read()
+                parsed[member] = StreamingBody(io.BytesIO(content), len(content))
+                response[member] = content
+                response_bytes += len(content)
+        interaction = {
+            "operation": model.name,
+            "key": context["cassette_key"],
+            "status_code": getattr(http_response, "status_code", 200),
+            "latency_ms": round(latency_ms, 3),
+            "response_bytes": response_bytes,
+            "response": encode(response),
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(interaction) + "\n")
+
+
+def attach_recorder(client: Any) -> Any:
+    """
+    Record or replay the calls of a boto3 client, depending on the
+    environmental variable 'AWS_CASSETTE_MODE' ("off" by default).
+
+    The cassette file of the client is named after the lambda and the AWS
+    service, in the folder set by 'AWS_CASSETTE_DIR'. With
+    'AWS_CASSETTE_REPLAY_LATENCY' set to "true", the replayed calls take as
+    long as the recorded ones.
+
+    Arguments:
+    ----------
+        client (boto3.client): The client to record or replay. Clients that
+            are not botocore clients, e.g. in-memory stand-ins, are left as is.
+
+    Returns:
+    --------
+        boto3.client: The given client.
+    """
+    mode = os.environ.get(CASSETTE_MODE, "off").lower()
+    events = getattr(getattr(client, "meta", None), "events", None)
+    if mode not in ("record", "replay") or events is None:
+        return client
+
+    cassette_dir = os.environ.get(
+        CASSETTE_DIR, os.path.join(tempfile.gettempdir(), "cassettes")
+    )
+    os.makedirs(cassette_dir, exist_ok=True)
+    service = client.meta.service_model.service_name
+    lambda_name = os.environ.get("POWERTOOLS_SERVICE_NAME", "lambda")
+    cassette = Cassette(
+        os.path.join(cassette_dir, f"{lambda_name}.{service}.jsonl"),
+        mode,
+        replay_latency=os.environ.get(CASSETTE_REPLAY_LATENCY, "false").lower()
+        == "true",
+    )
+    # Runs before the other handlers, which would answer the call instead
+    events.register_first("before-call.*.*", cassette.before_call)
+    events.register("after-call.*.*", cassette.after_call)
+    return client
@@ -0,0 +1,130 @@
+import importlib
+import os
+import sys
+import threading
+import boto3
+from types import ModuleType
+from typing import Any, Dict, Optional
+
+# The stage folders and the shared folder are copied next to this module in
+# the container image of the fast path, and are the lambda folders in the
+# source tree
+STAGES_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stages")
+if not os.path.isdir(STAGES_PATH):
+    STAGES_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_PATH: str = os.path.join(STAGES_PATH, "shared")
+
+# Module holding the `lambda_handler` of every stage, in pipeline order
+STAGE_HANDLERS: Dict[str, str] = {
+    "preprocess": "preprocess",
+    "transcribe": "transcribe_batch",
+    "validate": "validate",
+    "summarize": "summarize",
+    "generate": "generate",
+}
+
+_lock = threading.RLock()
+_loaded: Dict[str, Dict[str, ModuleType]] = {}
+
+
+def _module_names(folder: str) -> set:
+    return {
+        os.path.splitext(file_name)[0]
+        for file_name in os.listdir(folder)
+        if file_name.endswith(".py")
+    }
+
+
+def _is_module_of(module: Optional[ModuleType], folder: str) -> bool:
+    module_file = getattr(module, "__file__", None) or ""
+    return os.path.abspath(module_file).startswith(folder + os.sep)
+
+
+def load_stage_module(
+    stage: str,
+    module_name: Optional[str] = None,
+    clients: Optional[Dict[str, Any]] = None,
+    environment: Optional[Dict[str, str]] = None,
+) -> ModuleType:
+    """
+    Import a module of a stage, isolated from the modules of the other stages.
+
+    Every stage is deployed on its own and uses the same module names
+    (`connections`, `utils`, `exceptions`, ...), and its own copy of the
+    modules of the shared folder. The modules of each stage and its shared
+    modules are therefore imported with the colliding modules hidden from
+    `sys.modules`, and kept out of it afterwards so that the next stage
+    imports its own copies.
+
+    Arguments:
+    ----------
+        stage (str): Name of the stage folder, e.g. "generate".
+        module_name (str): Module to import, defaults to the module of the
+            stage handler.
+        clients (dict): boto3 clients to give to the stage instead of new ones,
+            keyed by service name. Only used the first time a stage is
+            imported, when its `Connections` are created.
+        environment (dict): Environment variables to set while the stage is
+            imported, on top of the service name of the stage.
+
+    Returns:
+    --------
+        ModuleType: The imported module.
+    """
+    module_name = module_name or STAGE_HANDLERS.get(stage, stage)
+    stage_path = os.path.join(STAGES_PATH, stage)
+
+    with _lock:
+        stage_modules = _loaded.setdefault(stage, {})
+        if module_name in stage_modules:
+            return stage_modules[module_name]
+
+        # The stages use the service name of their own lambda
+        import_environment = {"POWERTOOLS_SERVICE_NAME": f"app-{stage}"}
+        import_environment.update(environment or {})
+        saved_environment = {key: os.environ.get(key) for key in import_environment}
+        os.environ.update(import_environment)
+
+        # Hide the modules of the other stages, and of this lambda, with the same
+        # names, and expose the ones of this stage
+        isolated_paths = [
+            os.path.join(STAGES_PATH, folder)
+            for folder in os.listdir(STAGES_PATH)
+            if os.path.isdir(os.path.join(STAGES_PATH, folder))
+        ]
+        isolated_names = _module_names(stage_path) | _module_names(SHARED_PATH)
+        saved_modules = {
+            name: sys.modules.pop(name)
+            for name, module in list(sys.modules.items())
+            if name in isolated_names
+            or any(_is_module_of(module, path) for path in isolated_paths)
+        }
+        sys.modules.update(stage_modules)
+        sys.path[0:0] = [stage_path, SHARED_PATH]
+
+        real_client = boto3.client
+
+        def client(*args, **kwargs):
+            service_name = kwargs.get("service_name", args[0] if args else None)
+            if clients and service_name in clients:
+                return clients[service_name]
+            return real_client(*args, **kwargs)
+
+        boto3.client = client
+        try:
+            return importlib.import_module(module_name)
+        finally:
+            boto3.client = real_client
+            sys.path.remove(stage_path)
+            sys.path.remove(SHARED_PATH)
+            for name, module in list(sys.modules.items()):
+                if _is_module_of(module, stage_path) or _is_module_of(
+                    module, SHARED_PATH
+                ):
+                    stage_modules[name] = sys.modules.pop(name)
+            sys.modules.update(saved_modules)
+            for key, value in saved_environment.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
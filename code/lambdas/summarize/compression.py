@@ -0,0 +1,285 @@
+import re
+import math
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+# Filler words and phrases that Amazon Transcribe keeps in the raw transcript
+FILLER_PATTERN = re.compile(
+    r"\b(?:um+|uh+|erm+|hmm+|you know|i mean)\b[,]?\s*",
+    re.IGNORECASE,
+)
+# Words that speakers stutter on, and that are never repeated on purpose
+STUTTER_WORDS = (
+    "i",
+    "we",
+    "you",
+    "they",
+    "he",
+    "she",
+    "it",
+    "my",
+    "our",
+    "the",
+    "a",
+    "an",
+    "and",
+    "but",
+    "so",
+    "of",
+    "to",
+    "in",
+)
+# Immediate repetitions of a stutter word, such as "the the" or "we we we".
+# Other words can be repeated on purpose, as in "had had" or "that that", so
+# they are only collapsed when a pause marks the repetition, as in "data, data"
+REPEATED_WORD_PATTERN = re.compile(
+    rf"\b({'|'.join(STUTTER_WORDS)})(?:[\s,]+\1\b)+"
+    r"|\b(\w+)(?:\s*(?:,|\.\.\.|\u2026|--?)\s*\2\b)+",
+    re.IGNORECASE,
+)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Sentences shorter than this are dropped once a longer sentence has been kept
+MIN_SENTENCE_WORDS = 3
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 50
+TEXTRANK_TOLERANCE = 1e-6
+
+
+@dataclass
+class CompressionStats:
+    """
+    Token accounting of a compression run
+
+    Attributes:
+        input_tokens (int): Estimated tokens of the answers before compression.
+        output_tokens (int): Estimated tokens of the answers after compression.
+        sentences_in (int): Number of sentences before compression.
+        sentences_out (int): Number of sentences kept.
+    """
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    sentences_in: int = 0
+    sentences_out: int = 0
+    per_answer_ratio: List[float] = field(default_factory=list)
+
+    @property
+    def ratio(self) -> float:
+        """Output tokens as a fraction of input tokens (1.0 means no compression)."""
+        if self.input_tokens == 0:
+            return 1.0
+        return self.output_tokens / self.input_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens of a text, using the ~4 characters per token heuristic.
+
+    Args:
+        text (str): The input text.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def remove_disfluencies(text: str) -> str:
+    """
+    Remove filler words and immediate word repetitions from a transcript.
+
+    Args:
+        text (str): The raw transcript text.
+
+    Returns:
+        str: The cleaned transcript text.
+    """
+    text = FILLER_PATTERN.sub("", text)
+    text = REPEATED_WORD_PATTERN.sub(lambda match: match[1] or match[2], text)
+    text = re.sub(r"\s+([,.!?])", r"\1", text)
+    text = re.sub(r",\s*([.!?])", r"\1", text)
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split a transcript into sentences on terminal punctuation.
+
+    Args:
+        text (str): The transcript text.
+
+    Returns:
+        List[str]: The non-empty sentences in original order.
+    """
+    return [s.strip() for s in SENTENCE_PATTERN.split(text) if s.strip()]
+
+
+def tfidf_matrix(sentences: List[str]) -> np.ndarray:
+    """
+    Build a L2-normalized TF-IDF matrix (sentences x vocabulary).
+
+    Args:
+        sentences (List[str]): The sentences to vectorize.
+
+    Returns:
+        np.ndarray: The TF-IDF matrix, one row per sentence.
+    """
+    tokenized = [TOKEN_PATTERN.findall(s.lower()) for s in sentences]
+    vocabulary = {}
+    rows, cols = [], []
+    for i, tokens in enumerate(tokenized):
+        for token in tokens:
+            rows.append(i)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+
+    tf = np.zeros((len(sentences), max(len(vocabulary), 1)), dtype=np.float64)
+    np.add.at(
+        tf, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0
+    )
+
+    document_frequency = np.count_nonzero(tf, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1.0
+    matrix = tf * idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def textrank_scores(matrix: np.ndarray) -> np.ndarray:
+    """
+    Score sentences with TextRank over the cosine similarity graph.
+
+    Args:
+        matrix (np.ndarray): The L2-normalized TF-IDF matrix.
+
+    Returns:
+        np.ndarray: One centrality score per sentence.
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0.0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    # Isolated sentences link uniformly so the transition matrix stays stochastic
+    transition = np.divide(
+        similarity,
+        row_sums,
+        out=np.full_like(similarity, 1.0 / n),
+        where=row_sums > 0,
+    )
+
+    scores = np.full(n, 1.0 / n)
+    for _ in range(TEXTRANK_ITERATIONS):
+        updated = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * (
+            transition.T @ scores
+        )
+        if np.abs(updated - scores).sum() < TEXTRANK_TOLERANCE:
+            scores = updated
+            break
+        scores = updated
+    return scores
+
+
+def select_sentences(
+    sentences: List[str], scores: np.ndarray, token_budget: int
+) -> List[str]:
+    """
+    Greedily keep the highest scoring sentences that fit in the token budget.
+
+    Args:
+        sentences (List[str]): The candidate sentences.
+        scores (np.ndarray): One score per sentence.
+        token_budget (int): The maximum number of tokens to keep.
+
+    Returns:
+        List[str]: The kept sentences, in their original order.
+    """
+    sentence_tokens = np.fromiter(
+        (estimate_tokens(s) for s in sentences), dtype=np.int64, count=len(sentences)
+    )
+    keep = np.zeros(len(sentences), dtype=bool)
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        if used + sentence_tokens[i] > token_budget:
+            continue
+        if len(sentences[i].split()) < MIN_SENTENCE_WORDS and keep.any():
+            continue
+        keep[i] = True
+        used += sentence_tokens[i]
+
+    # Always keep at least the most central sentence
+    if not keep.any() and len(sentences) > 0:
+        keep[int(np.argmax(scores))] = True
+    return [s for s, k in zip(sentences, keep) if k]
+
+
+def compress_text(
+    text: str, ratio: float, max_tokens: int | None = None
+) -> Tuple[str, int, int]:
+    """
+    Compress a single transcript to the most salient sentences.
+
+    Args:
+        text (str): The raw transcript text.
+        ratio (float): Fraction of the cleaned transcript tokens to keep, between 0 and 1.
+        max_tokens (int, optional): Hard cap of tokens to keep for this transcript.
+
+    Returns:
+        Tuple[str, int, int]: The compressed text, the number of input sentences and kept sentences.
+    """
+    cleaned = remove_disfluencies(text)
+    sentences = split_sentences(cleaned)
+    if len(sentences) <= 1:
+        return cleaned, len(sentences), len(sentences)
+
+    budget = math.ceil(estimate_tokens(cleaned) * ratio)
+    if max_tokens is not None:
+        budget = min(budget, max_tokens)
+
+    scores = textrank_scores(tfidf_matrix(sentences))
+    kept = select_sentences(sentences, scores, budget)
+    return " ".join(kept), len(sentences), len(kept)
+
+
+def compress_answers(
+    list_of_answers: List[str], ratio: float, max_tokens: int | None = None
+) -> Tuple[List[str], CompressionStats]:
+    """
+    Compress every answer of a question before it is sent to the LLM.
+
+    Args:
+        list_of_answers (List[str]): The raw transcripts of the answers.
+        ratio (float): Fraction of tokens to keep per answer, between 0 and 1.
+        max_tokens (int, optional): Total token budget, split evenly across the answers.
+
+    Returns:
+        Tuple[List[str], CompressionStats]: The compressed answers and the token accounting.
+    """
+    if not 0 < ratio <= 1:
+        raise ValueError(f"Compression ratio must be in (0, 1], got {ratio}")
+
+    per_answer_budget = None
+    if max_tokens is not None and list_of_answers:
+        per_answer_budget = max(1, max_tokens // len(list_of_answers))
+
+    stats = CompressionStats()
+    compressed = []
+    for answer in list_of_answers:
+        text, sentences_in, sentences_out = compress_text(
+            answer, ratio, per_answer_budget
+        )
+        input_tokens, output_tokens = estimate_tokens(answer), estimate_tokens(text)
+        stats.input_tokens += input_tokens
+        stats.output_tokens += output_tokens
+        stats.sentences_in += sentences_in
+        stats.sentences_out += sentences_out
+        stats.per_answer_ratio.append(
+            output_tokens / input_tokens if input_tokens else 1.0
+        )
+        compressed.append(text)
+
+    return compressed, stats
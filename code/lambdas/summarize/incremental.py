@@ -0,0 +1,164 @@
+import json
+import hashlib
+from enum import Enum
+from dataclasses import dataclass, field
+from typing import Dict, List
+from connections import logger
+from prompt_templates import SUMMARIZATION_PROMPT_VERSION
+from utils import read_from_s3
+
+SUMMARY_FILENAME = "summary/data.txt"
+MANIFEST_FILENAME = "summary/manifest.json"
+
+
+class UpdateMode(str, Enum):
+    """How the summary of a question is brought up to date"""
+
+    UNCHANGED = "unchanged"
+    INCREMENTAL = "incremental"
+    FULL = "full"
+
+
+@dataclass
+class SummaryUpdatePlan:
+    """
+    A class for representing the update to apply to the summary of a question
+
+    Attributes:
+    -----------
+    mode: UpdateMode
+        Whether the existing summary is kept, updated with the delta or rebuilt.
+    reason: str
+        Why this mode was chosen.
+    existing_summary: str
+        The existing summary, for the UNCHANGED and INCREMENTAL modes.
+    added_answers: List[str]
+        The answers that are not covered by the existing summary.
+    removed_answers: List[str]
+        The answers covered by the existing summary that have been removed.
+    """
+
+    mode: UpdateMode
+    reason: str
+    existing_summary: str = ""
+    added_answers: List[str] = field(default_factory=list)
+    removed_answers: List[str] = field(default_factory=list)
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash the content of an answer.
+
+    Args:
+        text (str): The answer text.
+
+    Returns:
+        str: The SHA-256 hex digest of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def build_manifest(
+    list_of_answers: List[str],
+    list_of_answer_uris: List[str],
+    model_name: str,
+    settings: Dict,
+) -> Dict:
+    """
+    Build the manifest of the answers that went into a summary.
+
+    Args:
+        list_of_answers (List[str]): The answers that are summarized.
+        list_of_answer_uris (List[str]): The S3 URIs of the answers, in the same order.
+        model_name (str): The name of the LLM writing the summary.
+        settings (Dict): The settings changing the answers sent to the LLM, such as
+            the near-duplicate detection and the transcript compression.
+
+    Returns:
+        Dict: The manifest, with the S3 URI of every answer keyed by its content hash.
+    """
+    return {
+        "promptVersion": SUMMARIZATION_PROMPT_VERSION,
+        "modelName": model_name,
+        "settings": settings,
+        "answers": {
+            content_hash(answer): uri
+            for answer, uri in zip(list_of_answers, list_of_answer_uris)
+        },
+    }
+
+
+def plan_summary_update(
+    answerSummaryPath: str,
+    list_of_answers: List[str],
+    manifest: Dict,
+    max_delta_ratio: float,
+) -> SummaryUpdatePlan:
+    """
+    Compare the current answers with the manifest of the existing summary.
+
+    Args:
+        answerSummaryPath (str): The S3 path of the question folder, starting with 's3://'.
+        list_of_answers (List[str]): The current answers of the question.
+        manifest (Dict): The manifest of the current answers, from `build_manifest`.
+        max_delta_ratio (float): Largest share of added and removed answers, relative to
+            the current answers, that is applied incrementally. Larger deltas are rebuilt.
+
+    Returns:
+        SummaryUpdatePlan: The update to apply to the summary.
+    """
+    previous_manifest = read_from_s3(f"{answerSummaryPath}{MANIFEST_FILENAME}")
+    if previous_manifest is None:
+        return SummaryUpdatePlan(UpdateMode.FULL, "no manifest of a previous summary")
+
+    previous_manifest = json.loads(previous_manifest)
+    if previous_manifest.get("promptVersion") != manifest["promptVersion"] or (
+        previous_manifest.get("modelName") != manifest["modelName"]
+    ):
+        return SummaryUpdatePlan(UpdateMode.FULL, "prompt or model has changed")
+    if previous_manifest.get("settings") != manifest["settings"]:
+        return SummaryUpdatePlan(UpdateMode.FULL, "summary settings have changed")
+
+    existing_summary = read_from_s3(f"{answerSummaryPath}{SUMMARY_FILENAME}")
+    if not existing_summary:
+        return SummaryUpdatePlan(UpdateMode.FULL, "no previous summary")
+
+    previous_answers = previous_manifest.get("answers", {})
+    added_answers = [
+        answer
+        for answer in list_of_answers
+        if content_hash(answer) not in previous_answers
+    ]
+    removed_hashes = [h for h in previous_answers if h not in manifest["answers"]]
+    if not added_answers and not removed_hashes:
+        return SummaryUpdatePlan(
+            UpdateMode.UNCHANGED, "answers are unchanged", existing_summary
+        )
+
+    delta_ratio = (len(added_answers) + len(removed_hashes)) / len(manifest["answers"])
+    if delta_ratio > max_delta_ratio:
+        return SummaryUpdatePlan(
+            UpdateMode.FULL, f"delta ratio {delta_ratio:.2f} > {max_delta_ratio}"
+        )
+
+    # The removed answers are read back from S3 so that the LLM knows what to drop
+    removed_answers = []
+    for removed_hash in removed_hashes:
+        removed_answer = read_from_s3(previous_answers[removed_hash])
+        if removed_answer is None or content_hash(removed_answer) != removed_hash:
+            return SummaryUpdatePlan(
+                UpdateMode.FULL, "a removed answer is no longer available"
+            )
+        removed_answers.append(removed_answer)
+
+    logger.info(
+        f"{len(added_answers)} answers added and {len(removed_hashes)} removed "
+        "since the previous summary"
+    )
+    return SummaryUpdatePlan(
+        UpdateMode.INCREMENTAL,
+        f"delta ratio {delta_ratio:.2f} <= {max_delta_ratio}",
+        existing_summary,
+        added_answers=added_answers,
+        removed_answers=removed_answers,
+    )
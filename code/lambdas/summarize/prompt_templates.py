@@ -12,6 +12,8 @@ SUMMARIZATION_TEMPLATE_PARAGRAPH = """
     {input_texts}
     </input_texts>
 
+    An input text may start with a "[Shared by N speakers]" marker, meaning that N speakers gave a near-identical answer. Give the points shared by more speakers more weight in the final answer.
+
     First, review the given list of input text as a whole.
     Then, summarize all of the input texts into one or multiple paragraphs based on its logic.
     Last, double check if there are any key information missed before outputting the final answer.
@@ -32,3 +34,48 @@ SUMMARIZATION_TEMPLATE_PARAGRAPH = """
 
     REMEMBER: Never use phrases like 'input texts' or 'To answer the question' or 'in summary' in the final answer!
     """
+
+
+# Bump when the summarization prompts change, so that stored summaries are rebuilt
+SUMMARIZATION_PROMPT_VERSION = "1"
+
+
+SUMMARY_UPDATE_TEMPLATE = """
+    Here is the existing summary, written from earlier input texts:
+
+    <existing_summary>
+    {existing_summary}
+    </existing_summary>
+
+    Here is the list of new input texts:
+
+    <new_input_texts>
+    {added_texts}
+    </new_input_texts>
+
+    Here is the list of input texts that have been withdrawn:
+
+    <withdrawn_input_texts>
+    {removed_texts}
+    </withdrawn_input_texts>
+
+    First, review the existing summary as a whole.
+    Then, update the existing summary so that it also covers the key information of the new input texts, and no longer relies on information that only comes from the withdrawn input texts.
+    Keep the parts of the existing summary that are not affected unchanged, including their wording and structure.
+    Last, double check if there are any key information missed before outputting the final answer.
+
+    Here is the input question:
+
+    <input_question>
+    {input_question}
+    </input_question>
+
+    Output guidance:
+        - Never set up any preambles.
+        - The final answer should be in the style of professional technical report.
+        - The final answer should be in Markdown format, and emphasize the key phrases or identities using bold font.
+        - Start your response with an overview paragraph highlighting the key points, avoiding the phrase 'In summary'. Follow this with detailed explanations, ensuring the final summary is at the beginning and conclusions are woven into the narrative without using bullet points to start.
+        - Please enclose the final answer in XML tags, with root tag as <Output></Output>. Use <Summary></Summary> to indicate the final answer.
+
+    REMEMBER: Never use phrases like 'input texts', 'existing summary' or 'To answer the question' or 'in summary' in the final answer!
+    """
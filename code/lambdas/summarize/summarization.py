@@ -4,14 +4,85 @@ from langchain_core.prompts import (
     HumanMessagePromptTemplate,
     SystemMessagePromptTemplate,
 )
-from prompt_templates import SYSTEM_PROMPT, SUMMARIZATION_TEMPLATE_PARAGRAPH
+from prompt_templates import (
+    SYSTEM_PROMPT,
+    SUMMARIZATION_PROMPT_VERSION,
+    SUMMARIZATION_TEMPLATE_PARAGRAPH,
+    SUMMARY_UPDATE_TEMPLATE,
+)
 from connections import Connections
-from utils import parse_summary
-from typing import List
+from chain_registry import CompiledChain, chain_registry
+from utils import parse_summary, apply_answer_weights
+from typing import List, Optional, Tuple
+from langchain_core.runnables import Runnable
+
+# The maximum number of tokens of a summary
+MAX_TOKENS = 2048
+
+# The templates of the chains, by chain name
+TEMPLATES = {
+    "summarization": SUMMARIZATION_TEMPLATE_PARAGRAPH,
+    "summary_update": SUMMARY_UPDATE_TEMPLATE,
+}
+
+
+def build_chain(
+    template: str, model_name: str, max_tokens: int = MAX_TOKENS
+) -> Tuple[Runnable, XMLOutputParser]:
+    """
+    Builds the chain of a summarization prompt: prompt templating, invoking a LLM
+    and parsing the output.
+
+    Inputs:
+        - template (str): The human message template of the prompt.
+        - model_name (str): The name of the language model.
+        - max_tokens (int, optional): The maximum number of tokens of the output.
+    Returns:
+        - Tuple[Runnable, XMLOutputParser]: The chain, and its output parser.
+    """
+    # Initialize output parser object, specifying the tags (to be consistent with the prompt)
+    parser = XMLOutputParser(tags=["Output", "Summary"])
+    # Prompt from a template & parser
+    system_message_template = SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT)
+    human_message_template = HumanMessagePromptTemplate.from_template(template)
+    prompt = ChatPromptTemplate.from_messages(
+        [system_message_template, human_message_template]
+    )
+    # LLM object
+    llm = Connections.get_bedrock_llm(
+        model_name=model_name, max_tokens=max_tokens, cache=False
+    )
+
+    # Chain the elements together
+    return prompt | llm | parser, parser
+
+
+def get_chain(chain_name: str, model_name: str) -> CompiledChain:
+    """
+    Returns the chain of a summarization prompt from the registry of the process,
+    building it on the first call only.
+
+    Inputs:
+        - chain_name (str): "summarization" or "summary_update".
+        - model_name (str): The name of the language model.
+    Returns:
+        - CompiledChain: The chain, its output parser and its format instructions.
+    """
+
+    def build() -> CompiledChain:
+        chain, parser = build_chain(TEMPLATES[chain_name], model_name)
+        return CompiledChain(chain, parser, parser.get_format_instructions())
+
+    return chain_registry.get(
+        (chain_name, model_name, SUMMARIZATION_PROMPT_VERSION, MAX_TOKENS), build
+    )
 
 
 def summarization(
-    question: str, list_of_answers: List[str], model_name: str = "Claude3"
+    question: str,
+    list_of_answers: List[str],
+    model_name: str = "Claude3",
+    weights: Optional[List[int]] = None,
 ) -> str:
     """
     Summarizes a list of answers for a given question using a specified LLM from Bedrock.
@@ -23,38 +94,90 @@ def summarization(
         - question (str): The question for which the answers need to be summarized.
         - list_of_answers (List[str]): A list of answers provided for the question.
         - model_name (str, optional): The name of the language model to be used for summarization. Defaults to "Claude3".
+        - weights (List[int], optional): The number of speakers who gave each answer, for answers that stand for a cluster of near-duplicates.
     Returns:
         - ans (str): The summarized answer as returned by the language model's output stroutputparser.
 
     """
 
-    # Initialize output parser object, specifying the tags (to be consistent with the prompt)
-    parser = XMLOutputParser(tags=["Output", "Summary"])
-    # Prompt from a template & parser
-    system_message_template = SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT)
-    human_message_template = HumanMessagePromptTemplate.from_template(
-        SUMMARIZATION_TEMPLATE_PARAGRAPH
-    )
-    prompt = ChatPromptTemplate.from_messages(
-        [system_message_template, human_message_template]
-    )
-    # LLM object
-    llm = Connections.get_bedrock_llm(
-        model_name=model_name, max_tokens=2048, cache=False
-    )
+    compiled = get_chain("summarization", model_name)
 
-    # Chain the elements together
-    chain = prompt | llm | parser
+    # Mark the answers that were given by several speakers
+    if weights is not None:
+        list_of_answers = apply_answer_weights(list_of_answers, weights)
 
     # Define input dict
     input_dict = {
         "input_texts": list_of_answers,
-        "format_instructions": parser.get_format_instructions(),
+        "format_instructions": compiled.format_instructions,
         "input_question": question,
     }
 
     # Invoke the chain
-    ans = chain.invoke(input_dict)
+    ans = compiled.chain.invoke(input_dict)
+
+    ans = parse_summary(ans)
+    return ans
+
+
+def summary_update(
+    question: str,
+    existing_summary: str,
+    added_answers: List[str],
+    removed_answers: List[str],
+    model_name: str = "Claude3",
+) -> str:
+    """
+    Updates an existing summary with the answers added or removed since it was written.
+
+    Only the existing summary and the changed answers are sent to the LLM, so the cost
+    of the update scales with the delta rather than with all the answers of the question.
+
+    Inputs:
+        - question (str): The question for which the answers are summarized.
+        - existing_summary (str): The summary written from the previous answers.
+        - added_answers (List[str]): The answers added since the summary was written.
+        - removed_answers (List[str]): The answers removed since the summary was written.
+        - model_name (str, optional): The name of the language model to be used. Defaults to "Claude3".
+    Returns:
+        - ans (str): The updated summary.
+    """
+    compiled = get_chain("summary_update", model_name)
+
+    input_dict = {
+        "existing_summary": existing_summary,
+        "added_texts": added_answers,
+        "removed_texts": removed_answers,
+        "input_question": question,
+    }
+    ans = compiled.chain.invoke(input_dict)
 
     ans = parse_summary(ans)
     return ans
+
+
+def prime_summarization(model_name: str = "Claude3") -> None:
+    """
+    Builds the summarization and summary update chains into the registry of the
+    process, formats their prompts and parses an output without invoking the
+    model, so that the imports, the parsers and the botocore model of Amazon
+    Bedrock are loaded during the AWS Lambda initialization rather than by the
+    first invocation. No request is sent, so the primed state is safe to snapshot.
+
+    Inputs:
+        - model_name (str, optional): The name of the language model. Defaults to "Claude3".
+    """
+    compiled = get_chain("summarization", model_name)
+    compiled.chain.first.format_messages(
+        input_texts=apply_answer_weights(["Priming"], [2]),
+        format_instructions=compiled.format_instructions,
+        input_question="Priming",
+    )
+    get_chain("summary_update", model_name).chain.first.format_messages(
+        existing_summary="Priming",
+        added_texts=["Priming"],
+        removed_texts=[],
+        input_question="Priming",
+    )
+    parse_summary(compiled.parser.parse("<Output><Summary>Priming</Summary></Output>"))
+    Connections.prime_client(Connections.bedrock_client, "InvokeModel")
@@ -1,13 +1,36 @@
+import json
 import time
-from typing import List, Literal
-from dataclasses import dataclass
-from summarization import summarization
+from typing import Dict, List, Literal, Optional, Tuple
+from dataclasses import dataclass, field
+from summarization import prime_summarization, summarization, summary_update
+from compression import compress_answers
+from dedup import cluster_near_duplicates
 from connections import Connections, tracer, logger, metrics
+from instrumentation import instrument_handler, phase
+from idempotency import idempotent_handler
+from pipeline_state import record_stage_state
 from utils import generate_dataframe_from_files, extract_base_s3_path, upload_to_s3
+from incremental import (
+    SUMMARY_FILENAME,
+    MANIFEST_FILENAME,
+    SummaryUpdatePlan,
+    UpdateMode,
+    build_manifest,
+    plan_summary_update,
+)
 from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools.utilities.parser import event_parser, BaseModel
 
+MODEL_NAME = "Claude3"
+
+# Pay the chain construction and the lazy imports during the lambda initialization
+if Connections.chain_priming_enabled:
+    try:
+        prime_summarization(model_name=MODEL_NAME)
+    except Exception as error:
+        logger.warning(f"Unable to prime the summarization chains: {error}")
+
 
 @dataclass
 class Response:
@@ -15,6 +38,9 @@ class Response:
     documentName: str
     summarizedAnswerS3Uri: str
     serviceName: str = Connections.service_name
+    answerClusters: List[List[str]] = field(default_factory=list)
+    costLedger: Dict[str, dict] = field(default_factory=dict)
+    correlationId: str = ""
 
 
 class Request(BaseModel):
@@ -23,13 +49,25 @@ class Request(BaseModel):
     validAnswersS3Uris: List[str]
     continueSummarization: bool
     invalidAnswersS3Uris: List[str]
+    answerClusters: Optional[List[List[str]]] = None
     serviceName: str = Connections.service_name
+    costLedger: Dict[str, dict] = {}
+    correlationId: Optional[str] = None
 
 
 @logger.inject_lambda_context(log_event=True, clear_state=True)
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
+@idempotent_handler(
+    "summarize",
+    "documentName",
+    "validAnswersS3Uris",
+    "invalidAnswersS3Uris",
+    s3_client=Connections.s3_client,
+)
+@record_stage_state("summarize", Connections.s3_client)
 @event_parser(model=Request)
+@instrument_handler("summarize")
 def lambda_handler(event: Request, context: LambdaContext) -> str:
     metrics.add_metric(
         name="TotalSummarizationInvocation", unit=MetricUnit.Count, value=1
@@ -40,7 +78,8 @@ def lambda_handler(event: Request, context: LambdaContext) -> str:
     validAnswersS3Uris = event.validAnswersS3Uris
 
     # Retrieve all answers for the given question id, if decision is PASS or decision_override is true
-    df_input = generate_dataframe_from_files(validAnswersS3Uris)
+    with phase("summarize", event.documentName, name="load"):
+        df_input = generate_dataframe_from_files(validAnswersS3Uris)
     logger.debug(f"Input Dataframe size for summarization: {len(df_input)}")
 
     # Summarizing answers
@@ -52,11 +91,67 @@ def lambda_handler(event: Request, context: LambdaContext) -> str:
         logger.info(f"Question: {question}")
         logger.info(f"List of answers: {list_of_answers}")
 
+        list_of_answer_uris = df_input.list_of_answer_text_uris.tolist()
+        answerSummaryPath = extract_base_s3_path(validAnswersS3Uris[0])
+        logger.info(f"answerSummaryPath: {answerSummaryPath}")
+
+        # Compare the answers with the ones that went into the existing summary
+        manifest = build_manifest(
+            list_of_answers, list_of_answer_uris, MODEL_NAME, get_summary_settings()
+        )
+        plan = SummaryUpdatePlan(UpdateMode.FULL, "incremental summary is disabled")
+        if Connections.incremental_summary_enabled:
+            plan = plan_summary_update(
+                answerSummaryPath,
+                list_of_answers,
+                manifest,
+                Connections.incremental_max_delta_ratio,
+            )
+        logger.info(f"Summary update mode: {plan.mode.value} ({plan.reason})")
+        metrics.add_metric(
+            name=f"Summary{plan.mode.value.capitalize()}Update",
+            unit=MetricUnit.Count,
+            value=1,
+        )
+
+        # The incremental update only sends the delta to the LLM
+        answer_weights = None
+        answer_clusters = []
+        if Connections.dedup_enabled and plan.mode != UpdateMode.INCREMENTAL:
+            list_of_answers, answer_weights, answer_clusters = collapse_duplicates(
+                list_of_answers, list_of_answer_uris, event.answerClusters
+            )
+
         # Start timer
         start_time = time.time()
 
-        # Calling LLM to summarize the answers for the given question
-        summary_text = summarization(question, list_of_answers, model_name="Claude3")
+        with phase("summarize", event.documentName, name="llm"):
+            if plan.mode == UpdateMode.UNCHANGED:
+                summary_text = plan.existing_summary
+            elif plan.mode == UpdateMode.INCREMENTAL:
+                # Calling LLM to update the existing summary with the delta only
+                added_answers = plan.added_answers
+                if Connections.compression_enabled:
+                    added_answers = compress_transcripts(added_answers)
+                summary_text = summary_update(
+                    question,
+                    plan.existing_summary,
+                    added_answers,
+                    plan.removed_answers,
+                    model_name=MODEL_NAME,
+                )
+            else:
+                if Connections.compression_enabled:
+                    list_of_answers = compress_transcripts(list_of_answers)
+
+                # Calling LLM to summarize the answers for the given question
+                summary_text = summarization(
+                    question,
+                    list_of_answers,
+                    model_name=MODEL_NAME,
+                    weights=answer_weights,
+                )
+
         logger.debug(f"Summarized answer: \n {summary_text}")
 
         # End timer
@@ -66,24 +161,34 @@ def lambda_handler(event: Request, context: LambdaContext) -> str:
         response_time = end_time - start_time
 
         # Add metrics
-        metrics.add_metric(
-            name="SummarizationLLMResponseTime",
-            unit=MetricUnit.Seconds,
-            value=response_time,
-        )
+        if plan.mode != UpdateMode.UNCHANGED:
+            metrics.add_metric(
+                name="SummarizationLLMResponseTime",
+                unit=MetricUnit.Seconds,
+                value=response_time,
+            )
 
-        # # upload the summary into the s3 folder
-        # df_summary = pd.DataFrame(
-        #     data=[[question, summary_text]], columns=["question", "summary"]
-        # )
-        answerSummaryPath = extract_base_s3_path(validAnswersS3Uris[0])
-        logger.info(f"answerSummaryPath: {answerSummaryPath}")
-        updated, summarizedAnswerS3Uri = upload_to_s3(summary_text, answerSummaryPath)
+        if plan.mode == UpdateMode.UNCHANGED:
+            updated = True
+            summarizedAnswerS3Uri = f"{answerSummaryPath}{SUMMARY_FILENAME}"
+        else:
+            # upload the summary, and the manifest of its answers, into the s3 folder
+            with phase("summarize", event.documentName, name="upload"):
+                updated, summarizedAnswerS3Uri = upload_to_s3(
+                    summary_text, answerSummaryPath
+                )
+                if updated:
+                    upload_to_s3(
+                        json.dumps(manifest),
+                        answerSummaryPath,
+                        filename=MANIFEST_FILENAME,
+                    )
 
         statusCode: Literal[200] | Literal[400] = 200 if updated else 400
         summarizedAnswerS3Uri: str = summarizedAnswerS3Uri
 
     else:
+        answer_clusters = []
         logger.info("No valid answers retrieved for question")
         statusCode = 400
         summarizedAnswerS3Uri = summarizedAnswerS3Uri
@@ -92,8 +197,141 @@ def lambda_handler(event: Request, context: LambdaContext) -> str:
         statusCode=statusCode,
         documentName=event.documentName,
         summarizedAnswerS3Uri=summarizedAnswerS3Uri,
+        answerClusters=answer_clusters,
     ).__dict__
 
     logger.info(f"Lambda Output: {response}")
 
     return response
+
+
+def get_summary_settings() -> Dict:
+    """
+    Get the settings changing the answers sent to the LLM, so that a summary
+    built with other settings is rebuilt.
+
+    Returns:
+        Dict: The near-duplicate detection and transcript compression settings,
+            with the parameters of the enabled ones only.
+    """
+    settings = {
+        "dedupEnabled": Connections.dedup_enabled,
+        "compressionEnabled": Connections.compression_enabled,
+    }
+    if Connections.dedup_enabled:
+        settings["dedupThreshold"] = Connections.dedup_threshold
+    if Connections.compression_enabled:
+        settings["compressionRatio"] = Connections.compression_ratio
+        settings["compressionMaxTokens"] = Connections.compression_max_tokens
+    return settings
+
+
+@tracer.capture_method
+def compress_transcripts(list_of_answers: List[str]) -> List[str]:
+    """
+    Compress the transcripts to their most salient sentences and report the savings.
+
+    Args:
+        list_of_answers (List[str]): The raw transcripts of the answers.
+
+    Returns:
+        List[str]: The compressed transcripts.
+    """
+    compressed_answers, stats = compress_answers(
+        list_of_answers,
+        ratio=Connections.compression_ratio,
+        max_tokens=Connections.compression_max_tokens,
+    )
+    logger.info(
+        f"Compressed transcripts from {stats.input_tokens} to {stats.output_tokens} "
+        f"estimated tokens (ratio {stats.ratio:.2f}, "
+        f"{stats.sentences_out}/{stats.sentences_in} sentences kept)"
+    )
+    metrics.add_metric(
+        name="CompressionInputTokens", unit=MetricUnit.Count, value=stats.input_tokens
+    )
+    metrics.add_metric(
+        name="CompressionOutputTokens",
+        unit=MetricUnit.Count,
+        value=stats.output_tokens,
+    )
+    metrics.add_metric(
+        name="CompressionRatio", unit=MetricUnit.Percent, value=stats.ratio * 100
+    )
+    return compressed_answers
+
+
+def clusters_from_uris(
+    list_of_answer_uris: List[str], answer_clusters: List[List[str]]
+) -> List[List[int]]:
+    """
+    Map the clusters of S3 URIs found by the validate lambda to the positions of the answers.
+
+    Args:
+        list_of_answer_uris (List[str]): The S3 URIs of the answers.
+        answer_clusters (List[List[str]]): The S3 URIs of the clusters with more than one
+            answer, the representative first.
+
+    Returns:
+        List[List[int]]: The positions of the answers of every cluster, the representative
+            first, in the order of their first answer. The answers of no cluster are
+            clusters of their own.
+    """
+    positions = {uri: i for i, uri in enumerate(list_of_answer_uris)}
+    cluster_of = {}
+    for cluster in answer_clusters:
+        members = [positions[uri] for uri in cluster if uri in positions]
+        for member in members:
+            cluster_of[member] = members
+    clusters = []
+    seen = set()
+    for i in range(len(list_of_answer_uris)):
+        if i not in seen:
+            cluster = cluster_of.get(i, [i])
+            seen.update(cluster)
+            clusters.append(cluster)
+    return clusters
+
+
+@tracer.capture_method
+def collapse_duplicates(
+    list_of_answers: List[str],
+    list_of_answer_uris: List[str],
+    answer_clusters: Optional[List[List[str]]] = None,
+) -> Tuple[List[str], List[int], List[List[str]]]:
+    """
+    Keep one representative per cluster of near-duplicate answers.
+
+    Args:
+        list_of_answers (List[str]): The answers for the question.
+        list_of_answer_uris (List[str]): The S3 URIs of the answers, in the same order.
+        answer_clusters (List[List[str]], optional): The S3 URIs of the clusters found by
+            the validate lambda, the representative first. The answers are clustered
+            again when not given.
+
+    Returns:
+        Tuple[List[str], List[int], List[List[str]]]: The representative answers, the size of
+            their cluster, and the S3 URIs of the clusters with more than one answer.
+    """
+    if answer_clusters is None:
+        clusters = cluster_near_duplicates(
+            list_of_answers, threshold=Connections.dedup_threshold
+        )
+    else:
+        clusters = clusters_from_uris(list_of_answer_uris, answer_clusters)
+    duplicates = len(list_of_answers) - len(clusters)
+    logger.info(
+        f"Found {duplicates} near-duplicate answers in {len(clusters)} clusters"
+    )
+    metrics.add_metric(
+        name="NearDuplicateAnswers", unit=MetricUnit.Count, value=duplicates
+    )
+    return (
+        [list_of_answers[cluster[0]] for cluster in clusters],
+        [len(cluster) for cluster in clusters],
+        [
+            [list_of_answer_uris[i] for i in cluster]
+            for cluster in clusters
+            if len(cluster) > 1
+        ],
+    )
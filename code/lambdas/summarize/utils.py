@@ -2,7 +2,7 @@ from connections import Connections, logger
 from botocore.exceptions import BotoCoreError, ClientError
 from io import StringIO
 import pandas as pd
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import os
 
 
@@ -96,6 +96,23 @@ def format_inputs(input_texts):
     return " ".join(input_text_list)
 
 
+def apply_answer_weights(input_texts: List[str], weights: List[int]) -> List[str]:
+    """
+    Prefix the input texts that stand for several near-identical answers with their weight
+
+    Args:
+        input_texts (List[str]): The representative input texts.
+        weights (List[int]): The number of speakers who gave each input text.
+
+    Returns:
+        List[str]: The input texts, prefixed with "[Shared by N speakers]" when N > 1.
+    """
+    return [
+        f"[Shared by {weight} speakers] {text}" if weight > 1 else text
+        for text, weight in zip(input_texts, weights)
+    ]
+
+
 def parse_summary(summary):
     """
     Parse the output summary from XMLParser
@@ -180,3 +197,22 @@ def upload_to_s3(
             f"Failed to upload data to s3://{bucket_name}/{file_path}, error: {e}"
         )
         return False, f"s3://{bucket_name}/{file_path}"
+
+
+def read_from_s3(s3_uri: str) -> Optional[str]:
+    """
+    Reads a text object from an S3 bucket.
+
+    Args:
+        s3_uri (str): The S3 URI of the object, starting with 's3://'.
+
+    Returns:
+        Optional[str]: The content of the object, or None if it cannot be read.
+    """
+    bucket_name, key = s3_uri[5:].split("/", 1)
+    try:
+        response = Connections.s3_client.get_object(Bucket=bucket_name, Key=key)
+        return response["Body"].read().decode("utf-8")
+    except ClientError as e:
+        logger.info(f"Unable to read {s3_uri}: {e}")
+        return None
@@ -1,5 +1,7 @@
 import os
 import boto3
+from recorder import attach_recorder
+from instrumentation import instrument_client
 
 
 class Connections:
@@ -12,5 +14,9 @@ class Connections:
     region_name = os.environ["AWS_REGION"]
     s3_bucket_transcribe = os.environ["DATA_SOURCE_BUCKET_NAME"]
 
-    transcribe_client = boto3.client("transcribe", region_name=region_name)
-    s3_client = boto3.client("s3", region_name=region_name)
+    transcribe_client = instrument_client(
+        attach_recorder(boto3.client("transcribe", region_name=region_name))
+    )
+    s3_client = instrument_client(
+        attach_recorder(boto3.client("s3", region_name=region_name))
+    )
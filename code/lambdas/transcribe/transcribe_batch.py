@@ -2,7 +2,16 @@ import json
 import time
 from datetime import datetime
 from connections import Connections
-from dataclasses import dataclass
+from instrumentation import (
+    add_transcribe_audio_seconds,
+    instrument_handler,
+    phase,
+    transcript_audio_seconds,
+)
+from idempotency import idempotent_handler
+from pipeline_state import record_stage_state
+from dataclasses import dataclass, field
+from typing import Optional
 from aws_lambda_powertools import Logger, Tracer, Metrics
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools.utilities.parser import event_parser, BaseModel
@@ -35,12 +44,18 @@ class Response:
         List of S3 URIs of answer texts generated by Amazon Transcribe
     serviceName: str
         The name of the AWS Lambda as configured through AWS powertools
+    costLedger: dict
+        The billed usage of every stage that processed the document
+    correlationId: str
+        The identifier correlating the traces and logs of every stage
     """
 
     statusCode: int
     documentName: str
     transcribedFilesS3Uris: list
     serviceName: str = Connections.service_name
+    costLedger: dict = field(default_factory=dict)
+    correlationId: str = ""
 
 
 class Request(BaseModel):
@@ -58,12 +73,18 @@ class Request(BaseModel):
         List of S3 URIs of audio files to transcribe
     serviceName: str
         The name of the AWS Lambda as configured through AWS powertools
+    costLedger: dict
+        The billed usage of every previous stage, by stage
+    correlationId: str
+        The identifier correlating the traces and logs of every stage
     """
 
     statusCode: int
     documentName: str
     audioFilesS3Uris: list
     serviceName: str
+    costLedger: dict = {}
+    correlationId: Optional[str] = None
 
 
 @tracer.capture_method
@@ -182,13 +203,20 @@ def process_transcription(
                 job_bucket = job_result_uri.key.split("/")[0]
                 job_key = ("/").join(job_result_uri.key.split("/")[1:])
 
-                # Get contents from Transcribe-managed S3.
-                job_result = s3.get_object(Bucket=job_bucket, Key=job_key)
-
-                # From the transcription object, get only the transcript text
-                transcript = json.loads(job_result["Body"].read().decode("utf-8"))[
-                    "results"
-                ]["transcripts"][0]["transcript"]
+                with phase("transcribe", event.documentName, name="parse"):
+                    # Get contents from Transcribe-managed S3.
+                    job_result = s3.get_object(Bucket=job_bucket, Key=job_key)
+
+                    # From the transcription object, get only the transcript text
+                    transcribe_output = json.loads(
+                        job_result["Body"].read().decode("utf-8")
+                    )
+                    transcript = transcribe_output["results"]["transcripts"][0][
+                        "transcript"
+                    ]
+                add_transcribe_audio_seconds(
+                    transcript_audio_seconds(transcribe_output)
+                )
 
                 # Upload transcript text to user's S3
                 output_uri = S3Url(
@@ -228,7 +256,15 @@ def process_transcription(
 @logger.inject_lambda_context(log_event=True, clear_state=True)
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
+@idempotent_handler(
+    "transcribe",
+    "documentName",
+    "audioFilesS3Uris",
+    s3_client=Connections.s3_client,
+)
+@record_stage_state("transcribe", Connections.s3_client)
 @event_parser(model=Request)
+@instrument_handler("transcribe", namespace=Connections.namespace)
 def lambda_handler(event: Request, context: LambdaContext):
     """
     Calls transcribe to extract text from audio.
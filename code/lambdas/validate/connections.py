@@ -6,6 +6,8 @@ import logging
 from langchain_community.chat_models import BedrockChat
 from aws_lambda_powertools import Logger, Tracer, Metrics
 from botocore.client import Config
+from recorder import attach_recorder
+from instrumentation import instrument_client
 
 tracer = Tracer()
 logger = Logger(log_uncaught_exceptions=True, serialize_stacktrace=True)
@@ -22,14 +24,41 @@ class Connections:
     region_name = os.environ["AWS_REGION"]
     s3_bucket_transcribe = os.environ["DATA_SOURCE_BUCKET_NAME"]
 
-    transcribe_client = boto3.client("transcribe", region_name=region_name)
-    s3_client = boto3.client("s3", region_name=region_name)
+    # Near-duplicate answers are collapsed to one representative before prompting
+    dedup_enabled = (
+        os.environ.get("NEAR_DUPLICATE_DETECTION_ENABLED", "true").lower() == "true"
+    )
+    dedup_threshold = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+    # The chains are built during the lambda initialization
+    chain_priming_enabled = (
+        os.environ.get("CHAIN_PRIMING_ENABLED", "true").lower() == "true"
+    )
+
+    transcribe_client = instrument_client(
+        attach_recorder(boto3.client("transcribe", region_name=region_name))
+    )
+    s3_client = instrument_client(
+        attach_recorder(boto3.client("s3", region_name=region_name))
+    )
 
     config = Config(read_timeout=1000)
-    bedrock_client = boto3.client(
-        "bedrock-runtime", region_name=region_name, config=config
+    bedrock_client = instrument_client(
+        attach_recorder(
+            boto3.client("bedrock-runtime", region_name=region_name, config=config)
+        )
     )
 
+    @staticmethod
+    def prime_client(client, operation_name):
+        """
+        Load the botocore model of an operation, which botocore loads on the
+        first call. Stand-in clients without a botocore model are skipped.
+        """
+        meta = getattr(client, "meta", None)
+        if meta is not None and hasattr(meta, "service_model"):
+            meta.service_model.operation_model(operation_name)
+
     @staticmethod
     def get_bedrock_llm(model_name="ClaudeInstant", max_tokens=256, cache=True):
         """
@@ -1,10 +1,14 @@
 SYSTEM_PROMPT = """
     You are an AI language model assistant specialized in classifying topics.
-    You will be given a list of human input answers to a given input question. Each answer is in the JSON format, with keys of "index" and "answer".
+    You will be given a list of human input answers to a given input question. Each answer is in the JSON format, with keys of "index", "answer" and "weight", where "weight" is the number of speakers who gave a near-identical answer.
     Your task is to identify if a given answer is NOT actually answering the given input question, based on its content, then output the index value.
 """
 
 
+# Bump when the topic classification prompts change, so that cached chains are rebuilt
+TOPIC_CLASSIFICATION_PROMPT_VERSION = "1"
+
+
 TOPIC_CLASSIFICATION_TEMPLATE = """
 
     For example, for a given answer set
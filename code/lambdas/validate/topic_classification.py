@@ -4,11 +4,20 @@ from langchain_core.prompts import (
     HumanMessagePromptTemplate,
     SystemMessagePromptTemplate,
 )
-from prompt_templates import SYSTEM_PROMPT, TOPIC_CLASSIFICATION_TEMPLATE
+from prompt_templates import (
+    SYSTEM_PROMPT,
+    TOPIC_CLASSIFICATION_PROMPT_VERSION,
+    TOPIC_CLASSIFICATION_TEMPLATE,
+)
 from connections import Connections
-from typing import List
+from chain_registry import CompiledChain, chain_registry
+from typing import List, Tuple
+from langchain_core.runnables import Runnable
 from langchain_core.pydantic_v1 import BaseModel, Field
 
+# The maximum number of tokens of the list of off-topic answers
+MAX_TOKENS = 128
+
 
 class AnswerAnomaly(BaseModel):
     """
@@ -20,19 +29,18 @@ class AnswerAnomaly(BaseModel):
     )
 
 
-def answer_anomaly_detection(
-    model_name: str, list_answers_w_index: List[str], input_question: str
-) -> str:
+def build_chain(
+    model_name: str, max_tokens: int = MAX_TOKENS
+) -> Tuple[Runnable, PydanticOutputParser]:
     """
-    Use LLM to detect the answers to a given question that is not on topic.
+    Build the chain detecting the answers that are not on topic.
 
     Inputs:
         model_name (str): Model name in Amazon Bedrock service
-        list_answers_w_index (list): List of answers for the given input question
-        input_question: (str): The input question.
+        max_tokens (int): Maximum number of tokens of the output
 
     Returns:
-        str: The detected answer.
+        Tuple[Runnable, PydanticOutputParser]: The chain, and its output parser.
     """
     # Define the parser
     parser = PydanticOutputParser(pydantic_object=AnswerAnomaly)
@@ -47,20 +55,85 @@ def answer_anomaly_detection(
     )
     # LLM object
     llm = Connections.get_bedrock_llm(
-        model_name=model_name, max_tokens=128, cache=False
+        model_name=model_name, max_tokens=max_tokens, cache=False
     )
 
     # Chain the elements together
-    chain = prompt | llm | parser
+    return prompt | llm | parser, parser
+
+
+def get_chain(model_name: str) -> CompiledChain:
+    """
+    Get the chain detecting the answers that are not on topic from the registry
+    of the process, building it on the first call only.
+
+    Inputs:
+        model_name (str): Model name in Amazon Bedrock service
+
+    Returns:
+        CompiledChain: The chain, its output parser and its format instructions.
+    """
+
+    def build() -> CompiledChain:
+        chain, parser = build_chain(model_name)
+        return CompiledChain(chain, parser, parser.get_format_instructions())
+
+    return chain_registry.get(
+        (
+            "topic_classification",
+            model_name,
+            TOPIC_CLASSIFICATION_PROMPT_VERSION,
+            MAX_TOKENS,
+        ),
+        build,
+    )
+
+
+def answer_anomaly_detection(
+    model_name: str, list_answers_w_index: List[str], input_question: str
+) -> str:
+    """
+    Use LLM to detect the answers to a given question that is not on topic.
+
+    Inputs:
+        model_name (str): Model name in Amazon Bedrock service
+        list_answers_w_index (list): List of answers for the given input question
+        input_question: (str): The input question.
+
+    Returns:
+        str: The detected answer.
+    """
+    compiled = get_chain(model_name)
 
     # Define input dict
     input_dict = {
         "answer_json": list_answers_w_index,
-        "format_instructions": parser.get_format_instructions(),
+        "format_instructions": compiled.format_instructions,
         "input_question": input_question,
     }
 
     # Invoke the chain
-    ans = chain.invoke(input_dict)
+    ans = compiled.chain.invoke(input_dict)
 
     return ans
+
+
+def prime_answer_anomaly_detection(model_name: str) -> None:
+    """
+    Build the chain into the registry of the process, format a prompt and parse
+    an output without invoking the model, so that the imports, the pydantic
+    schemas and the botocore model of Amazon Bedrock are loaded during the AWS
+    Lambda initialization rather than by the first invocation. No request is
+    sent, so the primed state is safe to snapshot.
+
+    Inputs:
+        model_name (str): Model name in Amazon Bedrock service
+    """
+    compiled = get_chain(model_name)
+    compiled.chain.first.format_messages(
+        answer_json=[{"index": "0", "answer": "Priming", "weight": 1}],
+        format_instructions=compiled.format_instructions,
+        input_question="Priming",
+    )
+    compiled.parser.parse('{"off_topic_answers": ["-1"]}')
+    Connections.prime_client(Connections.bedrock_client, "InvokeModel")
@@ -1,14 +1,29 @@
 import time
-from dataclasses import dataclass
-from topic_classification import answer_anomaly_detection
+from dataclasses import dataclass, field
+from topic_classification import (
+    answer_anomaly_detection,
+    prime_answer_anomaly_detection,
+)
+from dedup import cluster_near_duplicates
 from utils import generate_dataframe_from_files
 from connections import Connections, tracer, logger, metrics
+from instrumentation import instrument_handler, phase
+from idempotency import idempotent_handler
+from pipeline_state import record_stage_state
 from exceptions import CodeError
-from typing import List
+from typing import Dict, List, Optional
+import pandas as pd
 from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from aws_lambda_powertools.utilities.parser import event_parser, BaseModel
 
+# Pay the chain construction and the lazy imports during the lambda initialization
+if Connections.chain_priming_enabled:
+    try:
+        prime_answer_anomaly_detection(model_name="Claude3")
+    except Exception as error:
+        logger.warning(f"Unable to prime the topic analysis chain: {error}")
+
 
 @dataclass
 class Response:
@@ -17,7 +32,10 @@ class Response:
     validAnswersS3Uris: List[str]
     continueSummarization: bool
     invalidAnswersS3Uris: List[str]
+    answerClusters: List[List[str]]
     serviceName: str = Connections.service_name
+    costLedger: Dict[str, dict] = field(default_factory=dict)
+    correlationId: str = ""
 
 
 class Request(BaseModel):
@@ -35,18 +53,32 @@ class Request(BaseModel):
         A list of S3 URIs that contain the transcribed files.
     serviceName: str
         The name of the AWS Lambda as configured through AWS powertools.
+    costLedger: Dict (str, dict)
+        The billed usage of every previous stage, by stage.
+    correlationId: str
+        The identifier correlating the traces and logs of every stage.
     """
 
     statusCode: int
     documentName: str
     transcribedFilesS3Uris: List[str]
     serviceName: str
+    costLedger: Dict[str, dict] = {}
+    correlationId: Optional[str] = None
 
 
 @logger.inject_lambda_context(log_event=True, clear_state=True)
 @tracer.capture_lambda_handler
 @metrics.log_metrics(capture_cold_start_metric=True)
+@idempotent_handler(
+    "validate",
+    "documentName",
+    "transcribedFilesS3Uris",
+    s3_client=Connections.s3_client,
+)
+@record_stage_state("validate", Connections.s3_client)
 @event_parser(model=Request)
+@instrument_handler("validate")
 def lambda_handler(event: Request, context: LambdaContext) -> str:
     metrics.add_metric(
         name="TotalTopicAnalysisInvocation", unit=MetricUnit.Count, value=1
@@ -60,15 +92,28 @@ def lambda_handler(event: Request, context: LambdaContext) -> str:
     statusCode = None
 
     # Retrieve all answers for the given answerTextPath
-    df_input = generate_dataframe_from_files(transcribedFilesS3Uris)
+    with phase("validate", event.documentName, name="load"):
+        df_input = generate_dataframe_from_files(transcribedFilesS3Uris)
     logger.debug(f"Input Dataframe size for topic analysis (validate): {len(df_input)}")
 
     # Build a dictionary mapping index to uris
     index_uri_dict = dict(zip(df_input["index"], df_input["list_of_answer_text_uris"]))
 
-    # Convert the answer_id and answer into a list of JSON files
+    # Collapse near-duplicate answers, keeping one representative per cluster
+    answer_clusters = cluster_answers(df_input)
+    clusters_by_representative = {cluster[0]: cluster for cluster in answer_clusters}
+    answer_text_dict = dict(zip(df_input["index"], df_input["answer"]))
+
+    # Convert the answer_id and answer of the representatives into a list of JSON files
     answer_id_list = df_input["index"].astype(str).tolist()
-    list_answers_w_index = df_input[["index", "answer"]].to_dict(orient="records")
+    list_answers_w_index = [
+        {
+            "index": cluster[0],
+            "answer": answer_text_dict[cluster[0]],
+            "weight": len(cluster),
+        }
+        for cluster in answer_clusters
+    ]
     question = df_input.question.iloc[0]
 
     # Logic:
@@ -84,28 +129,31 @@ def lambda_handler(event: Request, context: LambdaContext) -> str:
     base_wait_time = 2
     logger.info(f"Start Topic Analysis for the question {question}")
 
-    while retry_count < max_retries:
-        try:
-            # Start timer
-            start_time = time.time()
-            ans = answer_anomaly_detection(
-                model_name="Claude3",
-                list_answers_w_index=list_answers_w_index,
-                input_question=question,
-            )
-            logger.debug(f"Off-topic answers list: {ans}")
-            # End timer
-            end_time = time.time()
-            # Calculate response time in seconds
-            response_time = end_time - start_time
-            off_topic_answer_id_list = ans.off_topic_answers
-            break  # If the function succeeds, exit the loop
-        except Exception as e:
-            logger.debug(f"An error occurred during topic analysis: {e}")
-            wait_time = base_wait_time * (2**retry_count)
-            logger.warning(f"Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            retry_count += 1
+    with phase("validate", event.documentName, name="llm"):
+        while retry_count < max_retries:
+            try:
+                # Start timer
+                start_time = time.time()
+                ans = answer_anomaly_detection(
+                    model_name="Claude3",
+                    list_answers_w_index=list_answers_w_index,
+                    input_question=question,
+                )
+                logger.debug(f"Off-topic answers list: {ans}")
+                # End timer
+                end_time = time.time()
+                # Calculate response time in seconds
+                response_time = end_time - start_time
+                off_topic_answer_id_list = expand_clusters(
+                    ans.off_topic_answers, clusters_by_representative
+                )
+                break  # If the function succeeds, exit the loop
+            except Exception as e:
+                logger.debug(f"An error occurred during topic analysis: {e}")
+                wait_time = base_wait_time * (2**retry_count)
+                logger.warning(f"Retrying in {wait_time} seconds...")
+                time.sleep(wait_time)
+                retry_count += 1
 
     if retry_count == max_retries:
         on_topic_answer_id_list = []
@@ -162,7 +210,63 @@ def lambda_handler(event: Request, context: LambdaContext) -> str:
         validAnswersS3Uris=on_topic_answer_uri_list,
         continueSummarization=continueSummarization,
         invalidAnswersS3Uris=off_topic_answer_uri_list,
+        answerClusters=[
+            [index_uri_dict[idx] for idx in cluster]
+            for cluster in answer_clusters
+            if len(cluster) > 1
+        ],
     ).__dict__
     logger.info(f"Lambda Output: {response}")
 
     return response
+
+
+@tracer.capture_method
+def cluster_answers(df_input: pd.DataFrame) -> List[List[str]]:
+    """
+    Group near-duplicate answers so that only one representative per cluster is sent to the LLM.
+
+    Args:
+        df_input (pd.DataFrame): The answers, with the "index" and "answer" columns.
+
+    Returns:
+        List[List[str]]: Clusters of answer indexes, the representative first.
+    """
+    indexes = df_input["index"].astype(str).tolist()
+    if not Connections.dedup_enabled:
+        return [[idx] for idx in indexes]
+
+    clusters = cluster_near_duplicates(
+        df_input["answer"].tolist(), threshold=Connections.dedup_threshold
+    )
+    answer_clusters = [[indexes[i] for i in cluster] for cluster in clusters]
+    duplicates = len(indexes) - len(answer_clusters)
+    logger.info(
+        f"Found {duplicates} near-duplicate answers in {len(answer_clusters)} clusters"
+    )
+    metrics.add_metric(
+        name="NearDuplicateAnswers", unit=MetricUnit.Count, value=duplicates
+    )
+    return answer_clusters
+
+
+def expand_clusters(
+    answer_ids: List[str], clusters_by_representative: Dict[str, List[str]]
+) -> List[str]:
+    """
+    Expand the representative answer indexes returned by the LLM to all the members of their cluster.
+
+    Args:
+        answer_ids (List[str]): The answer indexes returned by the LLM.
+        clusters_by_representative (Dict[str, List[str]]): The cluster members keyed by representative.
+
+    Returns:
+        List[str]: The answer indexes of all the cluster members.
+    """
+    if answer_ids == ["-1"]:
+        return answer_ids
+    return [
+        member
+        for idx in answer_ids
+        for member in clusters_by_representative.get(idx, [idx])
+    ]
@@ -0,0 +1,56 @@
+import pytest
+from tools.stage_loader import load_stage_module
+
+
+@pytest.fixture
+def cost_ledger():
+    return load_stage_module("generate", "cost_ledger")
+
+
+@pytest.fixture
+def prices(cost_ledger):
+    return dict(cost_ledger.DEFAULT_PRICE_TABLE)
+
+
+def test_every_transcribe_job_is_billed_the_minimum(cost_ledger, prices):
+    # One long job and three jobs shorter than the minimum of 15 seconds
+    usage = {
+        "transcribeAudioMinutes": 5.05,
+        "transcribeJobs": 4,
+        "transcribeJobSeconds": [300.0, 1.0, 1.0, 1.0],
+    }
+
+    priced = cost_ledger.price_stage(usage, prices)
+
+    assert priced["transcribeBilledMinutes"] == pytest.approx(345 / 60, abs=1e-4)
+    assert priced["transcribeCost"] == pytest.approx(
+        345 / 60 * prices["transcribePerMinute"]
+    )
+
+
+def test_ledgers_without_job_durations_bill_the_total_minutes(cost_ledger, prices):
+    usage = {"transcribeAudioMinutes": 0.1, "transcribeJobs": 2}
+
+    priced = cost_ledger.price_stage(usage, prices)
+
+    assert priced["transcribeBilledMinutes"] == pytest.approx(0.5)
+
+
+def test_s3_deletes_are_free(cost_ledger, prices):
+    usage = {
+        "s3Requests": {
+            "PutObject": 2,
+            "GetObject": 3,
+            "HeadObject": 1,
+            "DeleteObject": 5,
+            "AbortMultipartUpload": 1,
+        }
+    }
+
+    priced = cost_ledger.price_stage(usage, prices)
+
+    assert priced["s3PutRequests"] == 2
+    assert priced["s3GetRequests"] == 4
+    assert priced["s3Cost"] == pytest.approx(
+        (2 * prices["s3PutPer1kRequests"] + 4 * prices["s3GetPer1kRequests"]) / 1000
+    )
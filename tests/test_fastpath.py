@@ -0,0 +1,63 @@
+import types
+import pytest
+
+try:
+    import weasyprint  # noqa: F401
+except (ImportError, OSError):
+    pytest.skip(
+        "the generate stage of the fast path needs WeasyPrint and its libraries",
+        allow_module_level=True,
+    )
+
+from tools.local_runner import StandIns, seed_audio_samples
+from tools.stage_loader import load_stage_module
+from tools.stand_ins import FakeLambdaContext, client_error
+
+
+@pytest.fixture(scope="module")
+def stand_ins():
+    return StandIns(seed=1)
+
+
+@pytest.fixture(scope="module")
+def fastpath(stand_ins):
+    return load_stage_module(
+        "fastpath",
+        clients=stand_ins.clients,
+        environment={"IDEMPOTENCY_ENABLED": "true"},
+    )
+
+
+def test_runs_after_failed_run_do_every_stage_again(fastpath, stand_ins, monkeypatch):
+    # The answers are all on topic, without building the chain of the model
+    monkeypatch.setattr(
+        fastpath.stages["validate"],
+        "answer_anomaly_detection",
+        lambda **kwargs: types.SimpleNamespace(off_topic_answers=["-1"]),
+    )
+    summarize = fastpath.stages["summarize"]
+    summarize_handler = summarize.lambda_handler
+
+    def throttled(event, context):
+        raise client_error("ThrottlingException", "Rate exceeded", "InvokeModel")
+
+    event = {
+        "documentName": "doc",
+        "audioFileFolderUri": seed_audio_samples(stand_ins, "what is amazon bedrock"),
+    }
+    monkeypatch.setattr(summarize, "lambda_handler", throttled)
+    with pytest.raises(Exception, match="ThrottlingException"):
+        fastpath.lambda_handler(dict(event), FakeLambdaContext("fastpath"))
+    monkeypatch.setattr(summarize, "lambda_handler", summarize_handler)
+    jobs = stand_ins.transcribe.calls["StartTranscriptionJob"]
+
+    # The transcripts of the failed run were only in memory, so they are
+    # transcribed again instead of being taken from a stored response
+    first = fastpath.lambda_handler(dict(event), FakeLambdaContext("fastpath"))
+    assert first["statusCode"] == 200
+    assert stand_ins.transcribe.calls["StartTranscriptionJob"] == 2 * jobs
+
+    # A duplicate of the successful run returns its stored response
+    second = fastpath.lambda_handler(dict(event), FakeLambdaContext("fastpath"))
+    assert second == first
+    assert stand_ins.transcribe.calls["StartTranscriptionJob"] == 2 * jobs
@@ -0,0 +1,124 @@
+import threading
+import time
+import pytest
+from aws_lambda_powertools.utilities.idempotency.exceptions import (
+    IdempotencyAlreadyInProgressError,
+)
+from tools.stage_loader import load_stage_module
+from tools.stand_ins import FakeLambdaContext, InMemoryS3
+
+BUCKET = "local-bucket"
+
+
+@pytest.fixture
+def idempotency(monkeypatch):
+    module = load_stage_module("validate", "idempotency")
+    monkeypatch.setattr(module, "IDEMPOTENCY_ENABLED", True)
+    return module
+
+
+@pytest.fixture
+def s3():
+    s3 = InMemoryS3()
+    s3.put_object(Bucket=BUCKET, Key="transcripts/a.json", Body=b"first transcript")
+    return s3
+
+
+def make_event() -> dict:
+    return {
+        "documentName": "doc",
+        "transcribedFilesS3Uris": [f"s3://{BUCKET}/transcripts/a.json"],
+        "correlationId": "execution 1",
+    }
+
+
+def make_handler(idempotency, s3, responses):
+    calls = []
+
+    @idempotency.idempotent_handler(
+        "validate",
+        "documentName",
+        "transcribedFilesS3Uris",
+        s3_client=s3,
+        persistence_store=idempotency.InMemoryPersistenceLayer(),
+    )
+    def handler(event, context):
+        calls.append(event)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    return handler, calls
+
+
+def test_duplicate_returns_stored_response(idempotency, s3):
+    handler, calls = make_handler(
+        idempotency, s3, [{"statusCode": 200, "run": 1}, {"statusCode": 200, "run": 2}]
+    )
+    context = FakeLambdaContext("validate")
+
+    first = handler(make_event(), context)
+    duplicate = handler({**make_event(), "correlationId": "execution 2"}, context)
+
+    assert first == duplicate == {"statusCode": 200, "run": 1}
+    assert len(calls) == 1
+    assert idempotency.INPUTS_HASH_FIELD not in calls[0]
+
+
+def test_changed_content_is_not_a_duplicate(idempotency, s3):
+    handler, calls = make_handler(
+        idempotency, s3, [{"statusCode": 200, "run": 1}, {"statusCode": 200, "run": 2}]
+    )
+    context = FakeLambdaContext("validate")
+
+    handler(make_event(), context)
+    s3.put_object(Bucket=BUCKET, Key="transcripts/a.json", Body=b"edited transcript")
+
+    assert handler(make_event(), context) == {"statusCode": 200, "run": 2}
+    assert len(calls) == 2
+
+
+def test_unsuccessful_response_is_not_stored(idempotency, s3):
+    handler, calls = make_handler(
+        idempotency, s3, [{"statusCode": 400}, {"statusCode": 200}]
+    )
+    context = FakeLambdaContext("validate")
+
+    assert handler(make_event(), context) == {"statusCode": 400}
+    assert handler(make_event(), context) == {"statusCode": 200}
+    assert len(calls) == 2
+
+
+def test_duplicate_in_progress_raises_close_to_timeout(idempotency, s3, monkeypatch):
+    monkeypatch.setattr(idempotency, "IN_PROGRESS_WAIT_MARGIN_SECONDS", 0.5)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    @idempotency.idempotent_handler(
+        "validate",
+        "documentName",
+        "transcribedFilesS3Uris",
+        s3_client=s3,
+        persistence_store=idempotency.InMemoryPersistenceLayer(),
+    )
+    def handler(event, context):
+        calls.append(event)
+        started.set()
+        release.wait(10)
+        return {"statusCode": 200}
+
+    first = threading.Thread(
+        target=handler, args=(make_event(), FakeLambdaContext("validate"))
+    )
+    first.start()
+    started.wait(10)
+    try:
+        begin = time.monotonic()
+        with pytest.raises(IdempotencyAlreadyInProgressError):
+            # Polls after 1s, then gives up before the margin of the timeout
+            handler(make_event(), FakeLambdaContext("validate", timeout_seconds=2.0))
+        waited = time.monotonic() - begin
+    finally:
+        release.set()
+        first.join()
+
+    assert 0.9 <= waited < 1.5
+    assert len(calls) == 1
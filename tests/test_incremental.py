@@ -0,0 +1,55 @@
+import json
+import pytest
+from tools.stage_loader import load_stage_module
+
+PATH = "s3://local-bucket/summarize/question/"
+ANSWERS = ["first answer", "second answer", "third answer"]
+URIS = [f"{PATH}answer{index}.txt" for index in range(len(ANSWERS))]
+SETTINGS = {"dedupEnabled": True, "compressionEnabled": False, "dedupThreshold": 0.8}
+
+
+@pytest.fixture
+def incremental(monkeypatch):
+    module = load_stage_module("summarize", "incremental")
+    objects = {
+        f"{PATH}{module.SUMMARY_FILENAME}": "existing summary",
+        f"{PATH}{module.MANIFEST_FILENAME}": json.dumps(
+            module.build_manifest(ANSWERS, URIS, "Claude3", SETTINGS)
+        ),
+    }
+    monkeypatch.setattr(module, "read_from_s3", objects.get)
+    return module
+
+
+def plan(incremental, answers, settings):
+    manifest = incremental.build_manifest(answers, URIS, "Claude3", settings)
+    return incremental.plan_summary_update(PATH, answers, manifest, 0.5)
+
+
+def test_same_answers_and_settings_keep_the_summary(incremental):
+    update = plan(incremental, ANSWERS, SETTINGS)
+
+    assert update.mode == incremental.UpdateMode.UNCHANGED
+    assert update.existing_summary == "existing summary"
+
+
+def test_added_answer_updates_the_summary(incremental):
+    update = plan(incremental, ANSWERS + ["fourth answer"], SETTINGS)
+
+    assert update.mode == incremental.UpdateMode.INCREMENTAL
+    assert update.added_answers == ["fourth answer"]
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {**SETTINGS, "dedupThreshold": 0.9},
+        {"dedupEnabled": False, "compressionEnabled": False},
+        {**SETTINGS, "compressionEnabled": True, "compressionRatio": 0.6},
+    ],
+)
+def test_changed_settings_rebuild_the_summary(incremental, settings):
+    update = plan(incremental, ANSWERS, settings)
+
+    assert update.mode == incremental.UpdateMode.FULL
+    assert update.reason == "summary settings have changed"
@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from tools.stage_loader import load_stage_module
+
+
+@pytest.fixture
+def instrumentation():
+    return load_stage_module("validate", "instrumentation")
+
+
+def test_concurrent_invocations_are_measured_separately(instrumentation):
+    both_started = threading.Barrier(2)
+    measured = {}
+
+    def invoke(document_name: str, seconds: float):
+        with instrumentation.phase("validate", document_name) as phase_metrics:
+            both_started.wait(5)
+            instrumentation.add_transcribe_audio_seconds(seconds)
+            both_started.wait(5)
+        measured[document_name] = phase_metrics.transcribe_job_seconds
+
+    threads = [
+        threading.Thread(target=invoke, args=("first", 10.0)),
+        threading.Thread(target=invoke, args=("second", 20.0)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert measured == {"first": [10.0], "second": [20.0]}
+
+
+def test_worker_threads_are_measured_in_the_phases_of_the_caller(instrumentation):
+    with instrumentation.phase("validate", "doc") as handler_phase:
+        with instrumentation.phase("validate", "doc", name="load") as load_phase:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                for seconds in (1.0, 2.0):
+                    executor.submit(
+                        instrumentation.in_trace_context(
+                            instrumentation.add_transcribe_audio_seconds
+                        ),
+                        seconds,
+                    ).result()
+
+    assert sorted(load_phase.transcribe_job_seconds) == [1.0, 2.0]
+    assert sorted(handler_phase.transcribe_job_seconds) == [1.0, 2.0]
+
+
+def test_other_threads_are_measured_when_one_invocation_runs(instrumentation):
+    with instrumentation.phase("validate", "doc") as phase_metrics:
+        # e.g. the threads of the S3 transfers, started by boto3
+        thread = threading.Thread(
+            target=instrumentation.add_transcribe_audio_seconds, args=(3.0,)
+        )
+        thread.start()
+        thread.join()
+
+    assert phase_metrics.transcribe_job_seconds == [3.0]
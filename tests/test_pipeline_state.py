@@ -0,0 +1,76 @@
+import pytest
+from tools.stage_loader import DEFAULT_ENVIRONMENT, load_stage_module
+from tools.stand_ins import InMemoryS3
+
+BUCKET = DEFAULT_ENVIRONMENT["DATA_SOURCE_BUCKET_NAME"]
+AUDIO = [f"s3://{BUCKET}/audio/question/answer.mp3"]
+TRANSCRIPT = f"s3://{BUCKET}/transcribe/question/answer.txt"
+
+
+@pytest.fixture
+def pipeline_state():
+    return load_stage_module("preprocess", "pipeline_state")
+
+
+@pytest.fixture
+def s3(pipeline_state):
+    """An S3 stand-in with the state of a completed execution of "doc"."""
+    s3 = InMemoryS3()
+    s3.put_object(Bucket=BUCKET, Key="audio/question/answer.mp3", Body=b"audio")
+    s3.put_object(Bucket=BUCKET, Key="transcribe/question/answer.txt", Body=b"text")
+    s3.put_object(Bucket=BUCKET, Key="validate/valid.csv", Body=b"valid")
+    s3.put_object(Bucket=BUCKET, Key="validate/invalid.csv", Body=b"invalid")
+    s3.put_object(Bucket=BUCKET, Key="summarize/summary.json", Body=b"summary")
+    outputs = {
+        "transcribe": {"transcribedFilesS3Uris": [TRANSCRIPT]},
+        "validate": {
+            "validAnswersS3Uris": [f"s3://{BUCKET}/validate/valid.csv"],
+            "invalidAnswersS3Uris": [f"s3://{BUCKET}/validate/invalid.csv"],
+        },
+        "summarize": {
+            "summarizedAnswerS3Uri": f"s3://{BUCKET}/summarize/summary.json",
+            "sections": ["Summary"],
+            "outputFormats": ["pdf"],
+        },
+        "generate": {"pdfFileS3Uri": f"s3://{BUCKET}/document_storage/doc.pdf"},
+    }
+    event = {"documentName": "doc", "audioFilesS3Uris": AUDIO}
+    for stage in pipeline_state.STAGES:
+        output = {"statusCode": 200, "documentName": "doc", **outputs[stage]}
+        pipeline_state.write_stage_state(s3, stage, event, output)
+        event = output
+    return s3
+
+
+def test_records_one_object_per_stage(pipeline_state, s3):
+    assert sorted(
+        key for _, key in s3.objects if key.startswith("pipeline_state/")
+    ) == [f"pipeline_state/doc/{stage}.json" for stage in sorted(pipeline_state.STAGES)]
+
+
+def test_resumes_from_generate_when_nothing_changed(pipeline_state, s3):
+    stage, resume_input = pipeline_state.resume_point(s3, BUCKET, "doc", AUDIO)
+
+    assert stage == "generate"
+    assert resume_input["summarizedAnswerS3Uri"].endswith("summarize/summary.json")
+
+
+def test_resumes_from_validate_when_a_transcript_changed(pipeline_state, s3):
+    s3.put_object(Bucket=BUCKET, Key="transcribe/question/answer.txt", Body=b"edit")
+
+    stage, resume_input = pipeline_state.resume_point(s3, BUCKET, "doc", AUDIO)
+
+    assert stage == "validate"
+    assert resume_input["transcribedFilesS3Uris"] == [TRANSCRIPT]
+
+
+def test_resumes_from_transcribe_when_a_record_is_missing(pipeline_state, s3):
+    s3.delete_object(Bucket=BUCKET, Key="pipeline_state/doc/transcribe.json")
+
+    assert pipeline_state.resume_point(s3, BUCKET, "doc", AUDIO) == ("transcribe", {})
+
+
+def test_resumes_from_transcribe_for_new_audio_files(pipeline_state, s3):
+    audio = AUDIO + [f"s3://{BUCKET}/audio/question/other.mp3"]
+
+    assert pipeline_state.resume_point(s3, BUCKET, "doc", audio) == ("transcribe", {})
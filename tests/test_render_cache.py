@@ -0,0 +1,48 @@
+import pytest
+from tools.stage_loader import load_stage_module
+
+
+@pytest.fixture
+def render_cache():
+    return load_stage_module("generate", "render_cache")
+
+
+def test_evicts_least_recently_used_entries_beyond_the_weight(render_cache):
+    cache = render_cache.RenderCache(100, max_weight=10)
+    cache.put("a", "pages of a", weight=4)
+    cache.put("b", "pages of b", weight=4)
+    assert cache.get("a") == "pages of a"
+
+    cache.put("c", "pages of c", weight=4)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "pages of a"
+    assert cache.get("c") == "pages of c"
+    assert cache.weight == 8
+
+
+def test_keeps_many_light_entries(render_cache):
+    cache = render_cache.RenderCache(100, max_weight=400)
+    for index in range(40):
+        cache.put(index, f"section {index}", weight=5)
+
+    assert len(cache) == 40
+    assert cache.weight == 200
+
+
+def test_does_not_keep_entries_heavier_than_the_weight(render_cache):
+    cache = render_cache.RenderCache(100, max_weight=10)
+    cache.put("a", "pages of a", weight=4)
+    cache.put("long", "pages of long", weight=11)
+
+    assert cache.get("long") is None
+    assert cache.get("a") == "pages of a"
+
+
+def test_replacing_an_entry_updates_the_weight(render_cache):
+    cache = render_cache.RenderCache(100, max_weight=10)
+    cache.put("a", "pages of a", weight=4)
+    cache.put("a", "new pages of a", weight=6)
+
+    assert cache.get("a") == "new pages of a"
+    assert cache.weight == 6
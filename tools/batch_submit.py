@@ -0,0 +1,660 @@
+"""
+Submit a batch of documents to the state machine, with a bounded number of
+executions running at the same time.
+
+The manifest is a CSV file with a `documentName,audioFileFolderUri` header, or
+a JSONL file with one `{"documentName": ..., "audioFileFolderUri": ...}`
+object per line. Every document is started as an execution of the state
+machine once one of the `--concurrency` slots is free, and waited for. Starts
+throttled by the StartExecution quota of Step Functions are retried with
+exponential backoff and jitter.
+
+The results manifest has one row per document of the manifest, in order, with
+its status, duration, PDF URI, execution ARN, number of start attempts and
+error. It is written as CSV or JSONL, after the extension of `--results`, and
+rewritten as the documents complete, so it tracks the progress of the batch.
+
+With `--local`, the executions run on the local runner with the stand-in
+services instead of Step Functions, after the audio samples of every question
+of `assets/audio_samples` are uploaded to the S3 stand-in, e.g.
+`s3://local-bucket/assets/audio_samples/what is amazon bedrock/`. The
+StartExecution quota is modelled by `--local-start-rate` and
+`--local-start-burst`.
+
+Usage:
+    python -m tools.batch_submit manifest.csv [--results results.csv]
+        [--concurrency 10] [--state-machine-arn <arn> | --stack-name <name>]
+    python -m tools.batch_submit manifest.jsonl --local [--concurrency 4]
+        [--local-start-rate 2 --local-start-burst 2] [--no-fast-path]
+"""
+
+import argparse
+import contextlib
+import copy
+import csv
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, TextIO
+from botocore.exceptions import ClientError
+from tools.stand_ins import client_error
+
+DEFAULT_STACK_NAME = "genai-knowledge-capture-stack"
+
+# Error codes of the Step Functions API calls rejected by a quota
+THROTTLING_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+}
+
+# Execution statuses of Step Functions that are final
+FINAL_STATUSES = {"SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED"}
+
+MANIFEST_FIELDS = ("documentName", "audioFileFolderUri")
+
+
+@dataclass
+class DocumentResult:
+    """
+    The outcome of the execution of a document of the manifest
+
+    Attributes:
+    -----------
+    documentName: str
+        Name of the document.
+    audioFileFolderUri: str
+        The S3 folder of the audio files of the document.
+    status: str
+        `SUCCEEDED` when the document was generated, `FAILED`, `TIMED_OUT` or
+        `ABORTED` like the executions, `NOT_STARTED` when the start failed,
+        and `PENDING` or `RUNNING` while the batch runs.
+    seconds: float
+        Duration of the execution, from its start to its end.
+    pdfFileS3Uri: str
+        The S3 URI of the generated PDF document.
+    executionArn: str
+        ARN of the execution.
+    startAttempts: int
+        Number of StartExecution calls, including the throttled ones.
+    error: str
+        The error of a document that was not generated.
+    """
+
+    documentName: str
+    audioFileFolderUri: str
+    status: str = "PENDING"
+    seconds: float = 0.0
+    pdfFileS3Uri: str = ""
+    executionArn: str = ""
+    startAttempts: int = 0
+    error: str = ""
+
+
+class LocalStepFunctions:
+    """
+    A stand-in for the boto3 Step Functions client, running the executions on
+    a `LocalStateMachine` in background threads. StartExecution calls above
+    `start_rate` per second, with bursts of `start_burst`, are throttled with
+    `ThrottlingException`, like the token bucket of the Step Functions quota.
+    """
+
+    def __init__(
+        self, state_machine: Any, start_rate: float = 0.0, start_burst: int = 1
+    ):
+        self.state_machine = state_machine
+        self.start_rate = start_rate
+        self.start_burst = max(1, start_burst)
+        self.executions: Dict[str, dict] = {}
+        self.calls: Dict[str, int] = {}
+        self.throttles = 0
+        self._tokens = float(self.start_burst)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _count(self, operation_name: str):
+        with self._lock:
+            self.calls[operation_name] = self.calls.get(operation_name, 0) + 1
+
+    def _take_start_token(self) -> bool:
+        if not self.start_rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.start_burst),
+                self._tokens + (now - self._refilled_at) * self.start_rate,
+            )
+            self._refilled_at = now
+            if self._tokens < 1:
+                self.throttles += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def start_execution(
+        self, stateMachineArn: str, name: str, input: str = "{}", **_
+    ) -> dict:
+        self._count("StartExecution")
+        if not self._take_start_token():
+            raise client_error("ThrottlingException", "Rate exceeded", "StartExecution")
+        execution_arn = execution_arn_of(stateMachineArn, name)
+        with self._lock:
+            existing = self.executions.get(execution_arn)
+            if existing is not None:
+                # Same name and input of an open execution, like Step Functions
+                if existing["input"] == input and existing["status"] == "RUNNING":
+                    return {
+                        "executionArn": execution_arn,
+                        "startDate": existing["startDate"],
+                    }
+                raise client_error(
+                    "ExecutionAlreadyExists",
+                    f"Execution already exists: '{execution_arn}'",
+                    "StartExecution",
+                )
+            execution = {
+                "executionArn": execution_arn,
+                "stateMachineArn": stateMachineArn,
+                "name": name,
+                "status": "RUNNING",
+                "startDate": datetime.now(timezone.utc),
+                "input": input,
+            }
+            self.executions[execution_arn] = execution
+        threading.Thread(
+            target=self._run, args=(execution, json.loads(input)), daemon=True
+        ).start()
+        return {"executionArn": execution_arn, "startDate": execution["startDate"]}
+
+    def _run(self, execution: dict, execution_input: dict):
+        error = ""
+        try:
+            report = self.state_machine.run(execution_input)
+            status, output = report.status, report.output
+            # The output of a notified failure is the response of SNS, so the
+            # error is the one of the failed task
+            failed = [task for task in report.tasks if task.error]
+            if status != "SUCCEEDED" and failed:
+                error = f"{failed[-1].state}: {failed[-1].error}"
+        except Exception as exception:
+            status, output = "FAILED", {
+                "Error": type(exception).__name__,
+                "Cause": str(exception),
+            }
+        with self._lock:
+            execution["status"] = status
+            execution["stopDate"] = datetime.now(timezone.utc)
+            execution["output"] = json.dumps(output, default=str)
+            if status != "SUCCEEDED" and isinstance(output, dict):
+                execution["error"] = error or str(output.get("Error") or "")
+                execution["cause"] = str(output.get("Cause") or "")
+
+    def describe_execution(self, executionArn: str, **_) -> dict:
+        self._count("DescribeExecution")
+        with self._lock:
+            execution = self.executions.get(executionArn)
+            if execution is None:
+                raise client_error(
+                    "ExecutionDoesNotExist",
+                    f"Execution does not exist: '{executionArn}'",
+                    "DescribeExecution",
+                )
+            return copy.deepcopy(execution)
+
+
+class BatchSubmitter:
+    """
+    Start the executions of the documents of a manifest, at most `concurrency`
+    at a time, and collect their results.
+
+    Attributes:
+    -----------
+    client: Any
+        The boto3 Step Functions client, or a `LocalStepFunctions`.
+    state_machine_arn: str
+        ARN of the state machine.
+    concurrency: int
+        Number of executions running at the same time.
+    max_start_attempts: int
+        Number of StartExecution calls of a document before it is given up,
+        when they are throttled.
+    poll_seconds: float
+        Interval between the DescribeExecution calls of an execution.
+    execution_timeout_seconds: float
+        How long an execution is waited for before its document is reported
+        as `TIMED_OUT`. The execution itself is not stopped.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        state_machine_arn: str,
+        concurrency: int = 10,
+        max_start_attempts: int = 8,
+        poll_seconds: float = 5.0,
+        execution_timeout_seconds: float = 3600.0,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 20.0,
+        batch_id: Optional[str] = None,
+        results_path: Optional[str] = None,
+        progress: Optional[TextIO] = None,
+        seed: Optional[int] = None,
+    ):
+        self.client = client
+        self.state_machine_arn = state_machine_arn
+        self.concurrency = max(1, concurrency)
+        self.max_start_attempts = max(1, max_start_attempts)
+        self.poll_seconds = poll_seconds
+        self.execution_timeout_seconds = execution_timeout_seconds
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.batch_id = batch_id or datetime.now(timezone.utc).strftime(
+            "batch-%Y%m%dT%H%M%S"
+        )
+        self.results_path = results_path
+        self.progress = progress or sys.stdout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def submit(self, documents: List[Dict[str, str]]) -> List[DocumentResult]:
+        """
+        Run the executions of the documents and wait for them.
+
+        Arguments:
+        ----------
+            documents (List[Dict[str, str]]): The rows of the manifest.
+
+        Returns:
+        --------
+            List[DocumentResult]: The result of every document, in the order
+                of the manifest.
+        """
+        results = [
+            DocumentResult(
+                documentName=document["documentName"],
+                audioFileFolderUri=document["audioFileFolderUri"],
+            )
+            for document in documents
+        ]
+        self.write_results(results)
+        start = time.monotonic()
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(self.run_document, index, result): result
+                for index, result in enumerate(results)
+            }
+            for future in as_completed(futures):
+                result = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    result.status = "FAILED" if result.executionArn else "NOT_STARTED"
+                    result.error = result.error or f"{type(error).__name__}: {error}"
+                completed += 1
+                self.write_results(results)
+                print(
+                    f"[{completed:>{len(str(len(results)))}}/{len(results)}] "
+                    f"{result.documentName}: {result.status} in {result.seconds:.1f} s"
+                    + (f" ({result.error})" if result.error else ""),
+                    file=self.progress,
+                    flush=True,
+                )
+        print_summary(results, time.monotonic() - start, self.progress)
+        return results
+
+    def run_document(self, index: int, result: DocumentResult) -> None:
+        """Start the execution of a document, and wait for its end."""
+        name = execution_name(self.batch_id, index, result.documentName)
+        execution_input = json.dumps(
+            {
+                "documentName": result.documentName,
+                "audioFileFolderUri": result.audioFileFolderUri,
+            }
+        )
+        try:
+            result.executionArn = self.start_execution(name, execution_input, result)
+        except ClientError as error:
+            result.status = "NOT_STARTED"
+            result.error = error_code(error)
+            return
+        result.status = "RUNNING"
+
+        deadline = time.monotonic() + self.execution_timeout_seconds
+        while True:
+            execution = self.call_with_backoff(
+                self.client.describe_execution, executionArn=result.executionArn
+            )
+            if execution["status"] in FINAL_STATUSES:
+                break
+            if time.monotonic() > deadline:
+                result.status = "TIMED_OUT"
+                result.error = "The batch stopped waiting for the execution"
+                return
+            time.sleep(self.poll_seconds)
+        self.record_execution(result, execution)
+
+    def start_execution(
+        self, name: str, execution_input: str, result: DocumentResult
+    ) -> str:
+        """
+        Start an execution, retrying the throttled starts with exponential
+        backoff and full jitter. A start that already succeeded, e.g. when the
+        response of a retried call was lost, is found by its name.
+
+        Returns:
+        --------
+            str: ARN of the execution.
+        """
+        for attempt in range(1, self.max_start_attempts + 1):
+            result.startAttempts = attempt
+            try:
+                response = self.client.start_execution(
+                    stateMachineArn=self.state_machine_arn,
+                    name=name,
+                    input=execution_input,
+                )
+                return response["executionArn"]
+            except ClientError as error:
+                code = error_code(error)
+                if code == "ExecutionAlreadyExists" and attempt > 1:
+                    return execution_arn_of(self.state_machine_arn, name)
+                if code not in THROTTLING_CODES or attempt == self.max_start_attempts:
+                    raise
+                time.sleep(self.backoff_seconds(attempt))
+
+    def call_with_backoff(self, operation, **kwargs) -> dict:
+        """Call an API operation, retrying its throttled calls."""
+        attempt = 1
+        while True:
+            try:
+                return operation(**kwargs)
+            except ClientError as error:
+                if error_code(error) not in THROTTLING_CODES:
+                    raise
+                time.sleep(self.backoff_seconds(attempt))
+                attempt += 1
+
+    def backoff_seconds(self, attempt: int) -> float:
+        with self._lock:
+            return self._random.uniform(
+                0,
+                min(
+                    self.backoff_max_seconds,
+                    self.backoff_base_seconds * 2 ** (attempt - 1),
+                ),
+            )
+
+    def record_execution(self, result: DocumentResult, execution: dict) -> None:
+        """Fill the result of a document from its completed execution."""
+        if execution.get("startDate") and execution.get("stopDate"):
+            result.seconds = round(
+                (execution["stopDate"] - execution["startDate"]).total_seconds(), 3
+            )
+        try:
+            output = json.loads(execution.get("output") or "{}")
+        except ValueError:
+            output = {}
+        if not isinstance(output, dict):
+            output = {}
+        # A failed stage ends the execution with the notification of the
+        # failure, so only the output of generate means the document exists
+        if execution["status"] == "SUCCEEDED" and "outputS3Uris" in output:
+            result.status = "SUCCEEDED"
+            result.pdfFileS3Uri = output.get("pdfFileS3Uri") or ""
+            return
+        result.status = (
+            execution["status"] if execution["status"] != "SUCCEEDED" else "FAILED"
+        )
+        result.error = (
+            execution.get("error")
+            or str(output.get("Error") or "")
+            or "Failure notified"
+        )
+
+    def write_results(self, results: List[DocumentResult]) -> None:
+        if not self.results_path:
+            return
+        with self._lock:
+            write_results(self.results_path, results)
+
+
+def execution_name(batch_id: str, index: int, document_name: str) -> str:
+    """
+    Name the execution of a document of the batch. The names of the executions
+    of a state machine are unique, and have up to 80 letters, digits, `-` or
+    `_`.
+    """
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", document_name).strip("-")
+    return f"{batch_id}-{index}-{slug}"[:80]
+
+
+def execution_arn_of(state_machine_arn: str, name: str) -> str:
+    return f"{state_machine_arn.replace(':stateMachine:', ':execution:')}:{name}"
+
+
+def error_code(error: ClientError) -> str:
+    return error.response.get("Error", {}).get("Code", "")
+
+
+def read_manifest(path: str) -> List[Dict[str, str]]:
+    """
+    Read the documents of a CSV or JSONL manifest.
+
+    Arguments:
+    ----------
+        path (str): Path of the manifest, `.csv` or `.jsonl`.
+
+    Returns:
+    --------
+        List[Dict[str, str]]: The document name and audio folder of every
+            document.
+
+    Raises:
+    -------
+        ValueError: When a row misses a field, or a document name repeats.
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [json.loads(line) for line in file if line.strip()]
+
+    documents, names = [], set()
+    for number, row in enumerate(rows, start=1):
+        document = {key: str(row.get(key) or "").strip() for key in MANIFEST_FIELDS}
+        missing = [key for key, value in document.items() if not value]
+        if missing:
+            raise ValueError(f"Row {number} of {path} misses {', '.join(missing)}")
+        # The executions of one document would overwrite each other's outputs
+        if document["documentName"] in names:
+            raise ValueError(
+                f"Row {number} of {path} repeats {document['documentName']}"
+            )
+        names.add(document["documentName"])
+        documents.append(document)
+    return documents
+
+
+def write_results(path: str, results: List[DocumentResult]) -> None:
+    """Write the results manifest, as CSV or JSONL after its extension."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8", newline="") as file:
+        if path.lower().endswith(".csv"):
+            writer = csv.DictWriter(
+                file, fieldnames=[field.name for field in fields(DocumentResult)]
+            )
+            writer.writeheader()
+            writer.writerows(asdict(result) for result in results)
+        else:
+            for result in results:
+                file.write(json.dumps(asdict(result)) + "\n")
+    os.replace(temporary_path, path)
+
+
+def results_path_of(manifest_path: str) -> str:
+    root, extension = os.path.splitext(manifest_path)
+    return f"{root}.results{extension or '.jsonl'}"
+
+
+def print_summary(results: List[DocumentResult], seconds: float, progress) -> None:
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    succeeded = statuses.get("SUCCEEDED", 0)
+    rate = succeeded / seconds * 3600 if seconds else 0.0
+    print(
+        f"{len(results)} documents in {seconds:.1f} s, {rate:.0f} documents/h: "
+        + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items())),
+        file=progress,
+        flush=True,
+    )
+
+
+def state_machine_arn_of(stack_name: str) -> str:
+    """Build the ARN of the state machine of a deployed stack, see `CodeStack`."""
+    import boto3
+
+    session = boto3.session.Session()
+    account = session.client("sts").get_caller_identity()["Account"]
+    return (
+        f"arn:aws:states:{session.region_name}:{account}:"
+        f"stateMachine:{stack_name}-state-machine"
+    )
+
+
+def local_step_functions(args: argparse.Namespace) -> LocalStepFunctions:
+    """Build the local runner behind the stand-in of Step Functions."""
+    from tools.local_runner import (
+        AUDIO_SAMPLES_PATH,
+        LocalStateMachine,
+        StandIns,
+        seed_audio_samples,
+    )
+
+    stand_ins = StandIns(seed=args.seed)
+    for question in sorted(os.listdir(AUDIO_SAMPLES_PATH)):
+        if os.path.isdir(os.path.join(AUDIO_SAMPLES_PATH, question)):
+            seed_audio_samples(stand_ins, question)
+    state_machine = LocalStateMachine(
+        stand_ins,
+        environment={"FAST_PATH_ENABLED": "false"} if args.no_fast_path else None,
+        trace_memory=False,
+        seed=args.seed,
+    )
+    return LocalStepFunctions(
+        state_machine,
+        start_rate=args.local_start_rate,
+        start_burst=args.local_start_burst,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("manifest", help="CSV or JSONL manifest of the documents")
+    parser.add_argument(
+        "--results",
+        help="Path of the CSV or JSONL results manifest, "
+        "<manifest>.results.<extension> by default",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Executions running at the same time",
+    )
+    parser.add_argument("--state-machine-arn")
+    parser.add_argument("--stack-name", default=DEFAULT_STACK_NAME)
+    parser.add_argument("--max-start-attempts", type=int, default=8)
+    parser.add_argument("--poll-seconds", type=float, default=5.0)
+    parser.add_argument("--execution-timeout-seconds", type=float, default=3600.0)
+    parser.add_argument(
+        "--batch-id",
+        help="Prefix of the execution names, the start time by default",
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Run the executions on the local runner with the stand-in services",
+    )
+    parser.add_argument(
+        "--local-start-rate",
+        type=float,
+        default=0.0,
+        help="StartExecution calls per second before throttling, unlimited by default",
+    )
+    parser.add_argument("--local-start-burst", type=int, default=1)
+    parser.add_argument("--no-fast-path", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        documents = read_manifest(args.manifest)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    results_path = args.results or results_path_of(args.manifest)
+
+    if args.local:
+        client = local_step_functions(args)
+        state_machine_arn = (
+            "arn:aws:states:us-east-1:000000000000:stateMachine:local-state-machine"
+        )
+        poll_seconds = min(args.poll_seconds, 0.05)
+    else:
+        import boto3
+        from botocore.config import Config
+
+        # The throttled calls are retried by the submitter, with its own backoff
+        client = boto3.client(
+            "stepfunctions",
+            config=Config(retries={"mode": "standard", "max_attempts": 1}),
+        )
+        state_machine_arn = args.state_machine_arn or state_machine_arn_of(
+            args.stack_name
+        )
+        poll_seconds = args.poll_seconds
+
+    submitter = BatchSubmitter(
+        client,
+        state_machine_arn,
+        concurrency=args.concurrency,
+        max_start_attempts=args.max_start_attempts,
+        poll_seconds=poll_seconds,
+        execution_timeout_seconds=args.execution_timeout_seconds,
+        batch_id=args.batch_id
+        or (f"local-{uuid.uuid4().hex[:8]}" if args.local else None),
+        results_path=results_path,
+        progress=sys.stdout,
+        seed=args.seed,
+    )
+    if args.local:
+        # The lambdas print their metrics and logs to stdout, and warn about
+        # empty metrics
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(
+            devnull
+        ), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            results = submitter.submit(documents)
+        if client.throttles:
+            print(f"{client.throttles} throttled StartExecution calls were retried")
+    else:
+        results = submitter.submit(documents)
+    print(f"Results written to {results_path}")
+    if any(result.status != "SUCCEEDED" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
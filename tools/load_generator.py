@@ -0,0 +1,391 @@
+"""
+Generate load on the pipeline, to find how many documents per hour it
+sustains before the service quotas or the Lambda concurrency saturate.
+
+Executions of the state machine arrive at a given rate, with a number of
+answers drawn from a job size distribution, and run concurrently on the local
+runner with the stand-in services. The stand-ins model the quota of
+concurrent Amazon Transcribe batch jobs, the requests and tokens per minute
+quotas of Amazon Bedrock, and the concurrency limit of AWS Lambda.
+
+Durations are simulated: `--time-scale 0.01` runs one simulated hour in 36
+seconds, by scaling the arrival intervals, the job and model latencies, the
+quota windows and the retry intervals of the state machine. The lambda code
+itself and the retries inside the lambdas run in real time, so keep the
+modelled latencies large enough to dominate.
+
+Every rate reports the throughput, the queueing delay of the executions
+before they start, the p50/p95/p99 duration of every stage, and the limit
+that saturated first.
+
+Usage:
+    python -m tools.load_generator [--rates 60 240 960] [--executions 50]
+        [--answers 3:0.6 10:0.3 40:0.1] [--time-scale 0.01]
+        [--transcribe-max-jobs 250] [--bedrock-rpm 500] [--bedrock-tpm 200000]
+        [--lambda-concurrency 1000] [--output load.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from benchmarks.corpus import BUCKET_NAME, question_name, seed_question_folder
+from tools.local_runner import (
+    SNS_PUBLISH,
+    ExecutionReport,
+    LocalStateMachine,
+    StandIns,
+    StateMachineError,
+)
+from tools.stand_ins import BedrockQuota, TranscribeQuota
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class LoadReport:
+    """
+    The outcome of the executions started at one arrival rate
+
+    Attributes:
+    -----------
+    rate_per_hour: float
+        Arrival rate of the executions, per simulated hour.
+    executions: int
+        Number of executions started.
+    succeeded: int
+        Number of executions that generated their document.
+    throughput_per_hour: float
+        Documents generated per simulated hour, from the first arrival to the
+        last completion.
+    queueing_seconds: Dict[str, float]
+        Percentiles of the simulated seconds an execution waited for a free
+        execution slot after it arrived.
+    execution_seconds: Dict[str, float]
+        Percentiles of the simulated duration of the executions.
+    stage_seconds: Dict[str, Dict[str, float]]
+        Percentiles of the simulated duration of every stage, retries included.
+    limits: Dict[str, int]
+        Number of requests rejected by every quota, and the peak usage of the
+        concurrent quotas.
+    errors: Dict[str, int]
+        Number of failed executions, by error.
+    saturation: str
+        The limit that saturated first, or "none".
+    """
+
+    rate_per_hour: float
+    executions: int = 0
+    succeeded: int = 0
+    throughput_per_hour: float = 0.0
+    queueing_seconds: Dict[str, float] = field(default_factory=dict)
+    execution_seconds: Dict[str, float] = field(default_factory=dict)
+    stage_seconds: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    limits: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    saturation: str = "none"
+
+
+class ConcurrencyLimitedStateMachine(LocalStateMachine):
+    """
+    A local state machine whose lambda invocations are throttled with
+    `Lambda.TooManyRequestsException` above the concurrency limit, which the
+    Retry fields of the tasks retry.
+    """
+
+    def __init__(self, stand_ins: StandIns, lambda_concurrency: int, **kwargs):
+        super().__init__(stand_ins, trace_memory=False, **kwargs)
+        self.lambda_concurrency = lambda_concurrency
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.running = 0
+            self.peak_concurrency = 0
+            self.throttles = 0
+
+    def invoke(self, resource_name: str, state: dict, data: Any) -> Any:
+        if resource_name == SNS_PUBLISH:
+            return super().invoke(resource_name, state, data)
+        with self._lock:
+            if self.running >= self.lambda_concurrency:
+                self.throttles += 1
+                raise StateMachineError(
+                    "Lambda.TooManyRequestsException", "Rate Exceeded."
+                )
+            self.running += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.running)
+        try:
+            return super().invoke(resource_name, state, data)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+class LoadGenerator:
+    """
+    The stand-in services with their quotas, and the state machine shared by
+    the runs at every arrival rate.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.time_scale = args.time_scale
+        self.stand_ins = StandIns()
+        self.transcribe_quota = TranscribeQuota(
+            self.stand_ins.clients["transcribe"],
+            max_concurrent_jobs=args.transcribe_max_jobs,
+            job_seconds=args.transcribe_job_seconds * self.time_scale,
+        )
+        self.bedrock_quota = BedrockQuota(
+            self.stand_ins.clients["bedrock-runtime"],
+            requests_per_minute=args.bedrock_rpm,
+            tokens_per_minute=args.bedrock_tpm,
+            latency=args.bedrock_latency * self.time_scale,
+            minute_seconds=60 * self.time_scale,
+        )
+        self.stand_ins.clients["transcribe"] = self.transcribe_quota
+        self.stand_ins.clients["bedrock-runtime"] = self.bedrock_quota
+        self.state_machine = ConcurrencyLimitedStateMachine(
+            self.stand_ins,
+            lambda_concurrency=args.lambda_concurrency,
+            retry_interval_scale=self.time_scale,
+            environment=({"FAST_PATH_ENABLED": "false"} if args.no_fast_path else None),
+            seed=args.seed,
+        )
+        self.sizes = [answers for answers, _ in args.answers]
+        self.weights = [weight for _, weight in args.answers]
+        self.folders = {
+            answers: self.seed_folder(answers, args.words) for answers in self.sizes
+        }
+
+    def seed_folder(self, answers: int, words: int) -> str:
+        seed_question_folder(
+            self.stand_ins.s3,
+            answers,
+            words,
+            folder="assets/audio_samples",
+            extension="mp3",
+        )
+        question = question_name(answers, words)
+        return f"s3://{BUCKET_NAME}/assets/audio_samples/{question}/"
+
+    def run(self, rate_per_hour: float) -> LoadReport:
+        """
+        Start `--executions` executions at the given rate, and wait for them.
+
+        Arguments:
+        ----------
+            rate_per_hour (float): Arrival rate, per simulated hour.
+
+        Returns:
+        --------
+            LoadReport: The throughput, latencies and limits of the run.
+        """
+        self.transcribe_quota.reset()
+        self.bedrock_quota.reset()
+        self.state_machine.reset()
+        generator = random.Random(self.args.seed)
+        interval = 3600 / rate_per_hour * self.time_scale
+        results: List[Tuple[float, float, float, ExecutionReport]] = []
+        results_lock = threading.Lock()
+
+        def execute(index: int, arrived_at: float, answers: int):
+            started_at = time.monotonic()
+            report = self.state_machine.run(
+                {
+                    "documentName": f"load-{rate_per_hour:g}-{index}",
+                    "audioFileFolderUri": self.folders[answers],
+                }
+            )
+            with results_lock:
+                results.append((arrived_at, started_at, time.monotonic(), report))
+
+        with ThreadPoolExecutor(max_workers=self.args.max_executions) as executor:
+            next_arrival = time.monotonic()
+            for index in range(self.args.executions):
+                time.sleep(max(0.0, next_arrival - time.monotonic()))
+                answers = generator.choices(self.sizes, self.weights)[0]
+                executor.submit(execute, index, time.monotonic(), answers)
+                if self.args.arrival == "poisson":
+                    next_arrival += generator.expovariate(1 / interval)
+                else:
+                    next_arrival += interval
+        return self.summarize(rate_per_hour, results)
+
+    def summarize(self, rate_per_hour: float, results: list) -> LoadReport:
+        scale = self.time_scale
+        report = LoadReport(rate_per_hour=rate_per_hour, executions=len(results))
+        stage_seconds: Dict[str, List[float]] = {}
+        for _, _, _, execution in results:
+            if execution.status == "SUCCEEDED":
+                report.succeeded += 1
+            else:
+                error = failure_error(execution)
+                report.errors[error] = report.errors.get(error, 0) + 1
+            for task in execution.tasks:
+                if task.resource != SNS_PUBLISH:
+                    stage_seconds.setdefault(task.resource, []).append(task.seconds)
+
+        first_arrival = min(arrived_at for arrived_at, _, _, _ in results)
+        last_completion = max(completed_at for _, _, completed_at, _ in results)
+        elapsed_hours = (last_completion - first_arrival) / scale / 3600
+        report.throughput_per_hour = round(report.succeeded / elapsed_hours, 1)
+        report.queueing_seconds = percentiles(
+            [(started - arrived) / scale for arrived, started, _, _ in results]
+        )
+        report.execution_seconds = percentiles(
+            [(completed - started) / scale for _, started, completed, _ in results]
+        )
+        report.stage_seconds = {
+            stage: percentiles([seconds / scale for seconds in timings])
+            for stage, timings in sorted(stage_seconds.items())
+        }
+        report.limits = {
+            "transcribe_job_rejections": self.transcribe_quota.rejections,
+            "transcribe_peak_jobs": self.transcribe_quota.peak_concurrent_jobs,
+            "bedrock_rpm_throttles": self.bedrock_quota.throttles["RequestsPerMinute"],
+            "bedrock_tpm_throttles": self.bedrock_quota.throttles["TokensPerMinute"],
+            "lambda_throttles": self.state_machine.throttles,
+            "lambda_peak_concurrency": self.state_machine.peak_concurrency,
+        }
+        report.saturation = saturation(report)
+        return report
+
+
+def failure_error(execution: ExecutionReport) -> str:
+    """Name the error of the task that made the execution fail."""
+    failed = [
+        task for task in execution.tasks if task.error and task.resource != SNS_PUBLISH
+    ]
+    if failed:
+        return f"{failed[-1].state}: {failed[-1].error}"
+    if isinstance(execution.output, dict) and execution.output.get("Error"):
+        return str(execution.output["Error"])
+    return "unknown"
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        f"p{percentile}": round(float(np.percentile(values, percentile)), 3)
+        for percentile in PERCENTILES
+    }
+
+
+def saturation(report: LoadReport) -> str:
+    """
+    Name the limit that saturated first: the quota that rejected the most
+    requests, or the execution slots when the executions queued for more than
+    a tenth of the duration of an execution, or "none".
+    """
+    rejections = {
+        "Transcribe concurrent jobs": report.limits["transcribe_job_rejections"],
+        "Bedrock requests per minute": report.limits["bedrock_rpm_throttles"],
+        "Bedrock tokens per minute": report.limits["bedrock_tpm_throttles"],
+        "Lambda concurrency": report.limits["lambda_throttles"],
+    }
+    limit = max(rejections, key=rejections.get)
+    if rejections[limit]:
+        return limit
+    if report.queueing_seconds.get("p95", 0) > 0.1 * report.execution_seconds.get(
+        "p50", 0
+    ):
+        return "execution slots"
+    return "none"
+
+
+def print_report(report: LoadReport) -> None:
+    print(
+        f"\nRate {report.rate_per_hour:g}/h: {report.succeeded}/{report.executions}"
+        f" succeeded, {report.throughput_per_hour:g} documents/h,"
+        f" saturation: {report.saturation}"
+    )
+    rows = {"queueing": report.queueing_seconds, "execution": report.execution_seconds}
+    rows.update(report.stage_seconds)
+    print(f"  {'seconds':<14}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, row in rows.items():
+        print(f"  {name:<14}{row['p50']:>10.2f}{row['p95']:>10.2f}{row['p99']:>10.2f}")
+    print("  limits: " + ", ".join(f"{k}={v}" for k, v in report.limits.items()))
+    if report.errors:
+        print("  errors: " + ", ".join(f"{k}={v}" for k, v in report.errors.items()))
+
+
+def parse_job_sizes(values: List[str]) -> List[Tuple[int, float]]:
+    """Parse `answers:weight` arguments."""
+    sizes = []
+    for value in values:
+        answers, _, weight = value.partition(":")
+        sizes.append((int(answers), float(weight or 1)))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--rates",
+        type=float,
+        nargs="+",
+        default=[60, 240, 960],
+        help="Arrival rates to run, in executions per simulated hour",
+    )
+    parser.add_argument("--executions", type=int, default=50)
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument(
+        "--answers",
+        nargs="+",
+        default=["3:0.6", "10:0.3", "40:0.1"],
+        metavar="ANSWERS:WEIGHT",
+        help="Distribution of the number of answers of the documents",
+    )
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    parser.add_argument(
+        "--max-executions",
+        type=int,
+        default=64,
+        help="Executions running at the same time, the others are queued",
+    )
+    parser.add_argument("--transcribe-max-jobs", type=int, default=250)
+    parser.add_argument("--transcribe-job-seconds", type=float, default=60.0)
+    parser.add_argument("--bedrock-rpm", type=int, default=500)
+    parser.add_argument("--bedrock-tpm", type=int, default=200000)
+    parser.add_argument("--bedrock-latency", type=float, default=5.0)
+    parser.add_argument("--lambda-concurrency", type=int, default=1000)
+    parser.add_argument("--no-fast-path", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Path of a JSON file to write the reports to")
+    args = parser.parse_args()
+    args.answers = parse_job_sizes(args.answers)
+
+    load_generator = LoadGenerator(args)
+    reports = []
+    for rate in args.rates:
+        # The lambdas print their metrics to stdout, and warn about empty ones
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(
+            devnull
+        ), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            report = load_generator.run(rate)
+        print_report(report)
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump([asdict(report) for report in reports], file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
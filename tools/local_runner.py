@@ -0,0 +1,651 @@
+"""
+Run the pipeline locally, by interpreting the state machine definition of
+`assets/state_machine/stepfunction.json` and calling the lambda handlers
+in-process, with in-memory stand-ins for Amazon S3, Amazon Transcribe,
+Amazon Bedrock and Amazon SNS.
+
+The interpreter supports the states and fields used by the definition: Task
+(with Retry, Catch and TimeoutSeconds), Choice, Pass (with InputPath), Succeed
+and Fail.
+A task is not interrupted when it exceeds its timeout, it fails with
+`States.Timeout` once it returns.
+
+Every run reports the duration, the peak Python memory allocated (tracemalloc),
+the growth of the peak resident memory and the AWS calls of every task.
+
+Usage:
+    python -m tools.local_runner [--question "what is amazon bedrock"]
+        [--no-fast-path] [--latency s3=0.02 bedrock-runtime=1.5]
+        [--failure-rate bedrock-runtime=0.2] [--lambda-failure-rate 0.1]
+        [--idempotency --executions 2] [--report report.json]
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import resource
+import time
+import tracemalloc
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from tools.stage_loader import DEFAULT_ENVIRONMENT, PARENT_DIR, load_stage_handler
+from tools.stand_ins import (
+    FakeLambdaContext,
+    FaultInjector,
+    InMemoryS3,
+    InMemorySNS,
+    InMemoryTranscribe,
+    StubBedrock,
+)
+
+DEFINITION_PATH = os.path.join(
+    PARENT_DIR, "assets", "state_machine", "stepfunction.json"
+)
+AUDIO_SAMPLES_PATH = os.path.join(PARENT_DIR, "assets", "audio_samples")
+TRANSCRIPTS_PATH = os.path.join(PARENT_DIR, "assets", "examples_transcribe_texts")
+BUCKET_NAME = DEFAULT_ENVIRONMENT["DATA_SOURCE_BUCKET_NAME"]
+SNS_PUBLISH = "arn:aws:states:::sns:publish"
+
+# Stage of every lambda ARN substituted into the definition, see `CodeStack`
+LAMBDA_SUBSTITUTIONS: Dict[str, str] = {
+    "preprocess_lambda_arn": "preprocess",
+    "transcribe_batch_lambda_arn": "transcribe",
+    "validate_lambda_arn": "validate",
+    "summarize_lambda_arn": "summarize",
+    "generate_lambda_arn": "generate",
+    "fastpath_lambda_arn": "fastpath",
+}
+
+
+class StateMachineError(Exception):
+    """An error raised by a state, named like the errors of Step Functions"""
+
+    def __init__(self, error: str, cause: str):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+@dataclass
+class TaskReport:
+    """
+    The measurements of a task of the execution
+
+    Attributes:
+    -----------
+    state: str
+        Name of the state.
+    resource: str
+        Name of the lambda stage, or the resource ARN of a service integration.
+    attempts: int
+        Number of times the task ran, including the retries.
+    seconds: float
+        Duration of the task, including the retries and their intervals.
+    peak_python_mb: float
+        Peak memory allocated by Python code during the task, above what was
+        allocated when it started.
+    peak_rss_growth_mb: float
+        Growth of the peak resident memory of the process during the task,
+        i.e. zero when the task stays under an earlier peak.
+    aws_calls: Dict[str, int]
+        Number of calls to the stand-in services, by operation.
+    error: str
+        Name of the error of the last attempt, empty on success.
+    """
+
+    state: str
+    resource: str
+    attempts: int = 0
+    seconds: float = 0.0
+    peak_python_mb: float = 0.0
+    peak_rss_growth_mb: float = 0.0
+    aws_calls: Dict[str, int] = field(default_factory=dict)
+    error: str = ""
+
+
+@dataclass
+class ExecutionReport:
+    """
+    The outcome of an execution of the state machine
+
+    Attributes:
+    -----------
+    status: str
+        `SUCCEEDED` or `FAILED`, like Step Functions executions.
+    output: Any
+        Output of the last state.
+    seconds: float
+        Duration of the execution.
+    path: List[str]
+        Names of the states the execution went through, in order.
+    tasks: List[TaskReport]
+        The measurements of every task, in order.
+    """
+
+    status: str
+    output: Any
+    seconds: float
+    path: List[str]
+    tasks: List[TaskReport]
+
+
+class StandIns:
+    """
+    The stand-in AWS services of a local run, with optional latency and
+    failure injection per boto3 service name.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[Dict[str, float]] = None,
+        failure_rate: Optional[Dict[str, float]] = None,
+        transcripts: Optional[Dict[str, str]] = None,
+        bedrock_responder: Optional[Callable[[str], str]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.s3 = InMemoryS3()
+        self.transcribe = InMemoryTranscribe(self.s3, transcripts)
+        self.bedrock = (
+            StubBedrock(bedrock_responder) if bedrock_responder else StubBedrock()
+        )
+        self.sns = InMemorySNS()
+        self.services = {
+            "s3": self.s3,
+            "transcribe": self.transcribe,
+            "bedrock-runtime": self.bedrock,
+        }
+        latency = latency or {}
+        failure_rate = failure_rate or {}
+        self.clients = {
+            name: (
+                FaultInjector(
+                    service,
+                    latency=latency.get(name, 0.0),
+                    failure_rate=failure_rate.get(name, 0.0),
+                    seed=seed,
+                )
+                if latency.get(name) or failure_rate.get(name)
+                else service
+            )
+            for name, service in self.services.items()
+        }
+
+    def calls(self) -> Dict[str, int]:
+        """Number of calls to the services so far, by `service:Operation`."""
+        return {
+            f"{name}:{operation}": count
+            for name, service in self.services.items()
+            for operation, count in service.calls.items()
+        }
+
+
+class LocalStateMachine:
+    """
+    An interpreter of the state machine definition, running the lambda tasks
+    in-process.
+
+    Attributes:
+    -----------
+    definition: dict
+        The state machine definition, with the lambda ARNs substituted by
+        `local:<stage>`.
+    stand_ins: StandIns
+        The stand-in AWS services given to the lambdas.
+    lambda_failure_rate: float
+        Probability that an invocation fails with `Lambda.ServiceException`
+        before the handler is called, to exercise the Retry fields.
+    retry_interval_scale: float
+        Factor applied to the retry intervals, 0 to retry immediately.
+    environment: dict
+        Environment variables set while the lambdas are imported.
+    trace_memory: bool
+        Whether the peak Python memory of every task is measured with
+        tracemalloc, which slows the lambdas down and is global to the
+        process, i.e. only meaningful for one execution at a time.
+    """
+
+    def __init__(
+        self,
+        stand_ins: StandIns,
+        definition_path: str = DEFINITION_PATH,
+        lambda_failure_rate: float = 0.0,
+        retry_interval_scale: float = 0.0,
+        environment: Optional[Dict[str, str]] = None,
+        seed: Optional[int] = None,
+        trace_memory: bool = True,
+    ):
+        substitutions = {
+            name: f"local:{stage}" for name, stage in LAMBDA_SUBSTITUTIONS.items()
+        }
+        substitutions["sns_topic_arn"] = "local:sns-topic"
+        with open(definition_path, encoding="utf-8") as file:
+            definition = re.sub(
+                r"\$\{(\w+)\}", lambda match: substitutions[match.group(1)], file.read()
+            )
+        self.definition = json.loads(definition)
+        self.stand_ins = stand_ins
+        self.lambda_failure_rate = lambda_failure_rate
+        self.retry_interval_scale = retry_interval_scale
+        self.environment = environment or {}
+        self.trace_memory = trace_memory
+        self._random = random.Random(seed)
+
+    def run(self, execution_input: dict) -> ExecutionReport:
+        """
+        Run an execution of the state machine.
+
+        Arguments:
+        ----------
+            execution_input (dict): The input of the execution.
+
+        Returns:
+        --------
+            ExecutionReport: The outcome and measurements of the execution.
+        """
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        state_name = self.definition["StartAt"]
+        data = copy.deepcopy(execution_input)
+        path, tasks = [], []
+        status = "SUCCEEDED"
+        try:
+            while state_name:
+                path.append(state_name)
+                state = self.definition["States"][state_name]
+                state_type = state["Type"]
+                if state_type == "Task":
+                    data, next_state = self.run_task(state_name, state, data, tasks)
+                elif state_type == "Choice":
+                    next_state = self.choose(state, data)
+                elif state_type == "Pass":
+                    if "InputPath" in state:
+                        data = get_path(data, state["InputPath"])
+                        if data is MISSING:
+                            raise StateMachineError(
+                                "States.Runtime", f"Invalid path {state['InputPath']}"
+                            )
+                    data = apply_result_path(
+                        data, state.get("Result", data), state.get("ResultPath", "$")
+                    )
+                    next_state = state.get("Next")
+                elif state_type == "Succeed":
+                    next_state = None
+                elif state_type == "Fail":
+                    status = "FAILED"
+                    data = {"Error": state.get("Error"), "Cause": state.get("Cause")}
+                    next_state = None
+                else:
+                    raise StateMachineError(
+                        "States.Runtime", f"Unsupported state type {state_type}"
+                    )
+                state_name = next_state
+        except StateMachineError as error:
+            status = "FAILED"
+            data = {"Error": error.error, "Cause": error.cause}
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+        # An execution that notified a failure did not generate the document
+        if any(task.resource == SNS_PUBLISH for task in tasks):
+            status = "FAILED"
+        return ExecutionReport(
+            status=status,
+            output=data,
+            seconds=round(time.perf_counter() - start, 3),
+            path=path,
+            tasks=tasks,
+        )
+
+    def run_task(self, state_name: str, state: dict, data: Any, tasks: list):
+        """Run a Task state, with its retries, and return its output and next state."""
+        resource_name = state["Resource"]
+        report = TaskReport(
+            state=state_name, resource=resource_name.replace("local:", "")
+        )
+        tasks.append(report)
+        retry_attempts = [0] * len(state.get("Retry", []))
+        calls_before = self.stand_ins.calls()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        allocated_before = tracemalloc.get_traced_memory()[0]
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            while True:
+                report.attempts += 1
+                attempt_start = time.perf_counter()
+                try:
+                    result = self.invoke(resource_name, state, data)
+                    timeout = state.get("TimeoutSeconds")
+                    if timeout and time.perf_counter() - attempt_start > timeout:
+                        raise StateMachineError(
+                            "States.Timeout", f"Task ran longer than {timeout} seconds"
+                        )
+                    report.error = ""
+                    output = apply_result_path(
+                        data, result, state.get("ResultPath", "$")
+                    )
+                    return output, state.get("Next")
+                except Exception as exception:
+                    error = as_state_machine_error(exception)
+                    report.error = error.error
+                    interval = self.retry_interval(state, error, retry_attempts)
+                    if interval is None:
+                        catcher = next(
+                            (
+                                catcher
+                                for catcher in state.get("Catch", [])
+                                if error_matches(error.error, catcher["ErrorEquals"])
+                            ),
+                            None,
+                        )
+                        if catcher is None:
+                            raise error
+                        error_output = {"Error": error.error, "Cause": error.cause}
+                        output = apply_result_path(
+                            data, error_output, catcher.get("ResultPath", "$")
+                        )
+                        return output, catcher["Next"]
+                    time.sleep(interval * self.retry_interval_scale)
+        finally:
+            report.seconds = round(time.perf_counter() - start, 3)
+            report.peak_python_mb = round(
+                (tracemalloc.get_traced_memory()[1] - allocated_before) / 2**20, 2
+            )
+            report.peak_rss_growth_mb = round(
+                (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before)
+                / 1024,
+                2,
+            )
+            calls_after = self.stand_ins.calls()
+            report.aws_calls = {
+                name: count - calls_before.get(name, 0)
+                for name, count in calls_after.items()
+                if count != calls_before.get(name, 0)
+            }
+
+    def retry_interval(self, state: dict, error: StateMachineError, attempts: list):
+        """Return the seconds to wait before the next attempt, or None to stop retrying."""
+        for index, retrier in enumerate(state.get("Retry", [])):
+            if not error_matches(error.error, retrier["ErrorEquals"]):
+                continue
+            if attempts[index] >= retrier.get("MaxAttempts", 3):
+                return None
+            interval = (
+                retrier.get("IntervalSeconds", 1)
+                * retrier.get("BackoffRate", 2.0) ** attempts[index]
+            )
+            attempts[index] += 1
+            return interval
+        return None
+
+    def invoke(self, resource_name: str, state: dict, data: Any) -> Any:
+        """Call the lambda handler or the service integration of a Task state."""
+        if resource_name == SNS_PUBLISH:
+            parameters = resolve_parameters(state.get("Parameters", {}), data)
+            message = parameters.get("Message")
+            if not isinstance(message, str):
+                message = json.dumps(message)
+            return self.stand_ins.sns.publish(
+                TopicArn=parameters.get("TopicArn"),
+                Subject=parameters.get("Subject", ""),
+                Message=message,
+            )
+        if not resource_name.startswith("local:"):
+            raise StateMachineError(
+                "States.Runtime", f"Unsupported resource {resource_name}"
+            )
+
+        stage = resource_name.split(":", 1)[1]
+        if self._random.random() < self.lambda_failure_rate:
+            raise StateMachineError("Lambda.ServiceException", "Injected failure")
+        handler = load_stage_handler(
+            stage, clients=self.stand_ins.clients, environment=self.environment
+        )
+        context = FakeLambdaContext(
+            function_name=stage,
+            timeout_seconds=state.get("TimeoutSeconds", 900),
+            aws_request_id=str(uuid.uuid4()),
+        )
+        # The handlers receive the JSON serialized output of the previous state
+        return json.loads(json.dumps(handler(copy.deepcopy(data), context)))
+
+    def choose(self, state: dict, data: Any) -> str:
+        """Return the next state of a Choice state."""
+        for rule in state.get("Choices", []):
+            if evaluate_rule(rule, data):
+                return rule["Next"]
+        if "Default" in state:
+            return state["Default"]
+        raise StateMachineError("States.NoChoiceMatched", "No choice rule matched")
+
+
+def as_state_machine_error(exception: Exception) -> StateMachineError:
+    """Name an exception raised by a task like Step Functions does."""
+    if isinstance(exception, StateMachineError):
+        return exception
+    return StateMachineError(type(exception).__name__, str(exception))
+
+
+def error_matches(error: str, error_equals: List[str]) -> bool:
+    return (
+        error in error_equals
+        or "States.ALL" in error_equals
+        or ("States.TaskFailed" in error_equals and error != "States.Timeout")
+    )
+
+
+MISSING = object()
+
+
+def get_path(data: Any, json_path: str) -> Any:
+    """Return the value at a `$.a.b` path, or MISSING."""
+    value = data
+    for part in json_path.lstrip("$").split("."):
+        if not part:
+            continue
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def apply_result_path(data: Any, result: Any, result_path: Optional[str]) -> Any:
+    """Combine the input and the result of a state like the ResultPath field."""
+    if result_path is None:
+        return data
+    if result_path == "$":
+        return copy.deepcopy(result)
+    output = copy.deepcopy(data) if isinstance(data, dict) else {}
+    target = output
+    parts = result_path.lstrip("$.").split(".")
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    target[parts[-1]] = copy.deepcopy(result)
+    return output
+
+
+def resolve_parameters(parameters: Any, data: Any) -> Any:
+    """Resolve the `key.$` paths of the Parameters field."""
+    if isinstance(parameters, dict):
+        resolved = {}
+        for key, value in parameters.items():
+            if key.endswith(".$"):
+                value = get_path(data, value)
+                resolved[key[:-2]] = None if value is MISSING else value
+            else:
+                resolved[key] = resolve_parameters(value, data)
+        return resolved
+    return parameters
+
+
+COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "BooleanEquals": lambda value, expected: value == expected,
+    "StringEquals": lambda value, expected: value == expected,
+    "NumericEquals": lambda value, expected: value == expected,
+    "NumericGreaterThan": lambda value, expected: value > expected,
+    "NumericGreaterThanEquals": lambda value, expected: value >= expected,
+    "NumericLessThan": lambda value, expected: value < expected,
+    "NumericLessThanEquals": lambda value, expected: value <= expected,
+}
+
+
+def evaluate_rule(rule: dict, data: Any) -> bool:
+    """Evaluate a rule of a Choice state."""
+    if "And" in rule:
+        return all(evaluate_rule(sub_rule, data) for sub_rule in rule["And"])
+    if "Or" in rule:
+        return any(evaluate_rule(sub_rule, data) for sub_rule in rule["Or"])
+    if "Not" in rule:
+        return not evaluate_rule(rule["Not"], data)
+
+    value = get_path(data, rule["Variable"])
+    if "IsPresent" in rule:
+        return (value is not MISSING) == rule["IsPresent"]
+    if "IsNull" in rule:
+        return (value is None) == rule["IsNull"]
+    for operator, compare in COMPARISONS.items():
+        if operator in rule:
+            if value is MISSING:
+                raise StateMachineError(
+                    "States.Runtime", f"Invalid path {rule['Variable']}"
+                )
+            return compare(value, rule[operator])
+    raise StateMachineError("States.Runtime", f"Unsupported choice rule {rule}")
+
+
+def seed_audio_samples(stand_ins: StandIns, question: str) -> str:
+    """
+    Upload the audio samples of a question to the S3 stand-in, like the
+    deployment of `CodeStack` does, and map them to the example transcripts.
+
+    Returns:
+    --------
+        str: The S3 folder URI of the audio samples, the input of the pipeline.
+    """
+    prefix = f"assets/audio_samples/{question}/"
+    audio_folder = os.path.join(AUDIO_SAMPLES_PATH, question)
+    transcript_folder = os.path.join(TRANSCRIPTS_PATH, question)
+    for index, filename in enumerate(sorted(os.listdir(audio_folder)), start=1):
+        with open(os.path.join(audio_folder, filename), "rb") as file:
+            stand_ins.s3.put_object(
+                Bucket=BUCKET_NAME, Key=prefix + filename, Body=file
+            )
+        transcript_path = os.path.join(transcript_folder, f"answer{index}.txt")
+        if os.path.exists(transcript_path):
+            with open(transcript_path, encoding="utf-8") as file:
+                stand_ins.transcribe.transcripts[
+                    f"s3://{BUCKET_NAME}/{prefix}{filename}"
+                ] = file.read().strip()
+    return f"s3://{BUCKET_NAME}/{prefix}"
+
+
+def print_report(report: ExecutionReport) -> None:
+    print(f"Execution {report.status} in {report.seconds:.3f} s")
+    print(f"Path: {' -> '.join(report.path)}")
+    header = (
+        f"{'state':<20}{'resource':<12}{'attempts':>9}{'seconds':>9}"
+        f"{'py peak MB':>12}{'rss +MB':>9}  aws calls"
+    )
+    print(header)
+    print("-" * (len(header) + 20))
+    for task in report.tasks:
+        resource_name = "sns" if task.resource == SNS_PUBLISH else task.resource
+        calls = ", ".join(
+            f"{name}={count}" for name, count in sorted(task.aws_calls.items())
+        )
+        print(
+            f"{task.state:<20}{resource_name:<12}{task.attempts:>9}{task.seconds:>9.3f}"
+            f"{task.peak_python_mb:>12.2f}{task.peak_rss_growth_mb:>9.2f}  {calls}"
+        )
+    print(f"Output: {json.dumps(report.output)}")
+
+
+def parse_service_values(values: List[str]) -> Dict[str, float]:
+    """Parse `service=value` arguments."""
+    parsed = {}
+    for value in values or []:
+        service, _, number = value.partition("=")
+        parsed[service] = float(number)
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--question", default="what is amazon bedrock")
+    parser.add_argument("--document-name", default="local-run")
+    parser.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="Run one lambda per stage, even for small documents",
+    )
+    parser.add_argument(
+        "--latency",
+        nargs="*",
+        metavar="SERVICE=SECONDS",
+        help="Latency added to every call, e.g. s3=0.02 bedrock-runtime=1.5",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        nargs="*",
+        metavar="SERVICE=RATE",
+        help="Probability that a call fails, e.g. bedrock-runtime=0.2",
+    )
+    parser.add_argument("--lambda-failure-rate", type=float, default=0.0)
+    parser.add_argument("--retry-interval-scale", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--idempotency",
+        action="store_true",
+        help="Make the handlers idempotent, with the records kept in memory",
+    )
+    parser.add_argument(
+        "--executions",
+        type=int,
+        default=1,
+        help="Number of executions of the same input, e.g. 2 to run a duplicate",
+    )
+    parser.add_argument("--report", help="Path of a JSON file to write the report to")
+    args = parser.parse_args()
+
+    environment = {}
+    if args.no_fast_path:
+        environment["FAST_PATH_ENABLED"] = "false"
+    if args.idempotency:
+        environment["IDEMPOTENCY_ENABLED"] = "true"
+
+    stand_ins = StandIns(
+        latency=parse_service_values(args.latency),
+        failure_rate=parse_service_values(args.failure_rate),
+        seed=args.seed,
+    )
+    state_machine = LocalStateMachine(
+        stand_ins,
+        lambda_failure_rate=args.lambda_failure_rate,
+        retry_interval_scale=args.retry_interval_scale,
+        environment=environment,
+        seed=args.seed,
+    )
+    audio_file_folder_uri = seed_audio_samples(stand_ins, args.question)
+    for _ in range(args.executions):
+        report = state_machine.run(
+            {
+                "documentName": args.document_name,
+                "audioFileFolderUri": audio_file_folder_uri,
+            }
+        )
+        print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(asdict(report), file, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Recommend the memory of every lambda function from the memory profile of its
+invocations.
+
+With `MEMORY_PROFILING` set to `true`, the lambdas add the peak of the Python
+allocations (`PythonPeakMemory`) and the bytes read from S3 by the invocation
+(`InputBytes`) to the metrics of every phase: handler, load, llm, parse,
+render and upload. The report reads these EMF records from the CloudWatch logs
+of the functions, or from files of log lines. Then, for every function, it
+fits the peak resident memory of the handler against the input size, and
+recommends the memory that covers the largest input with headroom.
+
+`PeakRSS` is the high-water mark of the execution environment, including the
+earlier invocations of a warm environment, so the fit is conservative. The
+stages run by the fast path lambda are attributed to the `fastpath` function.
+When run locally, every stage shares the process, so only the Python peaks of
+the phases are meaningful.
+
+Usage:
+    python -m tools.memory_report --fetch --stack-name <stack> [--hours 24]
+        [--largest-input-mb 5] [--headroom 0.3] [--context-output sizes.json]
+    python -m tools.memory_report lambda-logs.txt [more.txt ...]
+"""
+
+import argparse
+import json
+import math
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+# The sizes deployed by `CodeStack` when the `memorySizes` context is not set
+DEPLOYED_MEMORY_SIZES = {
+    "preprocess": 1024,
+    "transcribe": 1024,
+    "validate": 2048,
+    "summarize": 2048,
+    "generate": 2048,
+    "fastpath": 3008,
+}
+
+# Lambda memory, in MB, and the step the recommendations are rounded up to
+MIN_MEMORY_MB = 128
+MAX_MEMORY_MB = 10240
+MEMORY_STEP_MB = 64
+
+
+@dataclass
+class PhaseRecord:
+    """
+    The memory profile of one phase of one invocation
+
+    Attributes:
+    -----------
+    function: str
+        Name of the lambda function that ran the phase, e.g. "fastpath".
+    stage: str
+        Name of the stage, e.g. "validate".
+    phase: str
+        Name of the phase, e.g. "handler".
+    input_bytes: int
+        Bytes read from S3 by the invocation until the end of the phase.
+    peak_rss_mb: float
+        Peak resident memory of the execution environment.
+    python_peak_mb: float
+        Peak of the Python allocations during the phase.
+    """
+
+    function: str
+    stage: str
+    phase: str
+    input_bytes: int
+    peak_rss_mb: float
+    python_peak_mb: float
+
+
+@dataclass
+class MemoryRecommendation:
+    """
+    The recommended memory of a lambda function
+
+    Attributes:
+    -----------
+    function: str
+        Name of the lambda function.
+    invocations: int
+        Number of profiled invocations.
+    max_input_mb: float
+        Largest input of the profiled invocations.
+    max_peak_rss_mb: float
+        Largest peak resident memory of the profiled invocations.
+    intercept_mb: float
+        Resident memory of the fit for an empty input.
+    mb_per_input_mb: float
+        Resident memory of the fit per MB of input.
+    target_input_mb: float
+        Input size the recommendation covers.
+    predicted_peak_mb: float
+        Peak resident memory of the fit for the target input.
+    recommended_mb: int
+        Recommended memory, with headroom.
+    deployed_mb: int
+        Memory deployed by default, if known.
+    phase_python_peaks_mb: Dict[str, float]
+        Largest peak of the Python allocations of every phase.
+    """
+
+    function: str
+    invocations: int = 0
+    max_input_mb: float = 0.0
+    max_peak_rss_mb: float = 0.0
+    intercept_mb: float = 0.0
+    mb_per_input_mb: float = 0.0
+    target_input_mb: float = 0.0
+    predicted_peak_mb: float = 0.0
+    recommended_mb: int = MIN_MEMORY_MB
+    deployed_mb: Optional[int] = None
+    phase_python_peaks_mb: Dict[str, float] = field(default_factory=dict)
+
+
+def first_value(value):
+    """EMF metric values are lists of samples."""
+    if isinstance(value, list):
+        return value[0] if value else 0
+    return value
+
+
+def parse_records(lines: Iterable[str]) -> List[PhaseRecord]:
+    """
+    Read the memory profiles of the EMF records of log lines, which may be
+    prefixed with a timestamp or a request id.
+    """
+    records = []
+    for line in lines:
+        start = line.find("{")
+        if start < 0 or "PythonPeakMemory" not in line:
+            continue
+        try:
+            blob = json.loads(line[start:])
+        except ValueError:
+            continue
+        if "stage" not in blob or "PythonPeakMemory" not in blob:
+            continue
+        service = blob.get("service", "")
+        records.append(
+            PhaseRecord(
+                function=(
+                    service[len("app-") :]
+                    if service.startswith("app-")
+                    else blob["stage"]
+                ),
+                stage=blob["stage"],
+                phase=blob.get("phase", "handler"),
+                input_bytes=int(first_value(blob.get("InputBytes", 0))),
+                peak_rss_mb=float(first_value(blob.get("PeakRSS", 0))),
+                python_peak_mb=float(first_value(blob["PythonPeakMemory"])),
+            )
+        )
+    return records
+
+
+def read_log_files(paths: Iterable[str]) -> List[str]:
+    """
+    Read log lines from text files, or from the JSON output of
+    `aws logs filter-log-events`.
+    """
+    lines = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            content = file.read()
+        try:
+            events = json.loads(content)["events"]
+            lines.extend(event["message"] for event in events)
+        except (ValueError, KeyError, TypeError):
+            lines.extend(content.splitlines())
+    return lines
+
+
+def fetch_log_lines(stack_name: str, hours: float) -> List[str]:
+    """Read the profiled EMF records of the last hours of every function."""
+    import boto3
+
+    logs = boto3.client("logs")
+    start = int((time.time() - hours * 3600) * 1000)
+    lines = []
+    for function in DEPLOYED_MEMORY_SIZES:
+        pages = logs.get_paginator("filter_log_events").paginate(
+            logGroupName=f"/aws/lambda/{stack_name}-{function}",
+            startTime=start,
+            filterPattern='"PythonPeakMemory"',
+        )
+        try:
+            for page in pages:
+                lines.extend(event["message"] for event in page.get("events", []))
+        except logs.exceptions.ResourceNotFoundException:
+            continue
+    return lines
+
+
+def round_memory(memory_mb: float) -> int:
+    memory_mb = math.ceil(memory_mb / MEMORY_STEP_MB) * MEMORY_STEP_MB
+    return int(min(MAX_MEMORY_MB, max(MIN_MEMORY_MB, memory_mb)))
+
+
+def recommend(
+    function: str,
+    records: List[PhaseRecord],
+    largest_input_mb: float = 0.0,
+    headroom: float = 0.3,
+) -> MemoryRecommendation:
+    """
+    Fit the peak resident memory of the handler of a function against its
+    input size, and recommend the memory covering the largest input, the
+    largest of the profiled inputs and `largest_input_mb`, with headroom.
+    """
+    recommendation = MemoryRecommendation(
+        function=function, deployed_mb=DEPLOYED_MEMORY_SIZES.get(function)
+    )
+    handlers = [
+        record
+        for record in records
+        if record.function == function
+        and record.stage == function
+        and record.phase == "handler"
+    ]
+    phase_peaks = defaultdict(float)
+    for record in records:
+        if record.function == function:
+            name = record.phase if record.stage == function else record.stage
+            phase_peaks[name] = max(phase_peaks[name], record.python_peak_mb)
+    recommendation.phase_python_peaks_mb = {
+        name: round(peak, 1) for name, peak in phase_peaks.items()
+    }
+    if not handlers:
+        return recommendation
+
+    inputs_mb = np.array([record.input_bytes / 1024**2 for record in handlers])
+    peaks_mb = np.array([record.peak_rss_mb for record in handlers])
+    if len(set(inputs_mb.tolist())) > 1:
+        slope, intercept = np.polyfit(inputs_mb, peaks_mb, 1)
+        # A negative slope is noise, e.g. from warm environments
+        slope = max(0.0, float(slope))
+        if slope == 0.0:
+            intercept = float(peaks_mb.mean())
+    else:
+        slope, intercept = 0.0, float(peaks_mb.mean())
+
+    recommendation.invocations = len(handlers)
+    recommendation.max_input_mb = round(float(inputs_mb.max()), 3)
+    recommendation.max_peak_rss_mb = round(float(peaks_mb.max()), 1)
+    recommendation.intercept_mb = round(float(intercept), 1)
+    recommendation.mb_per_input_mb = round(slope, 2)
+    recommendation.target_input_mb = max(recommendation.max_input_mb, largest_input_mb)
+    recommendation.predicted_peak_mb = round(
+        max(
+            float(intercept) + slope * recommendation.target_input_mb,
+            recommendation.max_peak_rss_mb,
+        ),
+        1,
+    )
+    recommendation.recommended_mb = round_memory(
+        recommendation.predicted_peak_mb * (1 + headroom)
+    )
+    return recommendation
+
+
+def print_recommendations(recommendations: List[MemoryRecommendation]) -> None:
+    print(
+        f"{'function':<12}{'runs':>6}{'max in MB':>11}{'max RSS':>9}"
+        f"{'MB/in MB':>10}{'at target':>11}{'deployed':>10}{'recommended':>13}"
+    )
+    for r in recommendations:
+        print(
+            f"{r.function:<12}{r.invocations:>6}{r.max_input_mb:>11.2f}"
+            f"{r.max_peak_rss_mb:>9.0f}{r.mb_per_input_mb:>10.2f}"
+            f"{r.predicted_peak_mb:>11.0f}{r.deployed_mb or '-':>10}"
+            f"{r.recommended_mb if r.invocations else '-':>13}"
+        )
+        if r.phase_python_peaks_mb:
+            peaks = ", ".join(
+                f"{name}={peak:g}" for name, peak in r.phase_python_peaks_mb.items()
+            )
+            print(f"  Python peak MB: {peaks}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("logs", nargs="*", help="Files of log lines with EMF records")
+    parser.add_argument(
+        "--fetch", action="store_true", help="Read the CloudWatch logs with boto3"
+    )
+    parser.add_argument("--stack-name", help="Name of the deployed stack")
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument(
+        "--largest-input-mb",
+        type=float,
+        default=0.0,
+        help="Input size to cover, when larger than the profiled inputs",
+    )
+    parser.add_argument("--headroom", type=float, default=0.3)
+    parser.add_argument(
+        "--output", help="Path of a JSON file to write the recommendations to"
+    )
+    parser.add_argument(
+        "--context-output",
+        help="Path of a JSON file to write the memorySizes context of the stack to",
+    )
+    args = parser.parse_args()
+
+    if args.fetch:
+        if not args.stack_name:
+            parser.error("--fetch needs --stack-name")
+        lines = fetch_log_lines(args.stack_name, args.hours)
+    elif args.logs:
+        lines = read_log_files(args.logs)
+    else:
+        parser.error("give log files, or --fetch")
+
+    records = parse_records(lines)
+    recommendations = [
+        recommend(function, records, args.largest_input_mb, args.headroom)
+        for function in dict.fromkeys(record.function for record in records)
+    ]
+    print_recommendations(recommendations)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump([asdict(r) for r in recommendations], file, indent=2)
+    if args.context_output:
+        with open(args.context_output, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "memorySizes": {
+                        r.function: r.recommended_mb
+                        for r in recommendations
+                        if r.invocations
+                    }
+                },
+                file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Load the lambda stage modules in-process.
+
+Every lambda folder is deployed on its own and uses the same module names
+(`connections`, `utils`, `exceptions`, ...). The modules of each stage, and
+its copy of the modules of `code/lambdas/shared`, are therefore imported in
+isolation by the stage loader of the shared folder, the one the fast path
+lambda uses, and kept out of `sys.modules` afterwards so that the next stage
+imports its own copies.
+"""
+
+import os
+import importlib.util
+from types import ModuleType
+from typing import Dict, Optional
+
+PARENT_DIR: str = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LAMBDA_PATH: str = os.path.join(PARENT_DIR, "code", "lambdas")
+SHARED_PATH: str = os.path.join(LAMBDA_PATH, "shared")
+
+# Environment the lambdas expect, see `CodeStack.create_lambda_functions`
+DEFAULT_ENVIRONMENT: Dict[str, str] = {
+    "AWS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "local",
+    "AWS_SECRET_ACCESS_KEY": "local",
+    "DATA_SOURCE_BUCKET_NAME": "local-bucket",
+    "POWERTOOLS_METRICS_NAMESPACE": "local-ns",
+    "POWERTOOLS_TRACE_DISABLED": "true",
+    "POWERTOOLS_LOG_LEVEL": "WARNING",
+    # The benchmarks run the same inputs repeatedly, so the handlers do the work
+    "IDEMPOTENCY_ENABLED": "false",
+}
+
+
+def _import_shared_loader() -> ModuleType:
+    # Kept out of `sys.modules`, where the fast path lambda imports its own copy
+    spec = importlib.util.spec_from_file_location(
+        "shared_stage_loader", os.path.join(SHARED_PATH, "stage_loader.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+_shared_loader = _import_shared_loader()
+
+# Module holding the `lambda_handler` of every stage
+STAGE_HANDLERS: Dict[str, str] = {
+    **_shared_loader.STAGE_HANDLERS,
+    "fastpath": "fastpath",
+}
+
+
+def load_stage_module(
+    stage: str,
+    module_name: Optional[str] = None,
+    clients: Optional[Dict] = None,
+    environment: Optional[Dict[str, str]] = None,
+) -> ModuleType:
+    """
+    Import a module of a lambda stage, isolated from the modules of the other
+    stages, with the environment of `DEFAULT_ENVIRONMENT` for the variables
+    that are not set.
+
+    Arguments:
+    ----------
+        stage (str): Name of the lambda folder, e.g. "generate".
+        module_name (str): Module to import, defaults to the module of the stage handler.
+        clients (dict): boto3 clients to use instead of real ones, keyed by service name.
+            Only used the first time a stage is imported, when its `Connections` are created.
+        environment (dict): Environment variables to set while the stage is imported.
+
+    Returns:
+    --------
+        ModuleType: The imported module.
+    """
+    for key, value in DEFAULT_ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+    return _shared_loader.load_stage_module(
+        stage,
+        module_name=module_name or STAGE_HANDLERS[stage],
+        clients=clients,
+        environment=environment,
+    )
+
+
+def load_stage_handler(stage: str, **kwargs):
+    """
+    Import the `lambda_handler` function of a lambda stage.
+
+    Arguments:
+    ----------
+        stage (str): Name of the lambda folder, e.g. "generate".
+        kwargs: Passed to `load_stage_module`.
+
+    Returns:
+    --------
+        Callable: The `lambda_handler` of the stage.
+    """
+    return load_stage_module(stage, **kwargs).lambda_handler
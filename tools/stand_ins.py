@@ -0,0 +1,516 @@
+"""
+In-memory stand-ins for the AWS clients used by the lambdas, so that the
+stages can be run and benchmarked without an AWS account.
+"""
+
+import io
+import json
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Optional
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+
+def client_error(code: str, message: str, operation_name: str, status: int = 400):
+    """Build a botocore `ClientError` like the ones raised by the real clients."""
+    return ClientError(
+        {
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        },
+        operation_name,
+    )
+
+
+class InMemoryS3:
+    """
+    A stand-in for the boto3 S3 client, keeping objects in a dictionary.
+
+    Only the operations used by the lambdas are implemented.
+    """
+
+    def __init__(self):
+        self.objects: Dict[tuple, dict] = {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, operation_name: str):
+        with self._lock:
+            self.calls[operation_name] = self.calls.get(operation_name, 0) + 1
+
+    def _get(self, Bucket: str, Key: str, operation_name: str) -> dict:
+        self._count(operation_name)
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            if operation_name == "HeadObject":
+                raise client_error("404", "Not Found", operation_name, 404)
+            raise client_error(
+                "NoSuchKey", "The specified key does not exist.", operation_name, 404
+            )
+        return stored
+
+    def put_object(
+        self, Bucket: str, Key: str, Body=b"", Metadata: Optional[dict] = None, **_
+    ) -> dict:
+        self._count("PutObject")
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        etag = f'"{hashlib.md5(Body).hexdigest()}"'
+        with self._lock:
+            self.objects[(Bucket, Key)] = {
+                "Body": bytes(Body),
+                "ETag": etag,
+                "Metadata": dict(Metadata or {}),
+                "LastModified": datetime.now(timezone.utc),
+            }
+        return {"ETag": etag, "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def get_object(self, Bucket: str, Key: str, **_) -> dict:
+        stored = self._get(Bucket, Key, "GetObject")
+        return {
+            "Body": StreamingBody(io.BytesIO(stored["Body"]), len(stored["Body"])),
+            "ContentLength": len(stored["Body"]),
+            "ETag": stored["ETag"],
+            "Metadata": dict(stored["Metadata"]),
+            "LastModified": stored["LastModified"],
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+        }
+
+    def head_object(self, Bucket: str, Key: str, **_) -> dict:
+        stored = self._get(Bucket, Key, "HeadObject")
+        return {
+            "ContentLength": len(stored["Body"]),
+            "ETag": stored["ETag"],
+            "Metadata": dict(stored["Metadata"]),
+            "LastModified": stored["LastModified"],
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+        }
+
+    def upload_fileobj(
+        self, Fileobj, Bucket: str, Key: str, ExtraArgs: Optional[dict] = None, **_
+    ) -> None:
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj, **(ExtraArgs or {}))
+
+    def upload_file(
+        self,
+        Filename: str,
+        Bucket: str,
+        Key: str,
+        ExtraArgs: Optional[dict] = None,
+        **_,
+    ) -> None:
+        with open(Filename, "rb") as file:
+            self.upload_fileobj(file, Bucket, Key, ExtraArgs)
+
+    def delete_object(self, Bucket: str, Key: str, **_) -> dict:
+        self._count("DeleteObject")
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {"ResponseMetadata": {"HTTPStatusCode": 204}}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", **_) -> dict:
+        self._count("ListObjectsV2")
+        contents = [
+            {
+                "Key": key,
+                "Size": len(stored["Body"]),
+                "ETag": stored["ETag"],
+                "LastModified": stored["LastModified"],
+            }
+            for (bucket, key), stored in sorted(self.objects.items())
+            if bucket == Bucket and key.startswith(Prefix)
+        ]
+        return {
+            "Contents": contents,
+            "KeyCount": len(contents),
+            "IsTruncated": False,
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+        }
+
+
+class InMemoryTranscribe:
+    """
+    A stand-in for the boto3 Transcribe client. Jobs complete as soon as they
+    start, and write their output to the given S3 stand-in, like Amazon
+    Transcribe writes to the output bucket of the job.
+
+    The transcript of an audio file is looked up in `transcripts` by S3 URL,
+    and defaults to the content of the audio object when it is text.
+    """
+
+    def __init__(self, s3: InMemoryS3, transcripts: Optional[Dict[str, str]] = None):
+        self.s3 = s3
+        self.transcripts = dict(transcripts or {})
+        self.jobs: Dict[str, dict] = {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, operation_name: str):
+        with self._lock:
+            self.calls[operation_name] = self.calls.get(operation_name, 0) + 1
+
+    def _transcript(self, media_uri: str) -> str:
+        if media_uri in self.transcripts:
+            return self.transcripts[media_uri]
+        bucket, key = media_uri[5:].split("/", 1)
+        stored = self.s3.objects.get((bucket, key))
+        try:
+            return stored["Body"].decode("utf-8")
+        except (TypeError, UnicodeDecodeError):
+            return f"Transcript of {key.rsplit('/', 1)[-1]}"
+
+    def start_transcription_job(
+        self,
+        TranscriptionJobName: str,
+        Media: dict,
+        OutputBucketName: str,
+        OutputKey: str,
+        **_,
+    ) -> dict:
+        self._count("StartTranscriptionJob")
+        transcript = self._transcript(Media["MediaFileUri"])
+        self.s3.put_object(
+            Bucket=OutputBucketName,
+            Key=OutputKey,
+            Body=json.dumps({"results": {"transcripts": [{"transcript": transcript}]}}),
+        )
+        job = {
+            "TranscriptionJobName": TranscriptionJobName,
+            "TranscriptionJobStatus": "COMPLETED",
+            "Media": Media,
+            "Transcript": {
+                "TranscriptFileUri": (
+                    f"https://s3.amazonaws.com/{OutputBucketName}/{OutputKey}"
+                )
+            },
+        }
+        with self._lock:
+            self.jobs[TranscriptionJobName] = job
+        return {"TranscriptionJob": dict(job, TranscriptionJobStatus="IN_PROGRESS")}
+
+    def get_transcription_job(self, TranscriptionJobName: str, **_) -> dict:
+        self._count("GetTranscriptionJob")
+        job = self.jobs.get(TranscriptionJobName)
+        if job is None:
+            raise client_error(
+                "BadRequestException",
+                "The requested job couldn't be found.",
+                "GetTranscriptionJob",
+            )
+        return {"TranscriptionJob": dict(job)}
+
+
+def default_bedrock_response(prompt: str) -> str:
+    """Answer the validation and summarization prompts of the lambdas."""
+    if "off_topic_answers" in prompt:
+        return '{"off_topic_answers": ["-1"]}'
+    return (
+        "<Output><Summary>"
+        "The answers agree on the main points of the question.\n\n"
+        "- They describe the service and its purpose.\n"
+        "- They give examples of how it is used."
+        "</Summary></Output>"
+    )
+
+
+class StubBedrock:
+    """
+    A stand-in for the boto3 Bedrock runtime client, answering the Anthropic
+    messages API with the text returned by `responder` for the prompt.
+    """
+
+    def __init__(self, responder: Callable[[str], str] = default_bedrock_response):
+        self.responder = responder
+        self.calls: Dict[str, int] = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, body, modelId: str, **_) -> dict:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        request = json.loads(body)
+        prompt = "\n\n".join(
+            str(message.get("content", "")) for message in request.get("messages", [])
+        )
+        if request.get("system"):
+            prompt = f"{request['system']}\n\n{prompt}"
+        text = self.responder(prompt)
+        # Rough estimate of 4 characters per token
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+        with self._lock:
+            self.calls["InvokeModel"] = self.calls.get("InvokeModel", 0) + 1
+            self.input_tokens += usage["input_tokens"]
+            self.output_tokens += usage["output_tokens"]
+        content = json.dumps(
+            {
+                "id": f"msg_{hashlib.md5(prompt.encode()).hexdigest()[:16]}",
+                "type": "message",
+                "role": "assistant",
+                "model": modelId,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": usage,
+            }
+        ).encode("utf-8")
+        return {
+            "body": StreamingBody(io.BytesIO(content), len(content)),
+            "contentType": "application/json",
+            "ResponseMetadata": {"HTTPStatusCode": 200, "HTTPHeaders": {}},
+        }
+
+
+class InMemorySNS:
+    """A stand-in for the boto3 SNS client, keeping the published messages."""
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, TopicArn: str, Message: str, Subject: str = "", **_) -> dict:
+        self.messages.append(
+            {"TopicArn": TopicArn, "Subject": Subject, "Message": Message}
+        )
+        return {"MessageId": str(len(self.messages))}
+
+
+class FaultInjector:
+    """
+    A wrapper adding latency and failures to the operations of a client.
+
+    Attributes:
+    -----------
+    client: Any
+        The wrapped client, e.g. an `InMemoryS3`.
+    latency: float
+        Seconds added to every operation.
+    failure_rate: float
+        Probability, between 0 and 1, that an operation raises `error_code`
+        instead of being called.
+    error_code: str
+        Code of the `ClientError` raised by the failed operations.
+    operations: Iterable[str]
+        Names of the methods affected, all of them when empty.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        error_code: str = "ServiceUnavailable",
+        operations: Optional[Iterable[str]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.client = client
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.error_code = error_code
+        self.operations = set(operations or [])
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.client, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+        if self.operations and name not in self.operations:
+            return attribute
+
+        def operation(*args, **kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                failed = self._random.random() < self.failure_rate
+                self.failures += failed
+            if failed:
+                raise client_error(self.error_code, "Injected failure", name, 503)
+            return attribute(*args, **kwargs)
+
+        return operation
+
+
+class TranscribeQuota:
+    """
+    A wrapper modelling the quota of concurrent batch jobs of Amazon
+    Transcribe, and the duration of the jobs.
+
+    A job counts against the quota until `job_seconds` after it started. Jobs
+    started above the quota fail with `LimitExceededException`, like Amazon
+    Transcribe does. Getting a job that is still running waits until it is
+    done, which stands for the polling of the transcribe lambda.
+
+    Attributes:
+    -----------
+    client: Any
+        The wrapped client, e.g. an `InMemoryTranscribe`.
+    max_concurrent_jobs: int
+        Quota of concurrent batch jobs, 250 per region by default.
+    job_seconds: float
+        Duration of a job.
+    rejections: int
+        Number of jobs rejected by the quota.
+    peak_concurrent_jobs: int
+        Highest number of jobs running at the same time.
+    """
+
+    def __init__(
+        self, client: Any, max_concurrent_jobs: int = 250, job_seconds: float = 0.0
+    ):
+        self.client = client
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.job_seconds = job_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the running jobs and the counters."""
+        with self._lock:
+            self._done_at: Dict[str, float] = {}
+            self._running: list = []
+            self.rejections = 0
+            self.peak_concurrent_jobs = 0
+
+    def start_transcription_job(self, TranscriptionJobName: str, **kwargs) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._running = [done_at for done_at in self._running if done_at > now]
+            if len(self._running) >= self.max_concurrent_jobs:
+                self.rejections += 1
+                raise client_error(
+                    "LimitExceededException",
+                    "You have reached your limit of concurrent batch jobs.",
+                    "StartTranscriptionJob",
+                )
+            self._running.append(now + self.job_seconds)
+            self._done_at[TranscriptionJobName] = now + self.job_seconds
+            self.peak_concurrent_jobs = max(
+                self.peak_concurrent_jobs, len(self._running)
+            )
+        return self.client.start_transcription_job(
+            TranscriptionJobName=TranscriptionJobName, **kwargs
+        )
+
+    def get_transcription_job(self, TranscriptionJobName: str, **kwargs) -> dict:
+        remaining = self._done_at.get(TranscriptionJobName, 0) - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return self.client.get_transcription_job(
+            TranscriptionJobName=TranscriptionJobName, **kwargs
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+class BedrockQuota:
+    """
+    A wrapper modelling the requests per minute and tokens per minute quotas
+    of Amazon Bedrock, and the latency of the model.
+
+    Like Amazon Bedrock, a request counts its input tokens and its
+    `max_tokens` against the tokens per minute quota, and requests above a
+    quota fail with `ThrottlingException`.
+
+    Attributes:
+    -----------
+    client: Any
+        The wrapped client, e.g. a `StubBedrock`.
+    requests_per_minute: int
+        Quota of requests in any window of `minute_seconds`, 0 for no quota.
+    tokens_per_minute: int
+        Quota of tokens in any window of `minute_seconds`, 0 for no quota.
+    latency: float
+        Seconds added to every request that is not throttled.
+    minute_seconds: float
+        Length of the quota window, shorter than 60 to speed up time.
+    throttles: Dict[str, int]
+        Number of requests throttled, by quota.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        latency: float = 0.0,
+        minute_seconds: float = 60.0,
+    ):
+        self.client = client
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.latency = latency
+        self.minute_seconds = minute_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the requests of the current window and the counters."""
+        with self._lock:
+            self._window: list = []
+            self.throttles = {"RequestsPerMinute": 0, "TokensPerMinute": 0}
+
+    def invoke_model(self, body, **kwargs) -> dict:
+        text = body.decode("utf-8") if isinstance(body, bytes) else body
+        # Rough estimate of 4 characters per token, like `StubBedrock`
+        tokens = len(text) // 4 + int(json.loads(text).get("max_tokens", 0))
+        with self._lock:
+            now = time.monotonic()
+            self._window = [
+                (sent_at, sent_tokens)
+                for sent_at, sent_tokens in self._window
+                if sent_at > now - self.minute_seconds
+            ]
+            quota = None
+            if self.requests_per_minute and (
+                len(self._window) >= self.requests_per_minute
+            ):
+                quota = "RequestsPerMinute"
+            elif self.tokens_per_minute and (
+                sum(sent_tokens for _, sent_tokens in self._window) + tokens
+                > self.tokens_per_minute
+            ):
+                quota = "TokensPerMinute"
+            if quota:
+                self.throttles[quota] += 1
+                raise client_error(
+                    "ThrottlingException", "Too many requests", "InvokeModel", 429
+                )
+            self._window.append((now, tokens))
+        if self.latency:
+            time.sleep(self.latency)
+        return self.client.invoke_model(body=body, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+class FakeLambdaContext:
+    """A stand-in for the `LambdaContext` given to the lambda handlers."""
+
+    def __init__(
+        self,
+        function_name: str,
+        memory_limit_in_mb: int = 2048,
+        timeout_seconds: float = 900,
+        aws_request_id: str = "local",
+    ):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.invoked_function_arn = (
+            f"arn:aws:lambda:us-east-1:000000000000:function:{function_name}"
+        )
+        self.aws_request_id = aws_request_id
+        self.log_group_name = f"/aws/lambda/{function_name}"
+        self.log_stream_name = "local"
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
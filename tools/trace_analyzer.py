@@ -0,0 +1,428 @@
+"""
+Find where the time of the executions of the state machine goes, from their
+AWS X-Ray traces.
+
+Every execution is one trace: the segment of the state machine, the segments
+of the Lambda service and of the functions it invoked, and the subsegments of
+the handlers, of the `llm` phases and of the AWS calls. The analyzer joins
+them into one tree per execution and walks its critical path, i.e. the chain
+of spans that the end of the execution waited for, backwards from the end.
+Every second of the critical path is attributed to a category:
+
+- queueing: the state machine and the Lambda service before the function runs,
+  including the retries of the tasks
+- cold start: the initialization of the function
+- io: the S3 and Transcribe calls
+- transcription: waiting for the Amazon Transcribe jobs between the calls
+- llm: the `llm` phases and the Amazon Bedrock calls
+- rendering: the rendering of the documents
+- compute: the rest of the handlers
+
+The traces are read from files exported with `aws xray batch-get-traces`, or
+with `--fetch`, which exports the traces of the last hours, optionally of one
+correlation id, with boto3. The critical paths are written as collapsed stacks,
+one `frame;frame;frame milliseconds` line per stack, which flamegraph.pl,
+speedscope and most flame graph viewers read.
+
+Usage:
+    python -m tools.trace_analyzer traces.json [more.json ...]
+        [--flamegraph critical-path.folded] [--merge] [--output report.json]
+    python -m tools.trace_analyzer --fetch --hours 3 [--correlation-id <id>]
+        [--export traces.json] [--flamegraph critical-path.folded]
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CATEGORIES = (
+    "queueing",
+    "cold start",
+    "io",
+    "transcription",
+    "llm",
+    "rendering",
+    "compute",
+)
+
+# Subsegment names of the functions of the generate lambda that render the
+# documents, e.g. "## generate_pdf"
+RENDERING_NAMES = (
+    "render",
+    "generate_pdf",
+    "generate_html_document",
+    "generate_markdown_document",
+    "generate_docx_document",
+    "assemble_pdf",
+)
+
+# A span ending this close to the start of the next one is on the critical path
+EPSILON = 1e-6
+
+
+@dataclass
+class Span:
+    """
+    A segment or subsegment of a trace
+
+    Attributes:
+    -----------
+    id: str
+        Identifier of the segment or subsegment.
+    name: str
+        Name of the segment or subsegment.
+    start: float
+        Start time, in seconds since the epoch.
+    end: float
+        End time, in seconds since the epoch.
+    origin: str
+        Origin of a segment, e.g. "AWS::Lambda::Function", else empty.
+    namespace: str
+        Namespace of a subsegment, "aws" or "remote" for downstream calls.
+    annotations: Dict[str, str]
+        Annotations of the segment or subsegment.
+    children: List[Span]
+        Nested subsegments, and segments whose parent is this span.
+    """
+
+    id: str
+    name: str
+    start: float
+    end: float
+    origin: str = ""
+    namespace: str = ""
+    annotations: Dict[str, str] = field(default_factory=dict)
+    children: List["Span"] = field(default_factory=list)
+
+
+@dataclass
+class ExecutionBreakdown:
+    """
+    The critical path of one execution
+
+    Attributes:
+    -----------
+    trace_id: str
+        Identifier of the X-Ray trace.
+    correlation_id: str
+        The `correlationId` annotation of the handlers, if any.
+    document_name: str
+        The `documentName` annotation of the handlers, if any.
+    duration: float
+        Duration of the execution, in seconds.
+    categories: Dict[str, float]
+        Seconds of the critical path in every category.
+    stages: Dict[str, float]
+        Seconds of the critical path in every state of the state machine.
+    stacks: Dict[str, float]
+        Seconds of the critical path in every stack of spans, the frames
+        separated by semicolons.
+    """
+
+    trace_id: str
+    correlation_id: str = ""
+    document_name: str = ""
+    duration: float = 0.0
+    categories: Dict[str, float] = field(default_factory=dict)
+    stages: Dict[str, float] = field(default_factory=dict)
+    stacks: Dict[str, float] = field(default_factory=dict)
+
+
+def load_traces(paths: Iterable[str]) -> List[dict]:
+    """
+    Read the traces of exported files, the output of `aws xray batch-get-traces`
+    or a list of its traces. Directories are read recursively.
+    """
+    traces = []
+    for path in paths:
+        if os.path.isdir(path):
+            traces.extend(
+                load_traces(
+                    os.path.join(root, name)
+                    for root, _, names in os.walk(path)
+                    for name in sorted(names)
+                    if name.endswith(".json")
+                )
+            )
+            continue
+        with open(path, encoding="utf-8") as file:
+            content = json.load(file)
+        traces.extend(content["Traces"] if isinstance(content, dict) else content)
+    return traces
+
+
+def fetch_traces(hours: float, correlation_id: Optional[str] = None) -> List[dict]:
+    """
+    Export the traces of the executions of the last hours with boto3, or only
+    the trace of one correlation id.
+    """
+    import boto3
+
+    xray = boto3.client("xray")
+    end = time.time()
+    summaries = xray.get_paginator("get_trace_summaries").paginate(
+        StartTime=end - hours * 3600,
+        EndTime=end,
+        FilterExpression=(
+            f'annotation.correlationId = "{correlation_id}"'
+            if correlation_id
+            else 'service(id(type: "AWS::StepFunctions::StateMachine"))'
+        ),
+    )
+    trace_ids = list(
+        dict.fromkeys(
+            summary["Id"]
+            for page in summaries
+            for summary in page.get("TraceSummaries", [])
+        )
+    )
+    traces = []
+    # The API takes at most 5 trace ids per request
+    for index in range(0, len(trace_ids), 5):
+        pages = xray.get_paginator("batch_get_traces").paginate(
+            TraceIds=trace_ids[index : index + 5]
+        )
+        for page in pages:
+            traces.extend(page.get("Traces", []))
+    return traces
+
+
+def build_tree(trace: dict) -> Optional[Span]:
+    """
+    Join the segments of a trace into one tree, under the segment of the state
+    machine, or under a span covering every root when there are several.
+    """
+    spans: Dict[str, Span] = {}
+    parents: List[Tuple[str, Span]] = []
+
+    def add(document: dict, origin: str = "") -> Span:
+        start = float(document.get("start_time", 0.0))
+        span = Span(
+            id=document.get("id", ""),
+            name=document.get("name", ""),
+            start=start,
+            end=float(document.get("end_time", start)),
+            origin=origin,
+            namespace=document.get("namespace", ""),
+            annotations=document.get("annotations", {}),
+        )
+        spans[span.id] = span
+        for subsegment in document.get("subsegments", []):
+            span.children.append(add(subsegment))
+        # In-progress spans have no end time yet
+        span.end = max([span.end] + [child.end for child in span.children])
+        return span
+
+    for segment in trace.get("Segments", []):
+        document = segment["Document"]
+        if isinstance(document, str):
+            document = json.loads(document)
+        span = add(document, origin=document.get("origin", ""))
+        parents.append((document.get("parent_id", ""), span))
+
+    roots = []
+    for parent_id, span in parents:
+        if parent_id in spans:
+            spans[parent_id].children.append(span)
+        else:
+            roots.append(span)
+    if not roots:
+        return None
+    if len(roots) == 1:
+        return roots[0]
+    return Span(
+        id=trace.get("Id", ""),
+        name="execution",
+        start=min(root.start for root in roots),
+        end=max(root.end for root in roots),
+        children=roots,
+    )
+
+
+def categorize(span: Span, inherited: str) -> str:
+    """Return the category of the time of a span not spent in its children."""
+    name = span.name.lower()
+    if span.origin.startswith("AWS::StepFunctions") or span.origin == "AWS::Lambda":
+        return "queueing"
+    if name in ("initialization", "init") or name.startswith("init "):
+        return "cold start"
+    if "bedrock" in name or name == "## llm":
+        return "llm"
+    if span.namespace in ("aws", "remote") or span.origin.startswith("AWS::S3"):
+        # The Lambda calls of the state machine wait for the functions
+        return "queueing" if inherited == "queueing" else "io"
+    if any(part in name for part in RENDERING_NAMES):
+        return "rendering"
+    if "transcri" in name and name.startswith("## "):
+        return "transcription"
+    if inherited in ("queueing", "cold start"):
+        # Overhead of the runtime, outside of the handler
+        return "compute"
+    return inherited
+
+
+def critical_path(
+    span: Span, stack: Tuple[str, ...], inherited: str = "compute"
+) -> List[Tuple[Tuple[str, ...], str, float]]:
+    """
+    Walk the critical path of a span backwards from its end: the child that
+    ends last, then the child that ends last before that child starts, and so
+    on. The time between them is the own time of the span.
+
+    Returns:
+    --------
+        List[Tuple[Tuple[str, ...], str, float]]: The stack of spans, the
+            category and the seconds of every step of the critical path.
+    """
+    stack = stack + (span.name or span.origin or "unnamed",)
+    category = categorize(span, inherited)
+    steps = []
+    cursor = span.end
+    for child in sorted(span.children, key=lambda child: child.end, reverse=True):
+        child_end = min(child.end, span.end)
+        if child_end > cursor + EPSILON or child_end <= span.start:
+            # Runs concurrently with a span already on the critical path
+            continue
+        if cursor - child_end > 0:
+            steps.append((stack, category, cursor - child_end))
+        steps.extend(critical_path(child, stack, category))
+        cursor = max(child.start, span.start)
+    if cursor - span.start > 0:
+        steps.append((stack, category, cursor - span.start))
+    return steps
+
+
+def find_annotation(span: Span, key: str) -> str:
+    if key in span.annotations:
+        return str(span.annotations[key])
+    for child in span.children:
+        value = find_annotation(child, key)
+        if value:
+            return value
+    return ""
+
+
+def analyze_trace(trace: dict) -> Optional[ExecutionBreakdown]:
+    """Return the critical path of the execution of a trace."""
+    root = build_tree(trace)
+    if root is None:
+        return None
+    breakdown = ExecutionBreakdown(
+        trace_id=trace.get("Id", root.id),
+        correlation_id=find_annotation(root, "correlationId"),
+        document_name=find_annotation(root, "documentName"),
+        duration=root.end - root.start,
+    )
+    categories = defaultdict(float)
+    stages = defaultdict(float)
+    stacks = defaultdict(float)
+    # The steps are found from the end of the execution
+    for stack, category, seconds in reversed(critical_path(root, ())):
+        categories[category] += seconds
+        # The subsegments of the state machine segment are its states
+        stages[stack[1] if len(stack) > 1 else stack[0]] += seconds
+        stacks[";".join(frame.replace(";", ",") for frame in stack)] += seconds
+    breakdown.categories = {
+        category: round(categories[category], 6) for category in CATEGORIES
+    }
+    breakdown.stages = {name: round(value, 6) for name, value in stages.items()}
+    breakdown.stacks = {name: round(value, 6) for name, value in stacks.items()}
+    return breakdown
+
+
+def write_flamegraph(
+    breakdowns: List[ExecutionBreakdown], path: str, merge: bool = False
+) -> None:
+    """
+    Write the critical paths as collapsed stacks, in milliseconds, under a
+    frame per execution, or merged across the executions.
+    """
+    lines = defaultdict(float)
+    for breakdown in breakdowns:
+        execution = (
+            breakdown.document_name or breakdown.correlation_id or breakdown.trace_id
+        ).replace(";", ",")
+        for stack, seconds in breakdown.stacks.items():
+            lines[stack if merge else f"{execution};{stack}"] += seconds * 1000
+    with open(path, "w", encoding="utf-8") as file:
+        for stack, milliseconds in sorted(lines.items()):
+            if round(milliseconds) > 0:
+                file.write(f"{stack} {round(milliseconds)}\n")
+
+
+def print_breakdown(breakdown: ExecutionBreakdown) -> None:
+    label = breakdown.document_name or breakdown.trace_id
+    print(
+        f"\n{label} ({breakdown.correlation_id or 'no correlation id'}):"
+        f" {breakdown.duration:.2f} s"
+    )
+    for title, rows in (
+        ("category", breakdown.categories),
+        ("state", breakdown.stages),
+    ):
+        print(f"  {title:<24}{'seconds':>10}{'share':>8}")
+        for name, seconds in rows.items():
+            share = seconds / breakdown.duration if breakdown.duration else 0.0
+            print(f"  {name:<24}{seconds:>10.2f}{share:>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "traces", nargs="*", help="Files or folders of exported X-Ray traces"
+    )
+    parser.add_argument(
+        "--fetch", action="store_true", help="Export the traces with boto3"
+    )
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--correlation-id")
+    parser.add_argument(
+        "--export", help="Path of a JSON file to write the fetched traces to"
+    )
+    parser.add_argument(
+        "--flamegraph", help="Path of a file to write the collapsed stacks to"
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Merge the stacks of the executions in the flame graph",
+    )
+    parser.add_argument(
+        "--output", help="Path of a JSON file to write the breakdowns to"
+    )
+    args = parser.parse_args()
+
+    if args.fetch:
+        traces = fetch_traces(args.hours, args.correlation_id)
+        if args.export:
+            with open(args.export, "w", encoding="utf-8") as file:
+                json.dump({"Traces": traces}, file)
+    elif args.traces:
+        traces = load_traces(args.traces)
+    else:
+        parser.error("give exported traces, or --fetch")
+
+    breakdowns = [
+        breakdown
+        for breakdown in map(analyze_trace, traces)
+        if breakdown is not None
+        and (not args.correlation_id or breakdown.correlation_id == args.correlation_id)
+    ]
+    for breakdown in sorted(breakdowns, key=lambda breakdown: -breakdown.duration):
+        print_breakdown(breakdown)
+
+    if args.flamegraph:
+        write_flamegraph(breakdowns, args.flamegraph, merge=args.merge)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump([asdict(breakdown) for breakdown in breakdowns], file, indent=2)
+
+
+if __name__ == "__main__":
+    main()